@@ -0,0 +1,280 @@
+"""Reproducible benchmark for both conversion directions.
+
+Synthetic JPEG sets and multi-page PDFs are generated locally (deterministic
+for a given seed) and converted headlessly through conversion_engine. Each
+case runs in a fresh subprocess so its peak RSS is measured in isolation.
+Results are printed as a table and written as JSON:
+
+    python benchmarks/bench_conversion.py --output results.json
+    python benchmarks/bench_conversion.py --quick --compare results.json
+
+With ``--compare`` the run exits with status 1 if any case got slower (or
+larger) than the baseline by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+import conversion_engine  # noqa: E402
+from pdf_writer import StreamingPDFWriter  # noqa: E402
+
+# Source image sizes: 12 MP phone photo, A4 scans at 300 and 600 DPI
+RESOLUTIONS = {
+    "phone_12mp": (4032, 3024),
+    "scan_a4_300": (2480, 3508),
+    "scan_a4_600": (4960, 7016),
+}
+
+DEFAULT_RESOLUTIONS = ["phone_12mp", "scan_a4_300"]
+DEFAULT_PAGE_COUNTS = [10, 50]
+DEFAULT_DPIS = [150, 300]
+DEFAULT_QUALITIES = [85]
+
+QUICK_RESOLUTIONS = ["scan_a4_300"]
+QUICK_PAGE_COUNTS = [5]
+QUICK_DPIS = [150]
+
+SOURCE_QUALITY = 90
+
+
+def make_page(size, rng):
+    """Draw a document-like page: text lines, a photo-like gradient block and scanner noise."""
+    width, height = size
+    img = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+
+    margin = width // 12
+    line_height = max(8, height // 80)
+    y = margin
+    photo_top = rng.randrange(height // 4, height // 2)
+    photo_bottom = photo_top + height // 5
+    while y < height - margin:
+        if photo_top <= y < photo_bottom:
+            # Gradient "photo" block
+            for row in range(photo_top, photo_bottom, 4):
+                shade = int(255 * (row - photo_top) / (photo_bottom - photo_top))
+                draw.rectangle([margin, row, width - margin, row + 3],
+                               fill=(shade, 120, 255 - shade))
+            y = photo_bottom + line_height
+            continue
+        x = margin
+        while x < width - margin:
+            word = rng.randrange(line_height, line_height * 6)
+            draw.rectangle([x, y, min(x + word, width - margin), y + line_height // 2],
+                           fill=(30, 30, 30))
+            x += word + line_height // 2
+        y += line_height
+
+    noise = Image.effect_noise(size, 12).convert('RGB')
+    return Image.blend(img, noise, 0.08)
+
+
+def build_corpus(corpus_dir, resolution, pages, seed):
+    """Create (or reuse) a directory of synthetic JPEGs and return their paths."""
+    size = RESOLUTIONS[resolution]
+    directory = os.path.join(corpus_dir, f"{resolution}_{pages}_{seed}")
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(f"{seed}-{resolution}")
+
+    paths = []
+    for index in range(pages):
+        path = os.path.join(directory, f"page_{index + 1:04d}.jpg")
+        page_rng = random.Random(rng.random())
+        if not os.path.exists(path):
+            make_page(size, page_rng).save(path, format='JPEG', quality=SOURCE_QUALITY)
+        paths.append(path)
+    return paths
+
+
+def build_pdf(corpus_dir, resolution, pages, seed):
+    """Create (or reuse) a multi-page PDF made of the synthetic JPEGs."""
+    pdf_path = os.path.join(corpus_dir, f"{resolution}_{pages}_{seed}.pdf")
+    if not os.path.exists(pdf_path):
+        width, height = RESOLUTIONS[resolution]
+        with open(pdf_path, 'wb') as f, StreamingPDFWriter(f) as writer:
+            for path in build_corpus(corpus_dir, resolution, pages, seed):
+                with open(path, 'rb') as image_file:
+                    data = image_file.read()
+                # Lay pages out as if scanned at 300 DPI
+                writer.add_jpeg_page(data, width, height, (width * 72 / 300, height * 72 / 300))
+    return pdf_path
+
+
+def peak_rss_kb():
+    """Return the peak RSS of this process and its children in KiB, or None."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak = max(own, children)
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_case(case):
+    """Run one benchmark case in this process and return its result dict."""
+    out_dir = tempfile.mkdtemp(prefix="bench_out_")
+    try:
+        start = time.perf_counter()
+        if case["direction"] == "jpg_to_pdf":
+            output = os.path.join(out_dir, "out.pdf")
+            result = conversion_engine.jpg_to_pdf(case["inputs"], output,
+                                                  dpi=case["dpi"],
+                                                  quality=case["quality"],
+                                                  **case["options"])
+            output_bytes = os.path.getsize(output)
+        else:
+            result = conversion_engine.pdf_to_jpg(case["inputs"], out_dir,
+                                                  quality=case["quality"],
+                                                  dpi=case["dpi"],
+                                                  **case["options"])
+            output_bytes = sum(os.path.getsize(path) for path in result.outputs)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    return {
+        "pages": result.pages,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(result.pages / elapsed, 3) if elapsed else None,
+        "peak_rss_kb": peak_rss_kb(),
+        "output_bytes": output_bytes,
+    }
+
+
+def run_isolated(case):
+    """Run a case in a fresh interpreter so its peak RSS is its own."""
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(case)],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": f"exit status {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def case_name(case):
+    options = ",".join(f"{key}={value}" for key, value in sorted(case["options"].items()))
+    name = f"{case['direction']}/{case['resolution']}/{case['pages']}p/{case['dpi']}dpi/q{case['quality']}"
+    return f"{name}/{options}" if options else name
+
+
+def build_cases(args):
+    """Generate the corpora and return the list of benchmark cases."""
+    cases = []
+    for resolution in args.resolutions:
+        for pages in args.pages:
+            jpg_paths = build_corpus(args.corpus_dir, resolution, pages, args.seed)
+            pdf_path = build_pdf(args.corpus_dir, resolution, pages, args.seed) if args.pdf else None
+            for dpi in args.dpi:
+                for quality in args.quality:
+                    base = {"resolution": resolution, "pages": pages, "dpi": dpi, "quality": quality}
+                    for layout in args.layouts:
+                        cases.append(dict(base, direction="jpg_to_pdf", inputs=jpg_paths,
+                                          options={"layout": layout, "workers": args.workers}))
+                    if pdf_path:
+                        cases.append(dict(base, direction="pdf_to_jpg", inputs=[pdf_path],
+                                          options={"workers": args.workers}))
+    return cases
+
+
+def compare(results, baseline_path, tolerance):
+    """Print regressions against a baseline results file and return how many there are."""
+    with open(baseline_path) as f:
+        baseline = {entry["name"]: entry for entry in json.load(f)["results"]}
+
+    regressions = 0
+    for entry in results:
+        old = baseline.get(entry["name"])
+        if old is None or "error" in entry or "error" in old:
+            continue
+        for metric, worse_if_higher in (("pages_per_sec", False), ("peak_rss_kb", True),
+                                        ("output_bytes", True)):
+            new_value, old_value = entry.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (change > tolerance) if worse_if_higher else (change < -tolerance):
+                regressions += 1
+                print(f"REGRESSION {entry['name']}: {metric} {old_value} -> {new_value} "
+                      f"({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JPG->PDF and PDF->JPG conversion.")
+    parser.add_argument("--quick", action="store_true", help="Small matrix for smoke runs")
+    parser.add_argument("--resolutions", nargs="+", choices=sorted(RESOLUTIONS), default=None)
+    parser.add_argument("--pages", nargs="+", type=int, default=None, help="Page counts")
+    parser.add_argument("--dpi", nargs="+", type=int, choices=conversion_engine.DPI_VALUES, default=None)
+    parser.add_argument("--quality", nargs="+", type=int, default=DEFAULT_QUALITIES)
+    parser.add_argument("--layouts", nargs="+", choices=conversion_engine.LAYOUTS,
+                        default=[conversion_engine.LAYOUT_REENCODE])
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--no-pdf", dest="pdf", action="store_false",
+                        help="Skip PDF->JPG cases (they need poppler)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "image_pdf_bench"),
+                        help="Where synthetic inputs are generated and reused")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative change before a regression is reported (default: 0.10)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        try:
+            result = run_case(json.loads(args.run_case))
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {str(e).splitlines()[0]}"}
+        print(json.dumps(result))
+        return 0
+
+    args.resolutions = args.resolutions or (QUICK_RESOLUTIONS if args.quick else DEFAULT_RESOLUTIONS)
+    args.pages = args.pages or (QUICK_PAGE_COUNTS if args.quick else DEFAULT_PAGE_COUNTS)
+    args.dpi = args.dpi or (QUICK_DPIS if args.quick else DEFAULT_DPIS)
+    os.makedirs(args.corpus_dir, exist_ok=True)
+
+    results = []
+    print(f"{'case':<72} {'pages/s':>8} {'peak MiB':>9} {'output KiB':>11}")
+    for case in build_cases(args):
+        entry = dict(name=case_name(case), **run_isolated(case))
+        results.append(entry)
+        if "error" in entry:
+            print(f"{entry['name']:<72} ERROR: {entry['error']}")
+            continue
+        rss = f"{entry['peak_rss_kb'] / 1024:.0f}" if entry["peak_rss_kb"] else "n/a"
+        print(f"{entry['name']:<72} {entry['pages_per_sec']:>8.2f} {rss:>9} "
+              f"{entry['output_bytes'] / 1024:>11.0f}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
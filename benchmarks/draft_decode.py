@@ -0,0 +1,71 @@
+"""Benchmark reduced-size (draft) JPEG decoding for the fit step.
+
+Generates synthetic phone and scanner sized JPEGs and times decode + resize
+with full decoding and with fast decoding at every DPI offered in the GUI:
+
+    python benchmarks/draft_decode.py --repeat 5
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import conversion_engine  # noqa: E402
+from page_layout import PageLayout  # noqa: E402
+
+# Typical source sizes: 12 MP phone photo, A4 scans at 300 and 600 DPI
+SOURCE_SIZES = {
+    "phone_12mp": (4032, 3024),
+    "scan_a4_300": (2480, 3508),
+    "scan_a4_600": (4960, 7016),
+}
+
+
+def make_jpeg(size):
+    """Return the bytes of a noisy synthetic JPEG of the given size."""
+    img = Image.effect_noise(size, 48).convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def time_fit(data, dpi, fast_decode, repeat):
+    """Return the best decode + fit time in seconds over ``repeat`` runs.
+
+    The image is fitted to an A4 portrait page, as in a default conversion.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        size = conversion_engine.display_size(img)
+    placement, = PageLayout().placements([size], dpi)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with Image.open(io.BytesIO(data)) as img:
+            conversion_engine.fit_image(img, placement.pixel_size, fast_decode)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is reported)")
+    args = parser.parse_args(argv)
+
+    print(f"{'source':<14} {'dpi':>4} {'full ms':>9} {'fast ms':>9} {'saved ms':>9} {'speedup':>8}")
+    for name, size in SOURCE_SIZES.items():
+        data = make_jpeg(size)
+        for dpi in conversion_engine.DPI_VALUES:
+            full = time_fit(data, dpi, False, args.repeat)
+            fast = time_fit(data, dpi, True, args.repeat)
+            print(f"{name:<14} {dpi:>4} {full * 1000:>9.1f} {fast * 1000:>9.1f} "
+                  f"{(full - fast) * 1000:>9.1f} {full / fast:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
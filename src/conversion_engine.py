@@ -0,0 +1,1410 @@
+"""GUI-free conversion engine for JPG to PDF and PDF to JPG.
+
+The Tk application in image_pdf_converter.py is a thin client of this module.
+It can also be driven headlessly from the command line:
+
+    python -m conversion_engine jpg2pdf output.pdf page1.jpg page2.jpg --dpi 300
+    python -m conversion_engine jpg2pdf output.pdf cover.pdf:1 scan1.jpg scan2.jpg
+    python -m conversion_engine jpg2pdf output.pdf archive.tif:1-10 screenshot.png
+    python -m conversion_engine pdf2jpg output_dir document.pdf --quality 85
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from PIL import Image, ImageOps
+
+from encoders import (COLOR_BILEVEL, COLOR_COLOR, COLOR_GRAY, COLOR_MODES, ENCODING_AUTO,
+                      ENCODING_CHOICES, ENCODING_FLATE, ENCODING_G4, ENCODING_JPEG, EXTENSIONS,
+                      FORMAT_JPEG, IMAGE_FORMATS, PRESET_BALANCED, PRESETS, SUBSAMPLINGS,
+                      EncoderOptions, encode_image, encode_page_image)
+from image_sources import (ImageFrame, auto_encoding, frame_content, frame_count, frame_runs,
+                           has_alpha, iter_frames, on_white, stored_size)
+from instrumentation import ConversionStats, PageTrace
+from page_analysis import (BLANK_INK_SHARE, DUPLICATE_DISTANCE, SCREEN_ACTIONS, SCREEN_OFF,
+                           PageScreen)
+from page_cache import PageCache, page_key, reader as page_cache_reader
+from page_layout import (LAYOUT_PASSTHROUGH, LAYOUT_REENCODE, LAYOUTS, N_UP_GRIDS,
+                         ORIENTATION_AUTO, ORIENTATION_LANDSCAPE, ORIENTATION_PORTRAIT,
+                         ORIENTATIONS, PAGE_FIT, PAGE_SIZE_CHOICES, PAGE_SIZES, POINTS_PER_INCH,
+                         PageLayout, PlannedPage)
+from pdf_extract import embedded_jpeg, open_pdf
+from pdf_merge import (PageCopier, PdfSource, format_page_ranges, parse_page_ranges,
+                       split_page_spec)
+from pdf_writer import StreamingPDFWriter
+
+# Values offered by the DPI combobox in the GUI
+DPI_VALUES = [72, 150, 200, 300, 600]
+
+# Resolution PDF pages are rasterized at, and how many pages each poppler call renders
+RENDER_DPI = 200
+PAGE_CHUNK_SIZE = 8
+
+# Resampling reduces by an integer factor first when the image is at least this
+# many times larger than the target (only used with fast decoding)
+REDUCING_GAP = 3.0
+
+# Threads reading image headers to plan the page layout
+SIZE_READ_WORKERS = 8
+
+ORIENTATION_TAG = 0x0112
+
+# In passthrough mode, sources with more than this many pixels per target pixel
+# (per side) are re-encoded, as embedding them would bloat the PDF
+PASSTHROUGH_MAX_SCALE = 2.0
+
+# Target size mode: pages sampled to estimate the document size, the lowest
+# JPEG quality searched, the share of the budget aimed for, the bytes of PDF
+# structure added per page, and how many conversions may be run to get under
+SIZE_SAMPLE_PAGES = 4
+MIN_QUALITY = 10
+TARGET_SIZE_MARGIN = 0.97
+PDF_PAGE_OVERHEAD = 400
+TARGET_SIZE_PASSES = 2
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+              "G": 1024 ** 3, "GB": 1024 ** 3}
+
+JPG_EXTENSIONS = ('.jpg', '.jpeg')
+PDF_EXTENSIONS = ('.pdf',)
+# Image types JPG to PDF reads, and their extensions
+IMAGE_EXTENSIONS = {"jpg": JPG_EXTENSIONS, "png": ('.png',), "tiff": ('.tif', '.tiff'),
+                    "webp": ('.webp',)}
+IMAGE_TYPES = tuple(IMAGE_EXTENSIONS)
+KNOWN_EXTENSIONS = tuple(extension for extensions in IMAGE_EXTENSIONS.values()
+                         for extension in extensions) + PDF_EXTENSIONS
+
+# File types recognized from their leading bytes. PDF readers accept the
+# header anywhere in the first kilobyte, so that much is read.
+FILE_SIGNATURES = ((b"\xff\xd8\xff", "jpg"), (b"\x89PNG\r\n\x1a\n", "png"),
+                   (b"II*\x00", "tiff"), (b"MM\x00*", "tiff"))
+# WebP files are RIFF containers: "RIFF", the size, then "WEBP"
+RIFF_SIGNATURE = b"RIFF"
+WEBP_FORM = b"WEBP"
+PDF_SIGNATURE = b"%PDF-"
+SNIFF_BYTES = 1024
+
+POPPLER_HELP = (
+    "Poppler is not installed or not found. Please install poppler and add it to your system PATH.\n"
+    "You can download it from: https://github.com/oschwartz10612/poppler-windows/releases\n"
+    "After installing, restart the application."
+)
+
+
+class ConversionError(Exception):
+    """Raised when a conversion cannot be completed."""
+
+
+class PopplerNotFoundError(ConversionError):
+    """Raised when poppler (needed by pdf2image) is not available."""
+
+
+class ConversionCancelled(ConversionError):
+    """Raised from a progress callback to abort a running conversion."""
+
+
+class ProgressEvent:
+    """Progress notification emitted while a conversion runs."""
+
+    def __init__(self, stage, current, total, path=None, message=""):
+        self.stage = stage
+        self.current = current
+        self.total = total
+        self.path = path
+        self.message = message
+
+    @property
+    def percent(self):
+        """Completion percentage of this event's stage."""
+        if not self.total:
+            return 100.0
+        return self.current / self.total * 100
+
+    def __repr__(self):
+        return f"ProgressEvent({self.stage!r}, {self.current}, {self.total}, {self.message!r})"
+
+
+class ConversionResult:
+    """Summary of a finished conversion."""
+
+    def __init__(self, outputs, pages, skipped, elapsed, passthrough=0, stats=None,
+                 quality=None, dpi=None, cached=0, extracted=0, copied=0, flagged=()):
+        self.outputs = outputs
+        self.pages = pages
+        self.skipped = skipped
+        self.elapsed = elapsed
+        self.passthrough = passthrough
+        self.stats = stats
+        # Settings picked by target size mode, if it was used
+        self.quality = quality
+        self.dpi = dpi
+        # Pages reused from the page cache
+        self.cached = cached
+        # PDF pages written from their embedded JPEG instead of rendered
+        self.extracted = extracted
+        # Pages copied unchanged from PDFs merged into the output
+        self.copied = copied
+        # PageAnalysis of every image found blank or duplicate, skipped or not
+        self.flagged = list(flagged)
+
+    @property
+    def pages_per_second(self):
+        """Throughput of the conversion."""
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+
+class EncodedPage:
+    """An encoded JPEG ready to be placed on a PDF page.
+
+    ``page_size`` is in points. ``image_box`` is the (x, y, width, height)
+    rectangle in points the image is drawn into, or None to fill the page;
+    with N-up layouts several images share a page.
+    ``passthrough`` is True when ``data`` are the unmodified source bytes.
+    ``trace`` is the PageTrace of the work done to produce the page.
+    ``cache_key`` is the page's key in the page cache, if one is used, and
+    ``cached`` is True when the page was read from it. ``encoding`` is one of
+    encoders.PAGE_ENCODINGS; despite the class name, flate and g4 pages are
+    not JPEGs.
+    """
+
+    def __init__(self, data, width, height, mode, page_size, image_box=None, passthrough=False,
+                 trace=None, cache_key=None, cached=False, encoding=ENCODING_JPEG):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.page_size = page_size
+        self.image_box = image_box
+        self.passthrough = passthrough
+        self.trace = trace
+        self.cache_key = cache_key
+        self.cached = cached
+        self.encoding = encoding
+
+
+def sniff_file_type(path):
+    """Return "jpg", "png", "tiff", "webp" or "pdf" from a file's leading bytes, or None."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    for signature, file_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return file_type
+    if head.startswith(RIFF_SIGNATURE) and head[8:12] == WEBP_FORM:
+        return "webp"
+    if PDF_SIGNATURE in head:
+        return "pdf"
+    return None
+
+
+def _has_type(path, extensions, file_type):
+    lower = path.lower()
+    if lower.endswith(extensions):
+        return True
+    if lower.endswith(KNOWN_EXTENSIONS):
+        return False
+    # No known extension (e.g. scanner output named "scan_0001"): look at the content
+    return sniff_file_type(path) == file_type
+
+
+def is_jpg(path):
+    """Return True if the path has a JPG extension, or no known extension and JPEG content."""
+    return _has_type(path, JPG_EXTENSIONS, "jpg")
+
+
+def is_pdf(path):
+    """Return True if the path has a PDF extension, or no known extension and PDF content."""
+    return _has_type(path, PDF_EXTENSIONS, "pdf")
+
+
+def image_type(path):
+    """Return the IMAGE_TYPES entry of a path, or None if it is not an image JPG to PDF reads.
+
+    The extension decides; files without a known extension are sniffed.
+    """
+    lower = path.lower()
+    for file_type, extensions in IMAGE_EXTENSIONS.items():
+        if lower.endswith(extensions):
+            return file_type
+    if lower.endswith(PDF_EXTENSIONS):
+        return None
+    file_type = sniff_file_type(path)
+    return file_type if file_type in IMAGE_TYPES else None
+
+
+def is_image(path):
+    """Return True if the path is a JPEG, PNG, TIFF or WebP image (see image_type)."""
+    return image_type(path) is not None
+
+
+def image_frames(spec):
+    """Return the ImageFrames of an image input: ``path``, or ``path:ranges`` for some pages.
+
+    Every page of a multi-page TIFF is included unless ranges are given.
+    Raises ConversionError for unreadable files and bad ranges.
+    """
+    path, ranges = split_page_spec(spec)
+    count = 1
+    try:
+        if ranges is not None or image_type(path) == "tiff":
+            count = frame_count(path)
+        numbers = parse_page_ranges(ranges, count)
+    except (OSError, ValueError) as e:
+        raise ConversionError(f"{path}: {e}") from None
+    return [ImageFrame(path, number - 1, count) for number in numbers]
+
+
+def split_inputs(file_paths):
+    """Sort the inputs of JPG to PDF into document segments.
+
+    Returns (images, segments, skipped): ``images`` are the ImageFrame of
+    every image page and ``segments`` are, in document order, lists of
+    consecutive ImageFrames and a PdfSource per PDF to merge. TIFFs and
+    PDFs may be given as ``path:ranges`` to take some of their pages (see
+    pdf_merge.split_page_spec). ``skipped`` counts the other paths, which
+    are left out.
+    """
+    images = []
+    segments = []
+    skipped = 0
+    for spec in file_paths:
+        path, ranges = split_page_spec(spec)
+        if is_image(path):
+            frames = image_frames(spec)
+            images.extend(frames)
+            if not segments or isinstance(segments[-1], PdfSource):
+                segments.append([])
+            segments[-1].extend(frames)
+        elif is_pdf(path):
+            segments.append(PdfSource(path, ranges))
+        else:
+            skipped += 1
+    return images, segments, skipped
+
+
+def input_specs(segments):
+    """Return JPG to PDF inputs that select exactly the pages of ``segments``."""
+    specs = []
+    for segment in segments:
+        if isinstance(segment, PdfSource):
+            specs.append(segment.spec)
+            continue
+        for run in frame_runs(segment, run_size=None):
+            image = run[0]
+            if image.frame_count == 1 and len(run) == 1:
+                specs.append(image.path)
+            else:
+                ranges = format_page_ranges(frame.frame + 1 for frame in run)
+                specs.append(f"{image.path}:{ranges}")
+    return specs
+
+
+def exif_orientation(img):
+    """Return an opened image's EXIF orientation (1 when missing)."""
+    return img.getexif().get(ORIENTATION_TAG, 1)
+
+
+def display_size(img):
+    """Return an opened image's (width, height) as shown, after EXIF rotation."""
+    # EXIF orientations 5-8 swap width and height when displayed
+    if exif_orientation(img) in (5, 6, 7, 8):
+        return img.height, img.width
+    return img.size
+
+
+def _run_display_sizes(run):
+    # Opening and seeking only read headers; no pixels are decoded
+    with closing(iter_frames(run[0].path, [image.frame for image in run])) as frames:
+        return [display_size(img) for img in frames]
+
+
+def read_display_sizes(images):
+    """Return the displayed pixel size of every ImageFrame, reading headers in parallel."""
+    # Each file is read in one run, so a TIFF's directories are walked once
+    with ThreadPoolExecutor(max_workers=SIZE_READ_WORKERS) as executor:
+        return [size for sizes in executor.map(_run_display_sizes, frame_runs(images, None))
+                for size in sizes]
+
+
+def fit_image(img, size, fast_decode=False, trace=None, mode='RGB'):
+    """Return an opened image upright, in ``mode`` and resampled to ``size``.
+
+    ``size`` is the (width, height) the image is shown at, as planned by a
+    PageLayout. ``mode`` is RGB, or L for gray and bilevel pages; color JPEGs
+    are then decoded straight to gray. Transparent parts become white, like
+    the page behind them. With ``fast_decode`` a not-yet-loaded
+    JPEG is decoded by libjpeg at 1/2, 1/4 or 1/8 scale (never below the
+    target size) before the final Lanczos resample, which is much cheaper for
+    sources far larger than the target. Stage timings are recorded in ``trace`` when one is given.
+    """
+    if trace is None:
+        trace = PageTrace()
+    new_width, new_height = size
+    orientation = exif_orientation(img)
+    transposed = orientation in (5, 6, 7, 8)
+
+    with trace.stage("decode"):
+        # Only has an effect on JPEGs that have not been decoded yet
+        if fast_decode:
+            img.draft(mode if mode == 'L' else img.mode,
+                      (new_height, new_width) if transposed else (new_width, new_height))
+        elif mode == 'L':
+            img.draft(mode, None)
+        img.load()
+
+    with trace.stage("convert"):
+        if orientation != 1:
+            # Apply rotations stored losslessly in the EXIF Orientation tag
+            img = ImageOps.exif_transpose(img)
+
+        if has_alpha(img):
+            img = on_white(img)
+        if img.mode != mode:
+            img = img.convert(mode)
+
+    if img.size == (new_width, new_height):
+        return img
+    # Use high-quality Lanczos resampling
+    with trace.stage("resize"):
+        return img.resize((new_width, new_height), Image.Resampling.LANCZOS,
+                          reducing_gap=REDUCING_GAP if fast_decode else None)
+
+
+def encode_page(img, size, dpi, quality, fast_decode=True, trace=None, encoding=ENCODING_JPEG,
+                options=None):
+    """Resample an opened image to ``size`` and encode it for a PDF page.
+
+    Returns (data, mode); see encoders.encode_page_image.
+    """
+    if trace is None:
+        trace = PageTrace()
+    if options is None:
+        options = EncoderOptions()
+    fitted = fit_image(img, size, fast_decode, trace, options.working_mode)
+
+    with trace.stage("encode"):
+        data, mode = encode_page_image(fitted, encoding, quality, options, dpi)
+    trace.add_bytes("encoded", len(data))
+    return data, mode
+
+
+def can_pass_through(img, fit_pixels, modes=('RGB', 'L')):
+    """Return True if an opened image can be embedded in the PDF unchanged.
+
+    Only upright baseline JPEGs in one of ``modes`` (RGB or grayscale)
+    qualify; CMYK, progressive and EXIF-rotated files, and sources much
+    larger than ``fit_pixels`` (the size they are shown at, see Placement),
+    are re-encoded.
+    """
+    if img.format != 'JPEG' or img.mode not in modes:
+        return False
+    if img.info.get('progressive') or img.info.get('progression'):
+        return False
+    if exif_orientation(img) != 1:
+        return False
+    return img.width <= fit_pixels[0] * PASSTHROUGH_MAX_SCALE
+
+
+def page_settings(img, path, placement, encoding, options):
+    """Return the (encoding, options) a source image is encoded with at ``placement``.
+
+    For ENCODING_AUTO the encoding is the one that suits the opened source
+    (see image_sources.auto_encoding), and gray lossless sources stay gray.
+    Group 4 pages are resampled in gray, as they end up black and white.
+    """
+    auto = encoding == ENCODING_AUTO
+    if auto:
+        encoding = auto_encoding(img, path, display_size(img)[0] / placement.pixel_size[0])
+    if encoding == ENCODING_G4 and options.color != COLOR_BILEVEL:
+        options = options.with_color(COLOR_BILEVEL)
+    elif (auto and encoding == ENCODING_FLATE and options.color == COLOR_COLOR
+          and img.mode in ('L', 'LA')):
+        options = options.with_color(COLOR_GRAY)
+    return encoding, options
+
+
+def prepare_pages(images, placements, dpi, quality, fast_decode=True, layout=LAYOUT_REENCODE,
+                  cache=None, encoding=ENCODING_AUTO, options=None):
+    """Produce the EncodedPages of a run of frames of one file at their ``placements``.
+
+    ``images`` are ImageFrames of one file in ascending order (see
+    image_sources.frame_runs): the file is opened once and its frames are
+    decoded one at a time. Pages are encoded with ``encoding``, or with
+    ENCODING_AUTO each in the encoding that suits its source (see
+    page_settings).
+
+    In passthrough layout a suitable JPEG is read as-is and scaled into its
+    box by the page transform (JPEG pages only, and only grayscale sources
+    for gray pages); everything else is resampled to the planned pixel size
+    and encoded by encode_page with ``options``, unless ``cache`` already
+    holds the result: a PageCache, or in worker processes the path of one,
+    opened through page_cache.reader. Each page's ``trace`` records the time
+    spent in each stage.
+    """
+    if options is None:
+        options = EncoderOptions()
+    pages = []
+    frames = iter_frames(images[0].path, [image.frame for image in images])
+    with closing(frames):
+        for image, placement in zip(images, placements):
+            trace = PageTrace(path=image.path)
+            if image.frame_count > 1:
+                trace.info["frame"] = image.frame + 1
+            with trace.stage("open"):
+                img = next(frames)
+            pages.append(_prepare_frame(img, image, placement, dpi, quality, fast_decode, layout,
+                                        cache, encoding, options, trace))
+    return pages
+
+
+def _prepare_frame(img, image, placement, dpi, quality, fast_decode, layout, cache,
+                   encoding, options, trace):
+    multi_page = image.frame_count > 1
+    trace.add_bytes("input", stored_size(img) if multi_page else os.path.getsize(image.path))
+    encoding, options = page_settings(img, image.path, placement, encoding, options)
+
+    if layout == LAYOUT_PASSTHROUGH and encoding == ENCODING_JPEG:
+        if can_pass_through(img, placement.fit_pixels, (options.working_mode, 'L')):
+            with trace.stage("read"):
+                with open(image.path, 'rb') as f:
+                    data = f.read()
+            trace.add_bytes("encoded", len(data))
+            return EncodedPage(data, img.width, img.height, img.mode, placement.page_size,
+                               placement.box, passthrough=True, trace=trace)
+
+    width, height = placement.pixel_size
+    key = None
+    if cache is not None:
+        with trace.stage("hash"):
+            # Hashing a whole multi-page file for each of its pages would cost more than encoding
+            key = page_key(image.path, placement.pixel_size, dpi, quality, fast_decode,
+                           f"{encoding}|{options.key()}",
+                           frame_content(img) if multi_page else None)
+        with trace.stage("cache"):
+            if isinstance(cache, str):
+                cache = page_cache_reader(cache)
+            cached = cache.lookup(key)
+        if cached is not None:
+            trace.add_bytes("encoded", len(cached.data))
+            return EncodedPage(cached.data, cached.width, cached.height, cached.mode,
+                               placement.page_size, placement.box, trace=trace, cache_key=key,
+                               cached=True, encoding=encoding)
+
+    data, mode = encode_page(img, placement.pixel_size, dpi, quality, fast_decode, trace,
+                             encoding, options)
+    return EncodedPage(data, width, height, mode, placement.page_size, placement.box,
+                       trace=trace, cache_key=key, encoding=encoding)
+
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temporary path next to ``path`` that replaces it on success.
+
+    Readers of ``path`` never see a partially written file, and a failed or
+    cancelled write leaves any previous file in place.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    # Not mkstemp: the file is created by the caller so it gets the usual permissions
+    temp_path = os.path.join(directory, f".{name}.{os.urandom(4).hex()}.part")
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _notify(progress, event):
+    if progress is not None:
+        progress(event)
+
+
+def default_workers():
+    """Return the default number of worker processes (one per CPU core)."""
+    return os.cpu_count() or 1
+
+
+def map_ordered(executor, fn, iterable, window):
+    """Like ``executor.map`` but with at most ``window`` tasks in flight.
+
+    Results are yielded in input order. Bounding the number of pending tasks
+    keeps finished-but-unconsumed results from piling up in memory.
+    """
+    pending = deque()
+    for args in iterable:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parse_size(text):
+    """Parse a byte size such as ``10MB``, ``500K`` or ``1048576``."""
+    text = text.strip().upper().replace(" ", "")
+    number = text.rstrip("KMGB")
+    try:
+        return int(float(number) * SIZE_UNITS[text[len(number):]])
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid size: {text!r} (use e.g. 10MB or 500KB)") from None
+
+
+def format_size(size):
+    """Format a byte count as a short human readable string."""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def sample_paths(paths, count):
+    """Return up to ``count`` paths spread evenly over ``paths``."""
+    if len(paths) <= count:
+        return list(paths)
+    step = len(paths) / count
+    return [paths[int(step * index + step / 2)] for index in range(count)]
+
+
+class SizeProbe:
+    """One sampled page (an ImageFrame), prepared once and encoded at candidate qualities."""
+
+    def __init__(self, image, placement, dpi, fast_decode=True, layout=LAYOUT_REENCODE,
+                 options=None, encoding=ENCODING_JPEG):
+        self.dpi = dpi
+        self.options = options if options is not None else EncoderOptions()
+        self.image = None
+        self.fixed_size = None
+        self._sizes = {}
+        with closing(iter_frames(image.path, [image.frame])) as frames:
+            img = next(frames)
+            encoding, page_options = page_settings(img, image.path, placement, encoding,
+                                                   self.options)
+            if encoding != ENCODING_JPEG:
+                # Lossless and Group 4 pages do not depend on the quality
+                data, _ = encode_page(img, placement.pixel_size, dpi, MIN_QUALITY, fast_decode,
+                                      encoding=encoding, options=page_options)
+                self.fixed_size = len(data)
+            elif layout == LAYOUT_PASSTHROUGH and can_pass_through(
+                    img, placement.fit_pixels, (self.options.working_mode, 'L')):
+                # Embedded unchanged, so its size does not depend on the quality
+                self.fixed_size = os.path.getsize(image.path)
+            else:
+                self.image = fit_image(img, placement.pixel_size, fast_decode,
+                                       mode=self.options.working_mode)
+
+    def size(self, quality):
+        """Return the encoded size of the page at ``quality``."""
+        if self.fixed_size is not None:
+            return self.fixed_size
+        if quality not in self._sizes:
+            data, _ = encode_page_image(self.image, ENCODING_JPEG, quality, self.options, self.dpi)
+            self._sizes[quality] = len(data)
+        return self._sizes[quality]
+
+
+class SizeEstimate:
+    """Quality and DPI chosen for a size budget, with the predicted PDF size."""
+
+    def __init__(self, quality, dpi, layout, estimated_bytes, fits):
+        self.quality = quality
+        self.dpi = dpi
+        self.layout = layout
+        self.estimated_bytes = estimated_bytes
+        self.fits = fits
+
+    def __repr__(self):
+        return (f"SizeEstimate(quality={self.quality}, dpi={self.dpi}, layout={self.layout!r}, "
+                f"estimated_bytes={self.estimated_bytes}, fits={self.fits})")
+
+
+def estimate_quality(images, target_bytes, dpi=300, max_quality=85, fast_decode=True,
+                     layout=LAYOUT_REENCODE, adjust_dpi=False, samples=SIZE_SAMPLE_PAGES,
+                     progress=None, page_layout=None, sizes=None, options=None,
+                     encoding=ENCODING_JPEG):
+    """Find the highest JPEG quality whose PDF is predicted to fit ``target_bytes``.
+
+    A few pages spread over the document are resampled once and encoded in
+    memory at the qualities visited by a binary search between MIN_QUALITY and
+    ``max_quality``; the mean sampled page size predicts the whole document.
+    Passthrough pages cannot shrink, so in that layout re-encoding every page
+    is tried next. With ``adjust_dpi``, lower DPI_VALUES are tried when even
+    MIN_QUALITY is too large at ``dpi`` (pages sized to their image keep all
+    their pixels at any DPI, so there it only changes the page size).
+
+    ``images`` are the ImageFrames of the pages. They are placed by
+    ``page_layout`` (default: one per A4 portrait page); ``sizes`` are their
+    display sizes if already read (see read_display_sizes). Pages are JPEG
+    encoded with ``options`` (an EncoderOptions); with ENCODING_AUTO
+    ``encoding``, pages that suit another encoding are sampled at their
+    fixed size in it. Returns a SizeEstimate; ``fits`` is False if no
+    setting is predicted to fit (the smallest one tried is returned).
+    """
+    if page_layout is None:
+        page_layout = PageLayout()
+    if sizes is None:
+        sizes = read_display_sizes(images)
+    sampled = sample_paths(range(len(images)), samples)
+    page_budget = target_bytes * TARGET_SIZE_MARGIN / len(images) - PDF_PAGE_OVERHEAD
+    candidates = [(layout, dpi)]
+    if layout == LAYOUT_PASSTHROUGH:
+        candidates.append((LAYOUT_REENCODE, dpi))
+    if adjust_dpi and page_layout.page_size != PAGE_FIT:
+        candidates += [(LAYOUT_REENCODE, value)
+                       for value in sorted(DPI_VALUES, reverse=True) if value < dpi]
+
+    def estimated_bytes(page_size):
+        return int((page_size + PDF_PAGE_OVERHEAD) * len(images))
+
+    with ThreadPoolExecutor(max_workers=len(sampled)) as executor:
+        for candidate_layout, candidate_dpi in candidates:
+            _notify(progress, ProgressEvent("estimate", 0, 1, None,
+                                            f"Sampling {len(sampled)} page(s) at {candidate_dpi} DPI..."))
+            placements = page_layout.placements(sizes, candidate_dpi)
+            probes = list(executor.map(
+                lambda index: SizeProbe(images[index], placements[index], candidate_dpi,
+                                        fast_decode, candidate_layout, options, encoding),
+                sampled))
+
+            def mean_size(quality):
+                _notify(progress, ProgressEvent("estimate", 0, 1, None,
+                                                f"Trying quality {quality} at {candidate_dpi} DPI..."))
+                sizes = list(executor.map(lambda probe: probe.size(quality), probes))
+                return sum(sizes) / len(sizes)
+
+            smallest = mean_size(MIN_QUALITY)
+            if smallest > page_budget:
+                continue
+
+            # Largest quality whose mean page size fits the per-page budget
+            low, high = MIN_QUALITY, max(MIN_QUALITY, max_quality)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if mean_size(middle) <= page_budget:
+                    low = middle
+                else:
+                    high = middle - 1
+            return SizeEstimate(low, candidate_dpi, candidate_layout,
+                                estimated_bytes(mean_size(low)), True)
+
+    return SizeEstimate(MIN_QUALITY, candidate_dpi, candidate_layout,
+                        estimated_bytes(smallest), False)
+
+
+def jpg_to_pdf(file_paths, output_path, dpi=300, quality=85, progress=None, streaming=True,
+               workers=None, fast_decode=True, layout=LAYOUT_REENCODE, trace_path=None,
+               target_size=None, adjust_dpi=False, page_cache=None, page_size="a4",
+               orientation=ORIENTATION_PORTRAIT, n_up=1, encoding=ENCODING_AUTO,
+               encoder_options=None, screen=None):
+    """Convert JPG, PNG, WebP and TIFF images to a single PDF.
+
+    Every page of a multi-page TIFF is included, or some of them given as
+    ``path:ranges`` (e.g. ``archive.tif:1-10``). PDFs among the inputs (``path:ranges`` for some of their pages, e.g.
+    ``cover.pdf:1-2``) have their pages copied into the output unchanged, at
+    their place in the input order, without rendering; this needs pypdf and
+    ``streaming``. Other paths are skipped. ``progress`` is called with a ProgressEvent
+    as each page is finished and may raise ConversionCancelled to stop. With
+    ``streaming`` each page is written to the output as soon as it is encoded,
+    so memory use does not grow with the number of pages; otherwise all pages
+    are collected and handed to img2pdf.
+
+    Pages are processed by a pool of ``workers`` processes (default: one per
+    CPU core) and reassembled in ``file_paths`` order. ``workers=1`` runs
+    everything in the calling process. ``fast_decode`` enables reduced-size
+    JPEG decoding (see fit_image); turn it off for maximum resampling quality.
+    ``layout`` is one of LAYOUTS (see prepare_pages).
+
+    ``page_size`` is a key of PAGE_SIZES or PAGE_FIT (each page the size of
+    its image at ``dpi``), ``orientation`` one of ORIENTATIONS and ``n_up``
+    the number of images per sheet (a key of N_UP_GRIDS); see PageLayout.
+    Every image is encoded at the size it is shown at, never larger than the
+    source, and placed by the page transform, so margins cost nothing.
+    N-up needs ``streaming``.
+
+    ``encoding`` is the image stream encoding of re-encoded pages (one of
+    ENCODING_CHOICES: JPEG, lossless Flate, bilevel CCITT Group 4, or auto
+    to pick per page: Group 4 for bilevel sources, Flate for lossless ones
+    shown at their own size, JPEG otherwise) and ``encoder_options`` an
+    EncoderOptions with the speed/size preset, colour mode and JPEG settings
+    (default: balanced, color). Flate and Group 4 need ``streaming``, and
+    without it auto means JPEG; target size mode needs JPEG or auto.
+
+    Per-stage timings and byte counts are returned in ``result.stats``; with
+    ``trace_path`` one JSON line per page is also appended to that file.
+
+    With ``target_size`` (bytes) the JPEG quality, capped at ``quality``, is
+    chosen by estimate_quality so the PDF fits the budget, lowering the DPI
+    too if ``adjust_dpi`` is set. If the finished PDF still overshoots, the
+    estimate is corrected and the conversion runs once more. The settings
+    used are returned in ``result.quality`` and ``result.dpi``.
+
+    ``page_cache`` is an optional PageCache: pages whose source bytes and
+    settings were converted before are reused from it instead of re-encoded,
+    and newly encoded pages are added to it.
+
+    ``screen`` is an optional PageScreen: the JPGs are checked for blank and
+    duplicate pages before anything is planned or encoded, and the pages it
+    skips are left out. Every flagged page is returned in ``result.flagged``.
+    """
+    if layout not in LAYOUTS:
+        raise ConversionError(f"Unknown page layout: {layout}")
+    try:
+        page_layout = PageLayout(page_size, orientation, n_up)
+    except ValueError as e:
+        raise ConversionError(str(e)) from None
+    if n_up > 1 and not streaming:
+        raise ConversionError("Several images per page need the streaming writer")
+    if encoding not in ENCODING_CHOICES:
+        raise ConversionError(f"Unknown page encoding: {encoding}")
+    if encoder_options is None:
+        encoder_options = EncoderOptions()
+    if encoding == ENCODING_AUTO and not streaming:
+        # img2pdf is handed JPEG files
+        encoding = ENCODING_JPEG
+    if encoding == ENCODING_AUTO and encoder_options.color == COLOR_BILEVEL:
+        encoding = ENCODING_G4
+    if encoding == ENCODING_JPEG and encoder_options.color == COLOR_BILEVEL:
+        raise ConversionError("JPEG pages cannot be bilevel; use the g4 or flate encoding")
+    if encoding == ENCODING_G4:
+        # Resample in gray rather than color, as the page ends up black and white
+        encoder_options = encoder_options.with_color(COLOR_BILEVEL)
+    if encoding not in (ENCODING_JPEG, ENCODING_AUTO) and not streaming:
+        raise ConversionError(f"{encoding} pages need the streaming writer")
+    if encoding not in (ENCODING_JPEG, ENCODING_AUTO) and target_size is not None:
+        raise ConversionError("Target size mode needs JPEG pages")
+
+    start = time.perf_counter()
+    images, segments, skipped = split_inputs(file_paths)
+    if not segments:
+        raise ConversionError("No image or PDF files selected")
+
+    flagged = []
+    screen_trace = None
+    if screen is not None and screen.enabled and images:
+        screen_trace = PageTrace()
+        with screen_trace.stage("screen"):
+            try:
+                analyses = screen.analyze(images, progress=lambda done, total: _notify(
+                    progress, ProgressEvent("screen", done, total, images[done - 1].path,
+                                            f"Checked image {done} of {total} for blank "
+                                            f"and duplicate pages")))
+            except ImportError as e:
+                raise ConversionError(str(e)) from e
+        flagged = [analysis for analysis in analyses if analysis.flagged]
+        dropped = {id(analysis.image) for analysis in analyses if screen.skips(analysis)}
+        if dropped:
+            segments = [segment if isinstance(segment, PdfSource)
+                        else [image for image in segment if id(image) not in dropped]
+                        for segment in segments]
+            segments = [segment for segment in segments if segment]
+            images = [image for image in images if id(image) not in dropped]
+            if not segments:
+                raise ConversionError("Every page is blank or a duplicate")
+            # What is left, for the target size passes below
+            file_paths = input_specs(segments)
+
+    sources = [segment for segment in segments if isinstance(segment, PdfSource)]
+    if sources and not streaming:
+        raise ConversionError("Merging PDFs needs the streaming writer")
+
+    plan_trace = PageTrace()
+    with plan_trace.stage("plan"):
+        sizes = read_display_sizes(images)
+        for source in sources:
+            try:
+                source.resolve()
+            except ImportError as e:
+                raise ConversionError(str(e)) from e
+            except (OSError, ValueError) as e:
+                raise ConversionError(f"{source.path}: {e}") from e
+
+    if target_size is not None:
+        if not images:
+            raise ConversionError("Target size mode needs image pages")
+        # Copied pages cannot shrink, so the JPGs get what they leave over
+        copied_bytes = sum(source.estimated_bytes for source in sources)
+        budget = target_size
+        for _ in range(TARGET_SIZE_PASSES):
+            if budget <= copied_bytes:
+                raise ConversionError(f"The merged PDF pages alone need about "
+                                      f"{format_size(copied_bytes)}")
+            estimate = estimate_quality(images, budget - copied_bytes, dpi, quality,
+                                        fast_decode, layout, adjust_dpi, progress=progress,
+                                        page_layout=page_layout, sizes=sizes,
+                                        options=encoder_options, encoding=encoding)
+            if not estimate.fits:
+                raise ConversionError(
+                    f"{len(images)} page(s) cannot fit in {format_size(target_size)}; the "
+                    f"smallest setting tried (quality {estimate.quality} at {estimate.dpi} DPI) "
+                    f"needs about {format_size(estimate.estimated_bytes)}")
+            # Flagged pages are already left out of file_paths
+            result = jpg_to_pdf(file_paths, output_path, estimate.dpi, estimate.quality, progress,
+                                streaming, workers, fast_decode, estimate.layout, trace_path,
+                                page_cache=page_cache, page_size=page_size,
+                                orientation=orientation, n_up=n_up, encoding=encoding,
+                                encoder_options=encoder_options)
+            actual_size = os.path.getsize(output_path)
+            if actual_size <= target_size:
+                break
+            # The samples under-predicted this document: scale the budget by the error
+            budget = budget * target_size / actual_size
+        result.quality, result.dpi = estimate.quality, estimate.dpi
+        result.skipped = skipped
+        result.flagged = flagged
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    total_files = len(file_paths)
+    total_pages = len(images) + sum(len(source.page_numbers) for source in sources)
+    if workers is None:
+        workers = default_workers()
+    workers = max(1, min(workers, len(images)))
+    passthrough_pages = 0
+    copied_pages = 0
+    pages_done = 0
+    cached_keys = []
+    stats = ConversionStats(trace_path)
+    if screen_trace is not None:
+        stats.add(screen_trace)
+    with plan_trace.stage("plan"):
+        # Each run of images between merged PDFs starts on a fresh sheet
+        pages = []
+        first = 0
+        for segment in segments:
+            if isinstance(segment, PdfSource):
+                pages.append(segment)
+            else:
+                pages.extend(page_layout.plan(sizes[first:first + len(segment)], dpi))
+                first += len(segment)
+    stats.add(plan_trace)
+
+    def encoded_pages():
+        nonlocal passthrough_pages, pages_done
+        placements = iter([placement for page in pages if isinstance(page, PlannedPage)
+                           for placement in page.placements])
+        # Frames of a multi-page file are read in runs, one open file per task. Workers
+        # open the page cache by path; in-process its connection is shared
+        if page_cache is None or workers == 1:
+            cache = page_cache
+        else:
+            cache = page_cache.db_path
+        tasks = ((run, [next(placements) for _ in run], dpi, quality, fast_decode, layout,
+                  cache, encoding, encoder_options)
+                 for run in frame_runs(images))
+        if workers == 1:
+            runs = (prepare_pages(*task) for task in tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            runs = map_ordered(executor, prepare_pages, tasks, window=workers * 2)
+        results = (page for run in runs for page in run)
+
+        try:
+            for index, page in enumerate(results):
+                passthrough_pages += page.passthrough
+                page.trace.page = index + 1
+                page.trace.info["passthrough"] = page.passthrough
+                page.trace.info["cached"] = page.cached
+                if page.cached:
+                    cached_keys.append(page.cache_key)
+                elif page.cache_key is not None:
+                    page_cache.store(page.cache_key, page.data, page.width, page.height,
+                                     page.mode, page.page_size)
+                pages_done += 1
+                _notify(progress, ProgressEvent("encode", pages_done, total_pages,
+                                                images[index].path,
+                                                f"Processed image {index + 1} of {len(images)}"))
+                yield page
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    # One copier per source file, so objects shared by its pages are written once
+    copiers = {}
+
+    def copy_pages(writer, source):
+        nonlocal copied_pages, pages_done
+        if source.path not in copiers:
+            copiers[source.path] = PageCopier(writer, open_pdf(source.path))
+        copier = copiers[source.path]
+        for page_number in source.page_numbers:
+            trace = PageTrace(page=page_number, path=source.path)
+            position = writer.position
+            with trace.stage("copy"):
+                copier.copy_page(page_number)
+            trace.add_bytes("output", writer.position - position)
+            stats.add(trace)
+            copied_pages += 1
+            pages_done += 1
+            _notify(progress, ProgressEvent("copy", pages_done, total_pages, source.path,
+                                            f"Copied page {page_number} of "
+                                            f"{os.path.basename(source.path)}"))
+
+    try:
+        if streaming:
+            with atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as f, StreamingPDFWriter(f) as writer:
+                    with closing(encoded_pages()) as encoded:
+                        for planned in pages:
+                            if isinstance(planned, PdfSource):
+                                copy_pages(writer, planned)
+                                continue
+                            sheet = [next(encoded) for _ in planned.placements]
+                            # With N-up the sheet's write time is booked to its last image
+                            with sheet[-1].trace.stage("write"):
+                                writer.add_page(planned.size,
+                                                [(image.data, image.width, image.height,
+                                                  image.mode, image.image_box, image.encoding)
+                                                 for image in sheet])
+                            for image in sheet:
+                                stats.add(image.trace)
+                    _notify(progress, ProgressEvent("write", total_files, total_files, output_path,
+                                                    "Finishing PDF..."))
+        else:
+            compressed_images = []
+            for page in encoded_pages():
+                compressed_images.append(page.data)
+                stats.add(page.trace)
+            _notify(progress, ProgressEvent("write", total_files, total_files, output_path,
+                                            "Writing PDF..."))
+            import img2pdf
+            if page_size == PAGE_FIT:
+                def layout_fun(width, height, _dpi):
+                    page = (width * POINTS_PER_INCH / dpi, height * POINTS_PER_INCH / dpi)
+                    return (*page, *page)
+            else:
+                # Images are only as large as they are shown; img2pdf scales them onto the page
+                short_side, long_side = sorted(side * POINTS_PER_INCH
+                                               for side in PAGE_SIZES[page_size])
+                paper = ((long_side, short_side) if orientation == ORIENTATION_LANDSCAPE
+                         else (short_side, long_side))
+                layout_fun = img2pdf.get_layout_fun(paper, fit=img2pdf.FitMode.into,
+                                                    auto_orient=orientation == ORIENTATION_AUTO)
+            document_trace = PageTrace(path=output_path)
+            with document_trace.stage("img2pdf"):
+                pdf_bytes = img2pdf.convert(compressed_images, layout_fun=layout_fun)
+            with document_trace.stage("write"), atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as f:
+                    f.write(pdf_bytes)
+            stats.add(document_trace)
+    finally:
+        stats.close()
+        if page_cache is not None:
+            page_cache.touch(cached_keys)
+            page_cache.flush()
+
+    return ConversionResult([output_path], total_pages, skipped,
+                            time.perf_counter() - start, passthrough_pages, stats,
+                            cached=len(cached_keys), copied=copied_pages, flagged=flagged)
+
+
+def check_poppler(pdf_path):
+    """Raise PopplerNotFoundError if poppler cannot read the given PDF."""
+    from pdf2image import convert_from_path
+    from pdf2image.exceptions import PDFPageCountError, PDFInfoNotInstalledError
+    try:
+        convert_from_path(pdf_path, first_page=1, last_page=1)
+    except (PDFInfoNotInstalledError, PDFPageCountError) as e:
+        raise PopplerNotFoundError(POPPLER_HELP) from e
+
+
+def pdf_page_count(pdf_path):
+    """Return the number of pages in a PDF using poppler's pdfinfo."""
+    from pdf2image import pdfinfo_from_path
+    from pdf2image.exceptions import PDFInfoNotInstalledError
+    try:
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+    except PDFInfoNotInstalledError as e:
+        raise PopplerNotFoundError(POPPLER_HELP) from e
+
+
+def page_chunks(page_count, chunk_size):
+    """Split pages 1..page_count into inclusive (first, last) ranges."""
+    return [(first, min(first + chunk_size - 1, page_count))
+            for first in range(1, page_count + 1, chunk_size)]
+
+
+def page_runs(pages, chunk_size):
+    """Group ascending page numbers into inclusive (first, last) ranges of
+    consecutive pages, at most ``chunk_size`` long."""
+    runs = []
+    for page in pages:
+        if runs and runs[-1][1] == page - 1 and page - runs[-1][0] < chunk_size:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+
+def poppler_encodes(image_format, options):
+    """Return True if poppler can write pages in this format itself."""
+    return (image_format == FORMAT_JPEG and options.working_mode == 'RGB'
+            and options.subsampling is None)
+
+
+def render_page_chunk(pdf_path, first_page, last_page, work_dir, dpi, quality, trace=None,
+                      image_format=FORMAT_JPEG, options=None):
+    """Render a page range to image files.
+
+    Returns the rendered file paths in page order. Color JPEGs are encoded
+    by poppler as it renders each page, so no page is ever held in this
+    process's memory. Other formats (see encoders.encode_image) are rendered
+    to uncompressed files and encoded one page at a time.
+    """
+    from pdf2image import convert_from_path
+    from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError
+
+    if trace is None:
+        trace = PageTrace()
+    if options is None:
+        options = EncoderOptions()
+    chunk_dir = os.path.join(work_dir, f"chunk_{first_page}")
+    os.mkdir(chunk_dir)
+    direct = poppler_encodes(image_format, options)
+    with trace.stage("render"):
+        try:
+            rendered = convert_from_path(pdf_path,
+                                         dpi=dpi,
+                                         first_page=first_page,
+                                         last_page=last_page,
+                                         output_folder=chunk_dir,
+                                         output_file="page",
+                                         fmt="jpeg" if direct else "ppm",
+                                         jpegopt={"quality": quality,
+                                                  "progressive": options.progressive,
+                                                  "optimize": options.optimize} if direct else None,
+                                         grayscale=options.working_mode == 'L',
+                                         paths_only=True)
+        except (PDFInfoNotInstalledError, PDFPageCountError) as e:
+            # Extract mode renders without a pdf_page_count call first
+            raise PopplerNotFoundError(POPPLER_HELP) from e
+    if direct:
+        return rendered
+
+    encoded = []
+    with trace.stage("encode"):
+        for rendered_path in rendered:
+            with Image.open(rendered_path) as img:
+                data = encode_image(img, image_format, quality, options, dpi)
+            encoded_path = os.path.splitext(rendered_path)[0] + EXTENSIONS[image_format]
+            with open(encoded_path, 'wb') as f:
+                f.write(data)
+            os.remove(rendered_path)
+            encoded.append(encoded_path)
+    return encoded
+
+
+def pdf_to_jpg(file_paths, output_dir, quality=85, progress=None, workers=None,
+               dpi=RENDER_DPI, chunk_size=PAGE_CHUNK_SIZE, trace_path=None,
+               image_format=FORMAT_JPEG, encoder_options=None, extract=False):
+    """Convert every page of the given PDFs to image files in output_dir.
+
+    Pages are written as ``<pdf name>_page_<n>.jpg`` (or the extension of
+    ``image_format``, one of IMAGE_FORMATS), encoded with ``encoder_options``
+    (an EncoderOptions; default: balanced, color). Non-PDF paths are skipped.
+    Each PDF's page count is read first and the pages are rendered in chunks of
+    ``chunk_size`` by up to ``workers`` concurrent poppler processes (default:
+    one per CPU core). Pages are moved into place as soon as their chunk is done.
+    ``progress`` may raise ConversionCancelled to stop after the current chunks.
+
+    With ``extract`` (color JPEG output only, needs pypdf), pages that are a
+    single full-page JPEG, as scanners write them, are copied out unchanged at
+    their own resolution; only the remaining pages are rendered. The count is
+    returned in ``result.extracted``.
+
+    Per-stage timings are returned in ``result.stats``; with ``trace_path`` one
+    JSON line per rendered chunk is also appended to that file.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ConversionError(f"Unknown image format: {image_format}")
+    if encoder_options is None:
+        encoder_options = EncoderOptions()
+    if image_format == FORMAT_JPEG and encoder_options.color == COLOR_BILEVEL:
+        raise ConversionError("JPEG cannot store bilevel images; use png, tiff or webp")
+    if extract and (image_format != FORMAT_JPEG or encoder_options.color != COLOR_COLOR):
+        raise ConversionError("Extracting embedded images needs color JPEG output")
+
+    start = time.perf_counter()
+    pdf_paths = [path for path in file_paths if is_pdf(path)]
+    if not pdf_paths:
+        raise ConversionError("No PDF files selected")
+    if workers is None:
+        workers = default_workers()
+
+    outputs = []
+    extracted = 0
+    stats = ConversionStats(trace_path)
+    for index, pdf_path in enumerate(pdf_paths):
+        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+        info_trace = PageTrace(path=pdf_path)
+        if extract:
+            with info_trace.stage("open"):
+                try:
+                    reader = open_pdf(pdf_path)
+                except ImportError as e:
+                    raise ConversionError(str(e)) from e
+                except (OSError, ValueError) as e:
+                    raise ConversionError(f"{pdf_path}: {e}") from e
+                page_count = len(reader.pages)
+        else:
+            with info_trace.stage("pdfinfo"):
+                page_count = pdf_page_count(pdf_path)
+        info_trace.add_bytes("input", os.path.getsize(pdf_path))
+        stats.add(info_trace)
+        pages_done = 0
+
+        def pages_finished(verb, count):
+            nonlocal pages_done
+            pages_done += count
+            _notify(progress, ProgressEvent("render", pages_done, page_count, pdf_path,
+                                            f"PDF {index + 1} of {len(pdf_paths)}: "
+                                            f"{verb} {pages_done} of {page_count} pages"))
+
+        # Render into a scratch folder next to the output so the final move is a rename
+        work_dir = tempfile.mkdtemp(prefix=".render_", dir=output_dir)
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            futures = {}
+
+            def submit_render(first, last):
+                trace = PageTrace(page=first, path=pdf_path)
+                trace.info["last_page"] = last
+                futures[executor.submit(render_page_chunk, pdf_path, first, last,
+                                        work_dir, dpi, quality, trace, image_format,
+                                        encoder_options)] = trace
+
+            if extract:
+                # Pages that must be rendered start rendering while the rest are copied out
+                to_render = []
+                for page_number, page in enumerate(reader.pages, start=1):
+                    trace = PageTrace(page=page_number, path=pdf_path)
+                    with trace.stage("extract"):
+                        data = embedded_jpeg(page)
+                    if data is None:
+                        to_render.append(page_number)
+                        if len(to_render) == chunk_size:
+                            submit_render(to_render[0], to_render[-1])
+                            to_render = []
+                        continue
+                    for first, last in page_runs(to_render, chunk_size):
+                        submit_render(first, last)
+                    to_render = []
+                    with trace.stage("write"):
+                        extracted_path = os.path.join(work_dir, f"extracted_{page_number}.jpg")
+                        with open(extracted_path, "wb") as f:
+                            f.write(data)
+                        output_path = os.path.join(output_dir,
+                                                   f"{base_name}_page_{page_number}.jpg")
+                        os.replace(extracted_path, output_path)
+                    trace.add_bytes("output", len(data))
+                    stats.add(trace)
+                    outputs.append(output_path)
+                    extracted += 1
+                    pages_finished("extracted", 1)
+                for first, last in page_runs(to_render, chunk_size):
+                    submit_render(first, last)
+            else:
+                for first, last in page_chunks(page_count, chunk_size):
+                    submit_render(first, last)
+
+            for future in as_completed(futures):
+                trace = futures[future]
+                rendered_paths = future.result()
+                with trace.stage("move"):
+                    for offset, rendered_path in enumerate(rendered_paths):
+                        output_path = os.path.join(
+                            output_dir,
+                            f"{base_name}_page_{trace.page + offset}{EXTENSIONS[image_format]}")
+                        trace.add_bytes("output", os.path.getsize(rendered_path))
+                        os.replace(rendered_path, output_path)
+                        outputs.append(output_path)
+                stats.add(trace)
+                pages_finished("rendered", len(rendered_paths))
+        finally:
+            # Drop chunks that have not started if rendering failed or was cancelled
+            executor.shutdown(cancel_futures=True)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    stats.close()
+
+    return ConversionResult(outputs, len(outputs), len(file_paths) - len(pdf_paths),
+                            time.perf_counter() - start, stats=stats, extracted=extracted)
+
+
+def _print_progress(event):
+    print(f"[{event.percent:5.1f}%] {event.message}", file=sys.stderr)
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog="conversion_engine",
+                                     description="Convert between JPG images and PDF files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    jpg_parser = subparsers.add_parser("jpg2pdf", help="Combine images (and PDFs) into a single PDF")
+    jpg_parser.add_argument("output", help="Output PDF path")
+    jpg_parser.add_argument("inputs", nargs="+",
+                            help="Input JPG, PNG, WebP or TIFF files, in page order (multi-page "
+                                 "TIFFs optionally as file.tif:1-3,7); PDFs (likewise) have "
+                                 "their pages copied in unchanged")
+    jpg_parser.add_argument("--dpi", type=int, default=300, help="Target DPI (default: 300)")
+    jpg_parser.add_argument("--quality", type=int, default=85, help="JPEG quality 1-100 (default: 85)")
+    jpg_parser.add_argument("--in-memory", action="store_true",
+                            help="Build the whole PDF in memory with img2pdf instead of streaming pages to disk")
+    jpg_parser.add_argument("--workers", type=int, default=None,
+                            help="Number of worker processes (default: one per CPU core)")
+    jpg_parser.add_argument("--layout", choices=LAYOUTS, default=LAYOUT_REENCODE,
+                            help="reencode: resample and re-encode every image; passthrough: embed "
+                                 "baseline JPEGs unchanged and scale them in the PDF "
+                                 "(default: reencode)")
+    jpg_parser.add_argument("--page-size", choices=PAGE_SIZE_CHOICES, default="a4",
+                            help="Paper size, or fit to size each page to its image at --dpi "
+                                 "(default: a4)")
+    jpg_parser.add_argument("--orientation", choices=ORIENTATIONS, default=ORIENTATION_PORTRAIT,
+                            help="Page orientation; auto turns pages landscape for wide images "
+                                 "(default: portrait)")
+    jpg_parser.add_argument("--n-up", type=int, choices=sorted(N_UP_GRIDS), default=1,
+                            help="Images tiled on each page (default: 1)")
+    jpg_parser.add_argument("--encoding", choices=ENCODING_CHOICES, default=ENCODING_AUTO,
+                            help="Image encoding of re-encoded pages: jpeg, lossless flate, "
+                                 "g4 (CCITT Group 4, black and white) for text scans, or auto: "
+                                 "g4 for black and white sources, flate for lossless ones shown "
+                                 "at full size, jpeg for the rest (default: auto)")
+    jpg_parser.add_argument("--full-decode", action="store_true",
+                            help="Decode sources at full resolution before resizing (slower, best quality)")
+    jpg_parser.add_argument("--target-size", type=parse_size, metavar="SIZE",
+                            help="Pick the highest quality (up to --quality) that keeps the PDF "
+                                 "under SIZE, e.g. 10MB")
+    jpg_parser.add_argument("--adjust-dpi", action="store_true",
+                            help="With --target-size, also lower the DPI if needed")
+    jpg_parser.add_argument("--page-cache", nargs="?", const="", metavar="FILE",
+                            help="Reuse pages encoded by earlier runs from a cache database "
+                                 "(default: in the user cache directory)")
+    jpg_parser.add_argument("--blank", choices=SCREEN_ACTIONS, default=SCREEN_OFF,
+                            help="Find blank pages (separator sheets) before encoding and "
+                                 "report or skip them (default: off)")
+    jpg_parser.add_argument("--duplicates", choices=SCREEN_ACTIONS, default=SCREEN_OFF,
+                            help="Find near-duplicate pages (double feeds, rescans) before "
+                                 "encoding and report or skip them (default: off)")
+    jpg_parser.add_argument("--blank-ink", type=float, default=BLANK_INK_SHARE * 100,
+                            metavar="PERCENT",
+                            help=f"Pages with less ink than this are blank "
+                                 f"(default: {BLANK_INK_SHARE * 100:g})")
+    jpg_parser.add_argument("--duplicate-distance", type=float,
+                            default=DUPLICATE_DISTANCE * 100, metavar="PERCENT",
+                            help=f"Pages whose perceptual hashes differ in at most this share "
+                                 f"of bits are duplicates (default: {DUPLICATE_DISTANCE * 100:g})")
+
+    pdf_parser = subparsers.add_parser("pdf2jpg", help="Convert PDF pages to JPG images")
+    pdf_parser.add_argument("output_dir", help="Directory for the JPG files")
+    pdf_parser.add_argument("inputs", nargs="+", help="Input PDF files")
+    pdf_parser.add_argument("--quality", type=int, default=85, help="JPEG quality 1-100 (default: 85)")
+    pdf_parser.add_argument("--dpi", type=int, default=RENDER_DPI,
+                            help=f"Rendering resolution (default: {RENDER_DPI})")
+    pdf_parser.add_argument("--workers", type=int, default=None,
+                            help="Number of concurrent poppler renders (default: one per CPU core)")
+    pdf_parser.add_argument("--chunk-size", type=int, default=PAGE_CHUNK_SIZE,
+                            help=f"Pages rendered per poppler call (default: {PAGE_CHUNK_SIZE})")
+    pdf_parser.add_argument("--format", choices=IMAGE_FORMATS, default=FORMAT_JPEG,
+                            dest="image_format", help="Output image format (default: jpeg)")
+    pdf_parser.add_argument("--extract", action="store_true",
+                            help="Copy out pages that are a single embedded JPEG (scans) "
+                                 "instead of rendering them; needs pypdf")
+
+    for sub in (jpg_parser, pdf_parser):
+        sub.add_argument("--preset", choices=PRESETS, default=PRESET_BALANCED,
+                         help="Encoder speed versus size: fast, balanced or compact "
+                              "(default: balanced)")
+        sub.add_argument("--color", choices=COLOR_MODES, default=COLOR_COLOR,
+                         help="color, gray, or bilevel (black and white; not with JPEG) "
+                              "(default: color)")
+        sub.add_argument("--subsampling", choices=SUBSAMPLINGS,
+                         help="JPEG chroma subsampling (default: 4:2:0)")
+        sub.add_argument("--progressive", action=argparse.BooleanOptionalAction,
+                         help="Write progressive JPEGs (default: per preset)")
+        sub.add_argument("--optimize", action=argparse.BooleanOptionalAction,
+                         help="Optimize JPEG Huffman tables, one extra pass (default: per preset)")
+        sub.add_argument("-q", "--quiet", action="store_true", help="Do not print progress")
+        sub.add_argument("--trace", metavar="FILE",
+                         help="Append per-page stage timings to FILE as JSON lines")
+        sub.add_argument("--profile", action="store_true",
+                         help="Print time and bytes per pipeline stage when done")
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    progress = None if args.quiet else _print_progress
+
+    page_cache = None
+    screen = None
+    encoder_options = EncoderOptions(args.preset, args.color, args.subsampling, args.progressive,
+                                     args.optimize)
+    try:
+        if args.command == "jpg2pdf":
+            if args.page_cache is not None:
+                page_cache = PageCache(args.page_cache or None)
+            screen = PageScreen(args.blank, args.duplicates, args.blank_ink / 100,
+                                args.duplicate_distance / 100)
+            result = jpg_to_pdf(args.inputs, args.output, dpi=args.dpi,
+                                quality=args.quality, progress=progress,
+                                streaming=not args.in_memory, workers=args.workers,
+                                fast_decode=not args.full_decode, layout=args.layout,
+                                trace_path=args.trace, target_size=args.target_size,
+                                adjust_dpi=args.adjust_dpi, page_cache=page_cache,
+                                page_size=args.page_size, orientation=args.orientation,
+                                n_up=args.n_up, encoding=args.encoding,
+                                encoder_options=encoder_options, screen=screen)
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            result = pdf_to_jpg(args.inputs, args.output_dir,
+                                quality=args.quality, progress=progress,
+                                workers=args.workers, dpi=args.dpi,
+                                chunk_size=args.chunk_size, trace_path=args.trace,
+                                image_format=args.image_format,
+                                encoder_options=encoder_options, extract=args.extract)
+    except ConversionError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if page_cache is not None:
+            page_cache.close()
+
+    print(f"Converted {result.pages} page(s) in {result.elapsed:.2f}s "
+          f"({result.pages_per_second:.1f} pages/s), skipped {result.skipped} file(s)")
+    if result.passthrough:
+        print(f"{result.passthrough} page(s) embedded without re-encoding")
+    if result.cached:
+        print(f"{result.cached} page(s) reused from the page cache")
+    if result.extracted:
+        print(f"{result.extracted} page(s) extracted without rendering")
+    if result.copied:
+        print(f"{result.copied} page(s) copied from PDFs")
+    for analysis in result.flagged:
+        action = "Skipped" if screen.skips(analysis) else "Flagged"
+        print(f"{action} {analysis.image.label}: {analysis.reason}")
+    if result.quality is not None:
+        output_size = os.path.getsize(args.output)
+        print(f"Target size: quality {result.quality} at {result.dpi} DPI gave "
+              f"{format_size(output_size)} (limit {format_size(args.target_size)})")
+        if output_size > args.target_size:
+            print("Warning: the PDF is larger than the target size", file=sys.stderr)
+    if args.profile:
+        print(result.stats.report())
+    elif not args.quiet:
+        print(f"Time by stage: {result.stats.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,856 @@
+"""Local HTTP conversion service: one machine converts for many clients.
+
+    python -m conversion_server --port 8765 --jobs 2 --queue-size 4
+
+Clients upload files and get PDFs (or ZIPs of page images) back:
+
+* ``POST /jobs/jpg2pdf`` or ``/jobs/pdf2jpg`` queues a job and answers 202
+  with its status; poll ``GET /jobs/<id>`` and download ``GET
+  /jobs/<id>/result`` once it is done. ``DELETE /jobs/<id>`` cancels it and
+  deletes its files.
+* ``POST /convert/jpg2pdf`` or ``/convert/pdf2jpg`` waits for the job and
+  streams the result in the response.
+* ``GET /jobs`` lists the jobs and ``GET /metrics`` reports counters,
+  throughput and latency percentiles as JSON.
+
+Uploads are multipart/form-data (``curl -F file=@a.jpg -F file=@b.jpg``),
+the files in page order, or a single file as the raw request body. Parts
+are streamed to disk as they arrive. A file named ``doc.pdf:1-3`` takes
+some of its pages, as on the command line. Settings are query parameters or
+form fields named like the command line options (``dpi=300&encoding=g4``).
+
+At most ``--jobs`` conversions run at once, each on ``--workers`` processes
+(default: the cores divided by ``--jobs``), and ``--queue-size`` more may
+wait. When all of them are taken, uploads are refused with 429 Too Many
+Requests and a Retry-After header before their body is read (clients that
+send ``Expect: 100-continue``, like curl for large uploads, never send it).
+Finished jobs and their files are kept for ``--keep`` seconds.
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesHeaderParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import conversion_engine
+import job_queue
+from pdf_merge import PAGE_SPEC
+
+logger = logging.getLogger("conversion_server")
+
+# URL names of the conversions and the conversion_engine function of each
+MODES = {"jpg2pdf": "jpg_to_pdf", "pdf2jpg": "pdf_to_jpg"}
+
+DEFAULT_PORT = 8765
+# Seconds finished jobs and their files are kept for download
+KEEP_SECONDS = 900
+MAX_UPLOAD = 1024 ** 3
+
+# Bytes read from an upload at a time
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Limits for the header block of a multipart part and for settings sent as form fields
+MAX_PART_HEADER_LINES = 32
+MAX_FIELD_SIZE = 8 * 1024
+# Bodies of refused uploads up to this size are read and dropped, so the
+# client sees the response instead of a reset connection
+DRAIN_LIMIT = 16 * 1024 ** 2
+
+# Finished jobs whose latencies /metrics reports percentiles of, and the
+# window throughput is measured over (seconds)
+LATENCY_SAMPLES = 1000
+THROUGHPUT_WINDOW = 60.0
+PERCENTILES = (50, 90, 95, 99)
+
+JOB_PATH = re.compile(r"^/jobs/(?P<id>\d+)(?P<result>/result)?$")
+UNSAFE_NAME_CHARS = re.compile(r"[^\w.-]+")
+
+RESULT_TYPES = {"jpg_to_pdf": "application/pdf", "pdf_to_jpg": "application/zip"}
+
+
+class RequestError(Exception):
+    """Raised while handling a request to answer it with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _choice(choices):
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"must be one of {', '.join(str(choice) for choice in choices)}")
+        return value
+    return parse
+
+
+def _flag(value):
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError("must be true or false")
+
+
+def _n_up(value):
+    return _choice(sorted(conversion_engine.N_UP_GRIDS))(int(value))
+
+
+# Settings a request may give, as parser and the modes that take it; the
+# names are those of the command line options (format is image_format)
+PARAMETERS = {
+    "dpi": (int, MODES),
+    "quality": (int, MODES),
+    "layout": (_choice(conversion_engine.LAYOUTS), ("jpg2pdf",)),
+    "page_size": (_choice(conversion_engine.PAGE_SIZE_CHOICES), ("jpg2pdf",)),
+    "orientation": (_choice(conversion_engine.ORIENTATIONS), ("jpg2pdf",)),
+    "n_up": (_n_up, ("jpg2pdf",)),
+    "encoding": (_choice(conversion_engine.ENCODING_CHOICES), ("jpg2pdf",)),
+    "target_size": (conversion_engine.parse_size, ("jpg2pdf",)),
+    "adjust_dpi": (_flag, ("jpg2pdf",)),
+    "blank": (_choice(conversion_engine.SCREEN_ACTIONS), ("jpg2pdf",)),
+    "duplicates": (_choice(conversion_engine.SCREEN_ACTIONS), ("jpg2pdf",)),
+    "format": (_choice(conversion_engine.IMAGE_FORMATS), ("pdf2jpg",)),
+    "extract": (_flag, ("pdf2jpg",)),
+    "preset": (_choice(conversion_engine.PRESETS), MODES),
+    "color": (_choice(conversion_engine.COLOR_MODES), MODES),
+    "subsampling": (_choice(conversion_engine.SUBSAMPLINGS), MODES),
+    "progressive": (_flag, MODES),
+    "optimize": (_flag, MODES),
+}
+ENCODER_PARAMETERS = ("preset", "color", "subsampling", "progressive", "optimize")
+SCREEN_PARAMETERS = ("blank", "duplicates")
+
+
+def job_options(mode, params):
+    """Return the conversion keyword arguments for a mode's request settings.
+
+    ``params`` maps PARAMETERS names (dashes or underscores) to their text.
+    Raises ValueError for unknown settings and bad values.
+    """
+    values = {}
+    for name, text in params.items():
+        name = name.replace("-", "_")
+        parameter = PARAMETERS.get(name)
+        if parameter is None or mode not in parameter[1]:
+            raise ValueError(f"Unknown setting for {mode}: {name}")
+        try:
+            values[name] = parameter[0](text)
+        except ValueError as e:
+            raise ValueError(f"Bad value for {name}: {e}") from None
+
+    options = {name: value for name, value in values.items()
+               if name not in ENCODER_PARAMETERS + SCREEN_PARAMETERS}
+    if "format" in options:
+        options["image_format"] = options.pop("format")
+    if any(name in values for name in ENCODER_PARAMETERS):
+        options["encoder_options"] = conversion_engine.EncoderOptions(
+            values.get("preset", conversion_engine.PRESET_BALANCED),
+            values.get("color", conversion_engine.COLOR_COLOR), values.get("subsampling"),
+            values.get("progressive"), values.get("optimize"))
+    if any(name in values for name in SCREEN_PARAMETERS):
+        options["screen"] = conversion_engine.PageScreen(
+            values.get("blank", conversion_engine.SCREEN_OFF),
+            values.get("duplicates", conversion_engine.SCREEN_OFF))
+    return options
+
+
+def percentile(values, percent):
+    """Return the nearest-rank ``percent`` percentile of sorted ``values``, or None if empty."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class ServiceJob(job_queue.ConversionJob):
+    """A ConversionJob of the service, with the folder holding its files.
+
+    ``download_name`` is the file name the result is offered under and
+    ``done`` is set once the job has finished.
+    """
+
+    def __init__(self, kind, file_paths, output, work_dir, download_name, input_bytes, **options):
+        super().__init__(kind, file_paths, output, **options)
+        self.work_dir = work_dir
+        self.download_name = download_name
+        self.input_bytes = input_bytes
+        self.done = threading.Event()
+
+    def output_files(self):
+        """Return the paths of the result files of a finished job."""
+        return list(self.result.outputs) if self.result is not None else []
+
+    def as_dict(self):
+        """Return the job's status as a JSON-serializable dict."""
+        status = {
+            "id": self.id,
+            "mode": next(mode for mode, kind in MODES.items() if kind == self.kind),
+            "status": self.status,
+            "files": len(self.file_paths),
+            "input_bytes": self.input_bytes,
+            "wait_seconds": round(self.wait_time, 3),
+            "run_seconds": round(self.elapsed, 3),
+        }
+        if self.progress is not None and not self.finished:
+            status["progress"] = {"stage": self.progress.stage, "current": self.progress.current,
+                                  "total": self.progress.total,
+                                  "percent": round(self.progress.percent, 1)}
+        if self.result is not None:
+            status["pages"] = self.result.pages
+            status["skipped"] = self.result.skipped
+            status["flagged"] = [f"{os.path.basename(analysis.image.label)}: {analysis.reason}"
+                                 for analysis in self.result.flagged]
+            status["result"] = f"/jobs/{self.id}/result"
+        if self.error is not None:
+            status["error"] = str(self.error)
+        return status
+
+
+class ServiceMetrics:
+    """Job counters and recent latencies of a ConversionService, for /metrics."""
+
+    def __init__(self, samples=LATENCY_SAMPLES, window=THROUGHPUT_WINDOW):
+        self.started_at = time.time()
+        self.window = window
+        self.counts = dict.fromkeys(("accepted", "rejected", job_queue.DONE, job_queue.FAILED,
+                                     job_queue.CANCELLED), 0)
+        self.pages = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.stages = {}
+        # (finished_at, pages, wait, run, latency) of the latest finished jobs
+        self._recent = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        """Add one to a counter."""
+        with self._lock:
+            self.counts[name] += 1
+
+    def record(self, job):
+        """Count a finished job and, if it is done, its pages and timings."""
+        with self._lock:
+            self.counts[job.status] += 1
+            if job.status != job_queue.DONE:
+                return
+            result = job.result
+            self.pages += result.pages
+            self.input_bytes += job.input_bytes
+            for path in job.output_files():
+                try:
+                    self.output_bytes += os.path.getsize(path)
+                except OSError:
+                    pass
+            if result.stats is not None:
+                for name, seconds in result.stats.stages.items():
+                    self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self._recent.append((job.finished_at, result.pages, job.wait_time, job.elapsed,
+                                 job.finished_at - job.submitted_at))
+
+    def retry_after(self):
+        """Seconds a refused client should wait: the median run time of recent jobs."""
+        with self._lock:
+            runs = sorted(sample[3] for sample in self._recent)
+        return max(1, math.ceil(percentile(runs, 50) or 0))
+
+    def as_dict(self):
+        """Return the counters, throughput and latency percentiles as a JSON-serializable dict."""
+        now = time.time()
+        with self._lock:
+            recent = list(self._recent)
+            metrics = {
+                "uptime_seconds": round(now - self.started_at, 3),
+                "jobs": dict(self.counts),
+                "pages": self.pages,
+                "input_bytes": self.input_bytes,
+                "output_bytes": self.output_bytes,
+                "stage_seconds": {name: round(seconds, 3) for name, seconds
+                                  in sorted(self.stages.items(), key=lambda item: -item[1])},
+            }
+        window = min(self.window, now - self.started_at) or 1.0
+        in_window = [sample for sample in recent if sample[0] >= now - window]
+        metrics["throughput"] = {
+            "window_seconds": round(window, 3),
+            "jobs_per_second": round(len(in_window) / window, 4),
+            "pages_per_second": round(sum(sample[1] for sample in in_window) / window, 4),
+        }
+        metrics["latency_seconds"] = {"samples": len(recent)}
+        for index, name in enumerate(("wait", "run", "total"), start=2):
+            values = sorted(sample[index] for sample in recent)
+            metrics["latency_seconds"][name] = {
+                f"p{percent}": (round(percentile(values, percent), 3) if values else None)
+                for percent in PERCENTILES}
+        return metrics
+
+
+class ConversionService:
+    """Runs uploaded conversions on a bounded pool and keeps their results.
+
+    ``options`` are passed to every conversion (e.g. workers). At most
+    ``jobs`` jobs run at once and ``queue_size`` more may wait; reserve() a
+    slot before accepting one. Job files live in ``work_dir`` (default: a
+    new temporary folder, deleted by close()).
+    """
+
+    def __init__(self, work_dir=None, jobs=2, queue_size=4, keep=KEEP_SECONDS,
+                 max_upload=MAX_UPLOAD, options=None):
+        self._own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="conversion_server_")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.keep = keep
+        self.max_upload = max_upload
+        self.options = dict(options or {})
+        # Share the cores between concurrent jobs instead of oversubscribing them
+        self.options.setdefault("workers", max(1, conversion_engine.default_workers() // jobs))
+        self.metrics = ServiceMetrics()
+
+        self._executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="server-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        # Slots taken by jobs being uploaded, queued or running
+        self._taken = 0
+
+    @property
+    def full(self):
+        """True if every job slot is taken."""
+        with self._lock:
+            return self._taken >= self.jobs + self.queue_size
+
+    def reserve(self):
+        """Take a job slot; returns False (and counts a rejection) if all are taken."""
+        with self._lock:
+            if self._taken < self.jobs + self.queue_size:
+                self._taken += 1
+                return True
+        self.metrics.count("rejected")
+        return False
+
+    def release(self):
+        """Give back a slot taken by reserve() for a job that was not submitted."""
+        with self._lock:
+            self._taken -= 1
+
+    def new_work_dir(self):
+        """Create and return a folder for one job's files."""
+        return tempfile.mkdtemp(prefix="job_", dir=self.work_dir)
+
+    def submit(self, job):
+        """Queue a job in a slot taken by reserve() and return it."""
+        with self._lock:
+            self._jobs[job.id] = job
+        self.metrics.count("accepted")
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """Return the job with ``job_id``, or None."""
+        self.expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        """Return every job still kept, oldest first."""
+        self.expire()
+        with self._lock:
+            return list(self._jobs.values())
+
+    def counts(self):
+        """Return (queued, running) job counts."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return statuses.count(job_queue.QUEUED), statuses.count(job_queue.RUNNING)
+
+    def cancel(self, job):
+        """Cancel a job and delete it with its files (a running job once it stops)."""
+        with self._lock:
+            job.cancel_event.set()
+            dequeued = job.status == job_queue.QUEUED
+            if dequeued:
+                job.status = job_queue.CANCELLED
+                job.finished_at = time.time()
+            self._jobs.pop(job.id, None)
+        if dequeued:
+            self._finished(job)
+        elif job.finished:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def discard(self, job):
+        """Forget a finished job and delete its files."""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def expire(self):
+        """Delete finished jobs kept longer than ``keep`` seconds."""
+        cutoff = time.time() - self.keep
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished and job.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def metrics_dict(self):
+        """Return /metrics: ServiceMetrics plus the current queue state."""
+        queued, running = self.counts()
+        metrics = self.metrics.as_dict()
+        metrics["queue"] = {"queued": queued, "running": running, "jobs": self.jobs,
+                            "queue_size": self.queue_size}
+        return metrics
+
+    def _finished(self, job):
+        self.metrics.record(job)
+        with self._lock:
+            self._taken -= 1
+            kept = job.id in self._jobs
+        if not kept:
+            # Cancelled by DELETE while it ran
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+        job.done.set()
+
+    def _run(self, job):
+        with self._lock:
+            if job.finished:
+                # Cancelled while still queued; its slot is already free
+                return
+            job.status = job_queue.RUNNING
+            job.started_at = time.time()
+        try:
+            job.result = job.run()
+            job.status = job_queue.DONE
+        except conversion_engine.ConversionCancelled:
+            job.status = job_queue.CANCELLED
+        except Exception as e:
+            if not isinstance(e, conversion_engine.ConversionError):
+                logger.exception("Job %d failed", job.id)
+            job.error = e
+            job.status = job_queue.FAILED
+        job.finished_at = time.time()
+        logger.info("Job %d %s in %.1fs", job.id, job.status, job.elapsed)
+        self._finished(job)
+
+    def close(self):
+        """Cancel every job, wait for running ones to stop and delete all job files."""
+        for job in self.list_jobs():
+            if not job.finished:
+                self.cancel(job)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+        for job in jobs:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+        if self._own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class _BodyReader:
+    """Reads no further than the request body (``length`` bytes) from ``rfile``."""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size):
+        data = self.rfile.read(min(size, self.remaining)) if self.remaining > 0 else b""
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size):
+        line = self.rfile.readline(min(size, self.remaining)) if self.remaining > 0 else b""
+        self.remaining -= len(line)
+        return line
+
+    def discard(self):
+        while self.read(UPLOAD_CHUNK_SIZE):
+            pass
+
+
+def _safe_name(filename):
+    """Return (file name safe to store, page ranges or None) of an uploaded file's name."""
+    name = filename.replace("\\", "/").rsplit("/", 1)[-1]
+    ranges = None
+    match = PAGE_SPEC.match(name)
+    if match is not None:
+        name, ranges = match.group("path"), match.group("ranges")
+    return UNSAFE_NAME_CHARS.sub("_", name).strip("._") or "upload", ranges
+
+
+def _copy_part(reader, delimiter, out, limit=None):
+    """Copy the body of one multipart part to ``out``; return True if it was the last part.
+
+    The CRLF before a delimiter belongs to the delimiter, so every line is
+    held back until the next one shows whether it ends the part.
+    """
+    pending = b""
+    written = 0
+    line_start = True
+    while True:
+        line = reader.readline(UPLOAD_CHUNK_SIZE)
+        if not line:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Upload ended in the middle of a part")
+        if line_start and line.startswith(delimiter):
+            rest = line[len(delimiter):].rstrip(b"\r\n").rstrip(b" \t")
+            if rest in (b"", b"--"):
+                if pending.endswith(b"\r\n"):
+                    pending = pending[:-2]
+                elif pending.endswith(b"\n"):
+                    pending = pending[:-1]
+                _write_part(out, pending, written, limit)
+                return rest == b"--"
+        line_start = line.endswith(b"\n")
+        written = _write_part(out, pending, written, limit)
+        pending = line
+
+
+def _write_part(out, data, written, limit):
+    """Write ``data`` of a part to ``out``; return the part's bytes written so far."""
+    written += len(data)
+    if limit is not None and written > limit:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Form field is too long")
+    out.write(data)
+    return written
+
+
+def _save_file(work_dir, index, filename, write):
+    """Store an upload as ``inputs/<index>/<name>``; returns (input spec, name, size)."""
+    name, ranges = _safe_name(filename)
+    folder = os.path.join(work_dir, "inputs", f"{index:04d}")
+    os.makedirs(folder)
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        write(f)
+        size = f.tell()
+    return (f"{path}:{ranges}" if ranges else path), name, size
+
+
+def read_upload(reader, headers, work_dir):
+    """Store the files of a request body in ``work_dir``.
+
+    Returns (input specs in upload order, file names, total bytes, form
+    fields). ``headers`` are the request headers. Raises RequestError.
+    """
+    specs, names, fields = [], [], {}
+    total = 0
+    if headers.get_content_type() != "multipart/form-data":
+        # The body is one file, named by a Content-Disposition header if there is one
+        filename = headers.get_filename() or "upload"
+
+        def write(f):
+            shutil.copyfileobj(reader, f, UPLOAD_CHUNK_SIZE)
+        spec, name, total = _save_file(work_dir, 0, filename, write)
+        return [spec], [name], total, fields
+
+    boundary = headers.get_param("boundary")
+    if not boundary:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Multipart upload without a boundary")
+    delimiter = b"--" + boundary.encode("latin-1")
+    # Skip the preamble
+    while True:
+        line = reader.readline(UPLOAD_CHUNK_SIZE)
+        if not line:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Multipart upload without parts")
+        if line.startswith(delimiter) and line[len(delimiter):].strip() in (b"", b"--"):
+            last = line[len(delimiter):].strip() == b"--"
+            break
+
+    while not last:
+        header_lines = []
+        while True:
+            line = reader.readline(UPLOAD_CHUNK_SIZE)
+            if line in (b"\r\n", b"\n"):
+                break
+            if not line or len(header_lines) >= MAX_PART_HEADER_LINES:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "Bad multipart part header")
+            header_lines.append(line)
+        part = BytesHeaderParser().parsebytes(b"".join(header_lines))
+        filename = part.get_filename()
+        if filename is None:
+            name = part.get_param("name", header="content-disposition")
+            field = io.BytesIO()
+            last = _copy_part(reader, delimiter, field, MAX_FIELD_SIZE)
+            if name:
+                fields[name] = field.getvalue().decode("utf-8", "replace")
+            continue
+
+        def write(f):
+            nonlocal last
+            last = _copy_part(reader, delimiter, f)
+        spec, name, size = _save_file(work_dir, len(specs), filename, write)
+        specs.append(spec)
+        names.append(name)
+        total += size
+    reader.discard()
+    return specs, names, total, fields
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the ConversionService in ``server.service``."""
+
+    # HTTP/1.1 for Expect: 100-continue; every response closes the connection,
+    # so streamed results need no length
+    protocol_version = "HTTP/1.1"
+    server_version = "conversion_server/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+    def handle_expect_100(self):
+        # Refuse uploads before the client sends them when no slot is free
+        # (the upload handler still takes the slot itself)
+        if self.command == "POST" and self._upload_route() is not None and self.service.full:
+            self.service.metrics.count("rejected")
+            self._send_busy()
+            return False
+        return super().handle_expect_100()
+
+    def _upload_route(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] in ("jobs", "convert") and parts[1] in MODES:
+            return parts[0], parts[1]
+        return None
+
+    def _send_json(self, status, data, headers=()):
+        body = json.dumps(data, indent=2).encode("utf-8") + b"\n"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_json(self, status, message, headers=()):
+        self._send_json(status, {"error": message}, headers)
+
+    def _send_busy(self):
+        self._send_error_json(HTTPStatus.TOO_MANY_REQUESTS, "All job slots are taken; retry later",
+                              [("Retry-After", str(self.service.metrics.retry_after()))])
+
+    def _dispatch(self, handler, *args):
+        try:
+            handler(*args)
+        except RequestError as e:
+            self._send_error_json(e.status, str(e))
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("%s disconnected", self.address_string())
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._send_json(HTTPStatus.OK, self.service.metrics_dict())
+        elif path == "/jobs":
+            self._send_json(HTTPStatus.OK, [job.as_dict() for job in self.service.list_jobs()])
+        else:
+            self._dispatch(self._get_job, path)
+
+    def do_POST(self):
+        route = self._upload_route()
+        if route is None:
+            self._send_error_json(HTTPStatus.NOT_FOUND, f"No such endpoint: {self.path}")
+            return
+        self._dispatch(self._upload, *route)
+
+    def do_DELETE(self):
+        self._dispatch(self._delete_job, urlsplit(self.path).path)
+
+    def _find_job(self, path):
+        match = JOB_PATH.match(path)
+        if match is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+        job = self.service.get(int(match.group("id")))
+        if job is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"No job {match.group('id')}")
+        return job, match.group("result") is not None
+
+    def _get_job(self, path):
+        job, result = self._find_job(path)
+        if not result:
+            self._send_json(HTTPStatus.OK, job.as_dict())
+        elif job.status != job_queue.DONE:
+            raise RequestError(HTTPStatus.CONFLICT, f"Job {job.id} is {job.status}")
+        else:
+            self._send_result(job)
+
+    def _delete_job(self, path):
+        job, result = self._find_job(path)
+        if result:
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Delete the job instead")
+        self.service.cancel(job)
+        self._send_json(HTTPStatus.OK, job.as_dict())
+
+    @staticmethod
+    def _drain(reader):
+        if reader.remaining <= DRAIN_LIMIT:
+            reader.discard()
+
+    def _upload(self, endpoint, mode):
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            raise RequestError(HTTPStatus.LENGTH_REQUIRED, "Uploads need a Content-Length")
+        reader = _BodyReader(self.rfile, int(length))
+        if reader.remaining > self.service.max_upload:
+            self._drain(reader)
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Uploads are limited to "
+                               f"{conversion_engine.format_size(self.service.max_upload)}")
+        query = dict(parse_qsl(urlsplit(self.path).query))
+        try:
+            # Bad settings are refused before the upload is read
+            job_options(mode, query)
+        except ValueError as e:
+            self._drain(reader)
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        if not self.service.reserve():
+            self._drain(reader)
+            self._send_busy()
+            return
+
+        work_dir = self.service.new_work_dir()
+        try:
+            specs, names, input_bytes, fields = read_upload(reader, self.headers, work_dir)
+            if not specs:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "No files uploaded")
+            try:
+                options = job_options(mode, {**query, **fields})
+            except ValueError as e:
+                raise RequestError(HTTPStatus.BAD_REQUEST, str(e)) from None
+            kind = MODES[mode]
+            base_name = os.path.splitext(names[0])[0]
+            if kind == "jpg_to_pdf":
+                output = os.path.join(work_dir, "output.pdf")
+                download_name = f"{base_name}.pdf"
+            else:
+                output = os.path.join(work_dir, "output")
+                os.makedirs(output)
+                download_name = f"{base_name}.zip"
+            job = ServiceJob(kind, specs, output, work_dir, download_name, input_bytes,
+                             **{**self.service.options, **options})
+        except BaseException:
+            self.service.release()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        self.service.submit(job)
+        if endpoint == "jobs":
+            self._send_json(HTTPStatus.ACCEPTED, job.as_dict(),
+                            [("Location", f"/jobs/{job.id}")])
+            return
+
+        job.done.wait()
+        try:
+            if job.status == job_queue.DONE:
+                self._send_result(job)
+            elif job.status == job_queue.FAILED:
+                self._send_error_json(HTTPStatus.UNPROCESSABLE_ENTITY, str(job.error))
+            else:
+                self._send_error_json(HTTPStatus.CONFLICT, f"Job {job.id} was {job.status}")
+        finally:
+            # The client got the result (or the reason there is none)
+            self.service.discard(job)
+
+    def _send_result(self, job):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", RESULT_TYPES[job.kind])
+        self.send_header("Content-Disposition", f'attachment; filename="{job.download_name}"')
+        self.send_header("Connection", "close")
+        if job.kind == "jpg_to_pdf":
+            with open(job.output, "rb") as f:
+                self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+                self.end_headers()
+                # Kernel copy from the file to the socket where the platform has one
+                self.connection.sendfile(f)
+            return
+        self.end_headers()
+        # The ZIP is written straight to the socket; page images are already
+        # compressed, so they are stored as they are
+        with zipfile.ZipFile(self.wfile, "w", zipfile.ZIP_STORED) as archive:
+            for path in job.output_files():
+                archive.write(path, os.path.basename(path))
+
+
+class ConversionServer(ThreadingHTTPServer):
+    """Threaded HTTP server for a ConversionService; ``address`` is (host, port)."""
+
+    def __init__(self, address, service):
+        super().__init__(address, ConversionRequestHandler)
+        self.service = service
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog="conversion_server",
+                                     description="Serve conversions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Address to listen on (default: 127.0.0.1, this machine only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--jobs", type=int, default=2, help="Jobs converted at once (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=4,
+                        help="Jobs allowed to wait for a worker before uploads get 429 "
+                             "(default: 4)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes per job (default: CPU cores divided by --jobs)")
+    parser.add_argument("--max-upload", type=conversion_engine.parse_size, default=MAX_UPLOAD,
+                        metavar="SIZE", help="Largest upload accepted (default: 1GB)")
+    parser.add_argument("--keep", type=float, default=KEEP_SECONDS,
+                        help=f"Seconds finished jobs are kept for download "
+                             f"(default: {KEEP_SECONDS})")
+    parser.add_argument("--work-dir",
+                        help="Folder for uploads and results (default: a temporary folder)")
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    options = {"workers": args.workers} if args.workers is not None else {}
+    service = ConversionService(args.work_dir, jobs=args.jobs, queue_size=args.queue_size,
+                                keep=args.keep, max_upload=args.max_upload, options=options)
+    server = ConversionServer((args.host, args.port), service)
+    # shutdown() waits for serve_forever() to return, so it cannot run on this thread
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    host, port = server.server_address[:2]
+    logger.info("Serving on http://%s:%d (%d job(s) at once, %d queued)", host, port, args.jobs,
+                args.queue_size)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    counts = service.metrics.counts
+    logger.info("Stopped: %d job(s) done, %d failed, %d refused", counts[job_queue.DONE],
+                counts[job_queue.FAILED], counts["rejected"])
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Image encoders for PDF pages and for rendered PDF pages.
+
+Two kinds of output are produced from a PIL image:
+
+* image files written by PDF to JPG: JPEG, WebP, PNG or TIFF
+  (IMAGE_FORMATS), see encode_image;
+* image streams embedded in PDFs by JPG to PDF: JPEG (DCTDecode), lossless
+  Flate, or CCITT Group 4 for black and white text scans (PAGE_ENCODINGS),
+  see encode_page_image. ENCODING_AUTO picks one of them per source
+  image (see image_sources.auto_encoding).
+
+EncoderOptions holds the settings shared by both: a speed versus size preset,
+the colour mode (bilevel is where document scans shrink most) and explicit
+JPEG overrides.
+"""
+import io
+import zlib
+
+# File formats for rendered pages, and the extension each is written with
+FORMAT_JPEG = "jpeg"
+FORMAT_WEBP = "webp"
+FORMAT_PNG = "png"
+FORMAT_TIFF = "tiff"
+IMAGE_FORMATS = (FORMAT_JPEG, FORMAT_WEBP, FORMAT_PNG, FORMAT_TIFF)
+EXTENSIONS = {FORMAT_JPEG: ".jpg", FORMAT_WEBP: ".webp", FORMAT_PNG: ".png", FORMAT_TIFF: ".tif"}
+
+# Image stream encodings inside a PDF
+ENCODING_JPEG = "jpeg"
+ENCODING_FLATE = "flate"
+ENCODING_G4 = "g4"
+PAGE_ENCODINGS = (ENCODING_JPEG, ENCODING_FLATE, ENCODING_G4)
+# Encoding choices for a whole PDF: one of PAGE_ENCODINGS, or per page the
+# one that suits its source
+ENCODING_AUTO = "auto"
+ENCODING_CHOICES = (ENCODING_AUTO, *PAGE_ENCODINGS)
+
+COLOR_COLOR = "color"
+COLOR_GRAY = "gray"
+COLOR_BILEVEL = "bilevel"
+COLOR_MODES = (COLOR_COLOR, COLOR_GRAY, COLOR_BILEVEL)
+
+# PIL mode images are resampled in for each colour mode (bilevel pages are
+# thresholded after resampling)
+WORKING_MODES = {COLOR_COLOR: "RGB", COLOR_GRAY: "L", COLOR_BILEVEL: "L"}
+
+PRESET_FAST = "fast"
+PRESET_BALANCED = "balanced"
+PRESET_COMPACT = "compact"
+PRESETS = (PRESET_FAST, PRESET_BALANCED, PRESET_COMPACT)
+
+# Settings per preset: JPEG optimize/progressive, WebP method (0 fastest,
+# 6 smallest), PNG and Flate zlib level, and TIFF compression for non-bilevel
+# pages (bilevel TIFFs always use Group 4)
+PRESET_SETTINGS = {
+    PRESET_FAST: {"optimize": False, "progressive": False, "webp_method": 0, "zlib_level": 1,
+                  "tiff_compression": "packbits"},
+    PRESET_BALANCED: {"optimize": True, "progressive": False, "webp_method": 4, "zlib_level": 6,
+                      "tiff_compression": "tiff_lzw"},
+    PRESET_COMPACT: {"optimize": True, "progressive": True, "webp_method": 6, "zlib_level": 9,
+                     "tiff_compression": "tiff_adobe_deflate"},
+}
+
+SUBSAMPLINGS = ("4:4:4", "4:2:2", "4:2:0")
+
+# Gray level at or above which a pixel becomes white in bilevel mode
+BILEVEL_THRESHOLD = 128
+
+TIFF_PHOTOMETRIC = 262
+TIFF_STRIP_OFFSETS = 273
+TIFF_ROWS_PER_STRIP = 278
+TIFF_STRIP_BYTE_COUNTS = 279
+
+
+class EncoderOptions:
+    """Speed/size preset, colour mode and JPEG overrides for an encoder.
+
+    ``subsampling`` (one of SUBSAMPLINGS), ``progressive`` and ``optimize``
+    override the preset when not None. Raises ValueError for unknown values.
+    """
+
+    def __init__(self, preset=PRESET_BALANCED, color=COLOR_COLOR, subsampling=None,
+                 progressive=None, optimize=None, threshold=BILEVEL_THRESHOLD):
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown encoder preset: {preset}")
+        if color not in COLOR_MODES:
+            raise ValueError(f"Unknown colour mode: {color}")
+        if subsampling is not None and subsampling not in SUBSAMPLINGS:
+            raise ValueError(f"Unknown chroma subsampling: {subsampling}")
+        self.preset = preset
+        self.color = color
+        self.subsampling = subsampling
+        self.threshold = threshold
+        settings = PRESET_SETTINGS[preset]
+        self.progressive = settings["progressive"] if progressive is None else progressive
+        self.optimize = settings["optimize"] if optimize is None else optimize
+
+    def __repr__(self):
+        return (f"EncoderOptions(preset={self.preset!r}, color={self.color!r}, "
+                f"subsampling={self.subsampling!r}, progressive={self.progressive}, "
+                f"optimize={self.optimize})")
+
+    def with_color(self, color):
+        """Return a copy of these options with another colour mode."""
+        return EncoderOptions(self.preset, color, self.subsampling, self.progressive,
+                              self.optimize, self.threshold)
+
+    @property
+    def working_mode(self):
+        """PIL mode to resample in before encoding."""
+        return WORKING_MODES[self.color]
+
+    def setting(self, name):
+        """Return a value of this preset from PRESET_SETTINGS."""
+        return PRESET_SETTINGS[self.preset][name]
+
+    def key(self):
+        """Return a string identifying every setting that changes the output."""
+        return (f"{self.preset}|{self.color}|{self.subsampling}|{int(self.progressive)}|"
+                f"{int(self.optimize)}|{self.threshold}")
+
+    def jpeg_params(self, quality):
+        """Return the PIL JPEG save parameters for ``quality``."""
+        params = {"quality": quality, "optimize": self.optimize}
+        if self.progressive:
+            params["progressive"] = True
+        if self.subsampling is not None:
+            params["subsampling"] = self.subsampling
+        return params
+
+    def convert(self, img):
+        """Return the image in the colour mode, thresholding bilevel pages."""
+        if self.color == COLOR_BILEVEL:
+            if img.mode == "1":
+                return img
+            threshold = self.threshold
+            return img.convert("L").point(lambda value: 255 if value >= threshold else 0,
+                                          mode="1")
+        mode = self.working_mode
+        return img if img.mode == mode else img.convert(mode)
+
+
+def encode_image(img, image_format, quality, options, dpi=None):
+    """Encode a rendered page as an image file and return its bytes.
+
+    JPEG cannot hold bilevel images; ask for PNG, TIFF or WebP instead.
+    """
+    img = options.convert(img)
+    params = {"dpi": (dpi, dpi)} if dpi else {}
+    buffer = io.BytesIO()
+    if image_format == FORMAT_JPEG:
+        if img.mode == "1":
+            raise ValueError("JPEG cannot store bilevel images; use PNG, TIFF or WebP")
+        img.save(buffer, format="JPEG", **options.jpeg_params(quality), **params)
+    elif image_format == FORMAT_WEBP:
+        if img.mode == "1":
+            # Text scans compress best losslessly
+            img.convert("L").save(buffer, format="WEBP", lossless=True,
+                                  method=options.setting("webp_method"))
+        else:
+            img.save(buffer, format="WEBP", quality=quality, method=options.setting("webp_method"))
+    elif image_format == FORMAT_PNG:
+        img.save(buffer, format="PNG", compress_level=options.setting("zlib_level"),
+                 optimize=options.preset == PRESET_COMPACT, **params)
+    elif image_format == FORMAT_TIFF:
+        compression = "group4" if img.mode == "1" else options.setting("tiff_compression")
+        img.save(buffer, format="TIFF", compression=compression, **params)
+    else:
+        raise ValueError(f"Unknown image format: {image_format}")
+    return buffer.getvalue()
+
+
+def encode_page_image(img, encoding, quality, options, dpi):
+    """Encode an image as a PDF image stream; return (data, mode).
+
+    ``mode`` is the PIL mode of the stream: L or RGB, or 1 for bilevel
+    pages. Group 4 always makes the page bilevel; JPEG cannot.
+    """
+    if encoding == ENCODING_G4:
+        if options.color != COLOR_BILEVEL:
+            options = options.with_color(COLOR_BILEVEL)
+        return g4_strip(options.convert(img)), "1"
+
+    img = options.convert(img)
+    if encoding == ENCODING_JPEG:
+        if img.mode == "1":
+            raise ValueError("JPEG pages cannot be bilevel; use the g4 or flate encoding")
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", dpi=(dpi, dpi), **options.jpeg_params(quality))
+        return buffer.getvalue(), img.mode
+    if encoding == ENCODING_FLATE:
+        # PIL packs bilevel rows into bytes the way PDF expects (1 is white)
+        return zlib.compress(img.tobytes(), options.setting("zlib_level")), img.mode
+    raise ValueError(f"Unknown page encoding: {encoding}")
+
+
+def g4_strip(img):
+    """Return the raw CCITT Group 4 data of a bilevel image.
+
+    libtiff does the encoding; the image is written as a single-strip TIFF
+    and the strip is cut out. Its black pixels are coded as 1 bits
+    (BlackIs1 in PDF terms).
+    """
+    # Imported here so the GUI can read the constants above without loading PIL
+    from PIL import Image
+    buffer = io.BytesIO()
+    img.save(buffer, format="TIFF", compression="group4",
+             tiffinfo={TIFF_ROWS_PER_STRIP: img.height})
+    data = buffer.getvalue()
+    with Image.open(io.BytesIO(data)) as tiff:
+        tags = tiff.tag_v2
+        if tags.get(TIFF_PHOTOMETRIC) != 1:
+            raise ValueError("Unexpected photometric interpretation in Group 4 TIFF")
+        (offset,), (length,) = tags[TIFF_STRIP_OFFSETS], tags[TIFF_STRIP_BYTE_COUNTS]
+    return data[offset:offset + length]
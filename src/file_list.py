@@ -0,0 +1,157 @@
+"""File list model with incremental updates, and its Listbox view.
+
+The model owns the ordered input paths. Every change is reported to
+subscribed views as the smallest edit that describes it (rows inserted,
+rows deleted, one row moved, or everything replaced), so a view never has to
+clear and refill itself for a single-row change. ListboxView applies those
+edits to a ``tk.Listbox``, which only draws the rows that are visible.
+"""
+import os
+import tkinter as tk
+
+
+def _ranges(indices):
+    """Group sorted indices into (first, last) runs of consecutive values."""
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return runs
+
+
+class FileListModel:
+    """Ordered list of input file paths that notifies views of each change.
+
+    Views are objects with ``on_insert(index, paths)``, ``on_delete(indices)``
+    (sorted, relative to the list before the deletion), ``on_move(source,
+    target)`` and ``on_reset(paths)`` methods.
+    """
+
+    def __init__(self, paths=()):
+        self._paths = list(paths)
+        self._views = []
+
+    def subscribe(self, view):
+        """Register a view and bring it up to date."""
+        self._views.append(view)
+        view.on_reset(list(self._paths))
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        return self._paths[index]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def paths(self):
+        """Return a snapshot of the paths, safe to hand to a background job."""
+        return list(self._paths)
+
+    def insert(self, index, paths):
+        """Insert paths before ``index``."""
+        paths = list(paths)
+        if not paths:
+            return
+        index = max(0, min(index, len(self._paths)))
+        self._paths[index:index] = paths
+        for view in self._views:
+            view.on_insert(index, paths)
+
+    def extend(self, paths):
+        """Append paths at the end."""
+        self.insert(len(self._paths), paths)
+
+    def delete(self, indices):
+        """Remove the rows at the given indices."""
+        indices = sorted(set(indices))
+        if not indices:
+            return
+        for first, last in reversed(_ranges(indices)):
+            del self._paths[first:last + 1]
+        for view in self._views:
+            view.on_delete(indices)
+
+    def move(self, source, target):
+        """Move one row from ``source`` to ``target``; other rows shift by one."""
+        if source == target:
+            return
+        self._paths.insert(target, self._paths.pop(source))
+        for view in self._views:
+            view.on_move(source, target)
+
+    def sort(self, key):
+        """Reorder all rows by ``key``."""
+        self._paths.sort(key=key)
+        self._reset()
+
+    def clear(self):
+        """Remove every row."""
+        self._paths.clear()
+        self._reset()
+
+    def _reset(self):
+        for view in self._views:
+            view.on_reset(list(self._paths))
+
+
+class ListboxView:
+    """Shows a FileListModel's file names in a ``tk.Listbox``.
+
+    ``on_change(count)`` is called after every change, e.g. to show the count.
+    """
+
+    def __init__(self, listbox, model, on_change=None):
+        self.listbox = listbox
+        self.on_change = on_change
+        self._highlighted = False
+        model.subscribe(self)
+
+    @staticmethod
+    def _label(path):
+        return os.path.basename(path)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.listbox.size())
+
+    def on_insert(self, index, paths):
+        # One Tcl call for the whole batch
+        self.listbox.insert(index, *(self._label(path) for path in paths))
+        self._changed()
+
+    def on_delete(self, indices):
+        for first, last in reversed(_ranges(indices)):
+            self.listbox.delete(first, last)
+        self._changed()
+
+    def on_move(self, source, target):
+        label = self.listbox.get(source)
+        self.listbox.delete(source)
+        self.listbox.insert(target, label)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(target)
+        self.listbox.see(target)
+        self._changed()
+
+    def highlight(self, indices, color):
+        """Show the given rows in ``color`` and every other row normally.
+
+        Highlights stay with their rows as others are inserted or deleted,
+        and are dropped when a row is moved or the list is reset.
+        """
+        if self._highlighted:
+            for index in range(self.listbox.size()):
+                self.listbox.itemconfig(index, foreground="")
+        for index in indices:
+            self.listbox.itemconfig(index, foreground=color)
+        self._highlighted = bool(indices)
+
+    def on_reset(self, paths):
+        self.listbox.delete(0, tk.END)
+        if paths:
+            self.listbox.insert(0, *(self._label(path) for path in paths))
+        self._changed()
@@ -1,18 +1,62 @@
+import sys
+import startup_profile
+# Time the imports below when launched with --startup-profile
+if startup_profile.FLAG in sys.argv:
+    startup_profile.enable()
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from ttkthemes import ThemedTk
-from PIL import Image, ImageTk
 import os
-from pdf2image import convert_from_path
-import requests
-from packaging import version
-from threading import Thread
+from threading import Event, Thread
+
+import encoders
+from file_list import FileListModel, ListboxView
+import job_queue
+import page_layout
+
+# Number of list entries on each side of the selection whose previews are prefetched
+PREFETCH_NEIGHBOURS = 2
+
+# Tk event state bits for the Shift and Control modifiers
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+# The automatic update check waits this long after the window is shown
+UPDATE_CHECK_DELAY_MS = 3000
+
+# Modules only needed once the user does something, imported in the
+# background after the first paint so they are ready by then (the engine
+# is imported first, as opening the caches needs it)
+WARM_UP_MODULES = ("PIL.ImageTk", "pdf2image", "img2pdf", "file_scanner", "jpeg_rotate")
+
+# Default worker processes, one per core like conversion_engine.default_workers
+# (the engine is not imported before the first paint)
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Page size and orientation choices as shown in the comboboxes
+PAGE_SIZE_LABELS = {"A4": "a4", "Letter": "letter", "Legal": "legal", "A3": "a3",
+                    "Fit to image": page_layout.PAGE_FIT}
+ORIENTATION_LABELS = {"Portrait": page_layout.ORIENTATION_PORTRAIT,
+                      "Landscape": page_layout.ORIENTATION_LANDSCAPE,
+                      "Auto": page_layout.ORIENTATION_AUTO}
+
+# Encoder choices as shown in the comboboxes
+PAGE_ENCODING_LABELS = {"Auto (by source)": encoders.ENCODING_AUTO, "JPEG": encoders.ENCODING_JPEG,
+                        "Lossless (Flate)": encoders.ENCODING_FLATE,
+                        "Black & white (G4)": encoders.ENCODING_G4}
+IMAGE_FORMAT_LABELS = {"JPEG": encoders.FORMAT_JPEG, "WebP": encoders.FORMAT_WEBP,
+                       "PNG": encoders.FORMAT_PNG, "TIFF": encoders.FORMAT_TIFF}
+COLOR_LABELS = {"Color": encoders.COLOR_COLOR, "Grayscale": encoders.COLOR_GRAY,
+                "Black & white": encoders.COLOR_BILEVEL}
+PRESET_LABELS = {"Fast": encoders.PRESET_FAST, "Balanced": encoders.PRESET_BALANCED,
+                 "Compact": encoders.PRESET_COMPACT}
 
 class ImagePDFConverter:
     def __init__(self, master):
         self.master = master
         self.master.title("Image-PDF Converter By CreatorSpark")
-        self.master.geometry("900x600")     
+        self.master.geometry("900x830")     
         
         # Add version and update URL constants
         self.VERSION = "1.0.0"
@@ -26,14 +70,41 @@ class ImagePDFConverter:
         self.master.grid_columnconfigure(2, weight=2)
         self.master.grid_rowconfigure(2, weight=1)
         
-        self.file_paths = []
+        self.file_paths = FileListModel()  # Shown in the file listbox
         self.conversion_type = tk.StringVar(value="jpg_to_pdf")
         self.quality = tk.IntVar(value=85)
         self.dragging_index = None
+        self.scan_cancel = None  # Set to stop a running folder scan
         
         # Add compression settings
         self.compression_level = tk.IntVar(value=85)  # Default compression level
         self.target_dpi = tk.IntVar(value=300)  # Default DPI
+        self.worker_count = tk.IntVar(value=DEFAULT_WORKERS)  # One process per core
+        self.fast_decode = tk.BooleanVar(value=True)  # Reduced-size JPEG decoding
+        self.page_layout = tk.StringVar(value=page_layout.LAYOUT_REENCODE)
+        self.page_size = tk.StringVar(value="A4")
+        self.orientation = tk.StringVar(value="Portrait")
+        self.n_up = tk.IntVar(value=1)  # Images per page
+        self.page_encoding = tk.StringVar(value="Auto (by source)")
+        self.image_format = tk.StringVar(value="JPEG")  # PDF to JPG output format
+        self.color_mode = tk.StringVar(value="Color")
+        self.encoder_preset = tk.StringVar(value="Balanced")
+        self.extract_images = tk.BooleanVar(value=False)  # Copy out scanned pages' JPEGs
+        self.skip_flagged_pages = tk.BooleanVar(value=False)  # Leave out blank and duplicate pages
+        self.use_target_size = tk.BooleanVar(value=False)  # Pick quality to fit a file size
+        self.target_size_mb = tk.DoubleVar(value=10.0)
+        self.adjust_dpi = tk.BooleanVar(value=True)
+
+        # The caches are opened after the first paint (see open_caches); wait_for_caches()
+        # before using them
+        self.metadata_index = None
+        self.preview_cache = None
+        self.page_cache = None
+        self.caches_ready = Event()
+
+        # Conversions run one after another on a background thread
+        self.job_queue = job_queue.JobQueue(
+            on_update=lambda job: self.master.after(0, self.on_job_update, job))
         
         # Set theme colors
         self.colors = {
@@ -44,36 +115,42 @@ class ImagePDFConverter:
             'listbox_fg': '#333333',
             'button_bg': '#3498db',
             'button_fg': 'white',
-            'preview_bg': '#ecf0f1'
+            'preview_bg': '#ecf0f1',
+            'flagged_fg': '#c0392b'
         }
         
         self.create_widgets()
         self.enable_drag_and_drop()
-        self.check_for_updates() 
+        # Keep the network request (and importing requests) out of startup
+        self.master.after(UPDATE_CHECK_DELAY_MS, self.check_for_updates)
         
     def check_for_updates(self):
         """Check for updates from GitHub repository."""
-        try:
-            def check_update_thread():
-                try:
-                    headers = {'Accept': 'application/vnd.github.v3+json'}
-                    response = requests.get(self.API_URL, headers=headers, timeout=5)
+        def check_update_thread():
+            try:
+                # Imported here so they never delay startup
+                import requests
+                from packaging import version
+            except ImportError:
+                # Handle case where requests or packaging is not available
+                print("Update checker dependencies not available")
+                return
+
+            try:
+                headers = {'Accept': 'application/vnd.github.v3+json'}
+                response = requests.get(self.API_URL, headers=headers, timeout=5)
+                
+                if response.status_code == 200:
+                    latest_version = response.json()['tag_name'].lstrip('v')
                     
-                    if response.status_code == 200:
-                        latest_version = response.json()['tag_name'].lstrip('v')
-                        
-                        if version.parse(latest_version) > version.parse(self.VERSION):
-                            # Schedule the update dialog on the main thread
-                            self.master.after(0, self.show_update_dialog, latest_version)
-                except Exception as e:
-                    print(f"Update check failed: {str(e)}")
-
-            # Run update check in background thread
-            Thread(target=check_update_thread, daemon=True).start()
+                    if version.parse(latest_version) > version.parse(self.VERSION):
+                        # Schedule the update dialog on the main thread
+                        self.master.after(0, self.show_update_dialog, latest_version)
+            except Exception as e:
+                print(f"Update check failed: {str(e)}")
 
-        except ImportError:
-            # Handle case where requests or packaging is not available
-            print("Update checker dependencies not available")
+        # Run update check in background thread
+        Thread(target=check_update_thread, daemon=True).start()
 
     def show_update_dialog(self, latest_version):
         """Show update dialog and handle user response."""
@@ -143,7 +220,7 @@ class ImagePDFConverter:
         file_frame.grid(row=2, column=0, sticky="nsew", padx=20, pady=10)
 
         self.file_listbox = tk.Listbox(file_frame, 
-                                     selectmode="single",
+                                     selectmode="extended",
                                      font=("Helvetica", 12),
                                      bg=self.colors['listbox_bg'],
                                      fg=self.colors['listbox_fg'],
@@ -156,6 +233,9 @@ class ImagePDFConverter:
         scrollbar = ttk.Scrollbar(file_frame, orient="vertical", command=self.file_listbox.yview)
         scrollbar.pack(side="right", fill="y")
         self.file_listbox.config(yscrollcommand=scrollbar.set)
+        # The listbox follows the model with single-row edits instead of full refreshes
+        self.file_list_view = ListboxView(self.file_listbox, self.file_paths,
+                                          on_change=self.update_file_count)
 
         # Button Frame with enhanced styling
         button_frame = ttk.Frame(self.master)
@@ -163,10 +243,13 @@ class ImagePDFConverter:
         
         buttons = [
             ("➕ Add Files", self.add_files, "Add new files to the list"),
+            ("📁 Add Folder", self.add_folder, "Add all matching files in a folder and its subfolders"),
             ("➖ Remove", self.remove_selected_files, "Remove selected files"),
             ("🔄 Sort", self.sort_files, "Sort files naturally (e.g., 1, 2, 10 instead of 1, 10, 2)"),
-            ("↪️ Rotate Right", lambda: self.rotate_image(90), "Rotate selected image 90° clockwise"),
-            ("↩️ Rotate Left", lambda: self.rotate_image(-90), "Rotate selected image 90° counter-clockwise"),
+            ("🔍 Find Blanks", self.find_flagged_pages,
+             "Select blank pages and duplicate scans so they can be removed"),
+            ("↪️ Rotate Right", lambda: self.rotate_image(90), "Rotate selected images 90° clockwise (lossless)"),
+            ("↩️ Rotate Left", lambda: self.rotate_image(-90), "Rotate selected images 90° counter-clockwise (lossless)"),
             ("🗑️ Clear All", self.clear_files, "Clear all files")
         ]
 
@@ -209,6 +292,18 @@ class ImagePDFConverter:
                  textvariable=self.quality,
                  font=("Helvetica", 11)).grid(row=0, column=2, padx=5)
 
+        ttk.Label(self.quality_frame,
+                 text="Format:",
+                 font=("Helvetica", 11)).grid(row=1, column=0, padx=5)
+        self.create_encoder_options(self.quality_frame, IMAGE_FORMAT_LABELS,
+                                    self.image_format).grid(row=1, column=1, columnspan=2,
+                                                            padx=5, pady=(5, 0), sticky="w")
+
+        ttk.Checkbutton(self.quality_frame,
+                       text="Extract embedded JPEGs (scans)",
+                       variable=self.extract_images).grid(row=2, column=1, columnspan=2,
+                                                          padx=5, pady=(5, 0), sticky="w")
+
         # Add Compression Control Frame
         compression_frame = ttk.LabelFrame(self.master, text="PDF Compression Settings", padding=10)
         compression_frame.grid(row=3, column=0, columnspan=3, padx=20, pady=10, sticky="ew")
@@ -244,19 +339,123 @@ class ImagePDFConverter:
         dpi_combobox.grid(row=1, column=1, padx=5, sticky="w")
         dpi_combobox.set(300)  # Default DPI
 
+        ttk.Checkbutton(compression_frame,
+                       text="Passthrough (embed JPEGs without re-encoding)",
+                       variable=self.page_layout,
+                       onvalue=page_layout.LAYOUT_PASSTHROUGH,
+                       offvalue=page_layout.LAYOUT_REENCODE).grid(row=1, column=2, padx=5, sticky="w")
+
+        # Worker process count
+        ttk.Label(compression_frame, 
+                 text="Workers:",
+                 font=("Helvetica", 11)).grid(row=2, column=0, padx=5)
+        
+        worker_spinbox = ttk.Spinbox(compression_frame,
+                                   from_=1,
+                                   to=max(64, DEFAULT_WORKERS),
+                                   textvariable=self.worker_count,
+                                   width=8,
+                                   state="readonly")
+        worker_spinbox.grid(row=2, column=1, padx=5, sticky="w")
+
+        ttk.Checkbutton(compression_frame,
+                       text="Fast decode (slightly softer resampling)",
+                       variable=self.fast_decode).grid(row=2, column=2, padx=5, sticky="w")
+
+        # Target file size: the compression level becomes the highest quality allowed
+        ttk.Checkbutton(compression_frame,
+                       text="Max size (MB):",
+                       variable=self.use_target_size).grid(row=3, column=0, padx=5)
+
+        target_size_spinbox = ttk.Spinbox(compression_frame,
+                                        from_=0.1,
+                                        to=10000,
+                                        increment=0.5,
+                                        textvariable=self.target_size_mb,
+                                        width=8)
+        target_size_spinbox.grid(row=3, column=1, padx=5, sticky="w")
+
+        ttk.Checkbutton(compression_frame,
+                       text="Lower DPI if needed to fit",
+                       variable=self.adjust_dpi).grid(row=3, column=2, padx=5, sticky="w")
+
+        # Page size, orientation and images per page
+        ttk.Label(compression_frame,
+                 text="Page:",
+                 font=("Helvetica", 11)).grid(row=4, column=0, padx=5)
+
+        page_options = ttk.Frame(compression_frame)
+        page_options.grid(row=4, column=1, columnspan=2, padx=5, sticky="w")
+        ttk.Combobox(page_options,
+                    values=list(PAGE_SIZE_LABELS),
+                    textvariable=self.page_size,
+                    width=12,
+                    state="readonly").pack(side=tk.LEFT)
+        ttk.Combobox(page_options,
+                    values=list(ORIENTATION_LABELS),
+                    textvariable=self.orientation,
+                    width=10,
+                    state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(page_options, text="Images per page:").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Combobox(page_options,
+                    values=sorted(page_layout.N_UP_GRIDS),
+                    textvariable=self.n_up,
+                    width=4,
+                    state="readonly").pack(side=tk.LEFT)
+
+        # Page image encoding, colour mode and encoder preset
+        ttk.Label(compression_frame,
+                 text="Encoding:",
+                 font=("Helvetica", 11)).grid(row=5, column=0, padx=5)
+        self.create_encoder_options(compression_frame, PAGE_ENCODING_LABELS,
+                                    self.page_encoding).grid(row=5, column=1, columnspan=2,
+                                                             padx=5, pady=(5, 0), sticky="w")
+
+        ttk.Checkbutton(compression_frame,
+                       text="Skip blank and duplicate pages",
+                       variable=self.skip_flagged_pages).grid(row=6, column=1, columnspan=2,
+                                                              padx=5, pady=(5, 0), sticky="w")
+
         # Compression info label
         compression_info = ttk.Label(compression_frame,
                                    text="Lower compression = larger file size, better quality\n"
                                         "Higher compression = smaller file size, lower quality",
                                    font=("Helvetica", 9, "italic"))
-        compression_info.grid(row=2, column=0, columnspan=3, pady=5)
+        compression_info.grid(row=7, column=0, columnspan=3, pady=5)
 
         # Convert Button with enhanced styling
         convert_btn = ttk.Button(self.master,
                                text="Convert Files",
                                command=self.convert,
                                style='Convert.TButton')
-        convert_btn.grid(row=4, column=0, columnspan=3, pady=20)
+        convert_btn.grid(row=4, column=0, columnspan=3, pady=10)
+
+        # Conversion queue
+        jobs_frame = ttk.LabelFrame(self.master, text="Conversion Queue", padding=10)
+        jobs_frame.grid(row=5, column=0, columnspan=3, padx=20, pady=5, sticky="ew")
+        jobs_frame.grid_columnconfigure(0, weight=1)
+
+        self.jobs_tree = ttk.Treeview(jobs_frame,
+                                      columns=("type", "output", "status", "progress", "time"),
+                                      show="headings",
+                                      height=4)
+        for column, heading, width in (("type", "Type", 90),
+                                       ("output", "Output", 300),
+                                       ("status", "Status", 90),
+                                       ("progress", "Progress", 220),
+                                       ("time", "Time", 70)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width, stretch=(column == "output"))
+        self.jobs_tree.grid(row=0, column=0, rowspan=2, sticky="ew")
+
+        ttk.Button(jobs_frame,
+                  text="Cancel Job",
+                  command=self.cancel_selected_job,
+                  style='Custom.TButton').grid(row=0, column=1, padx=5, sticky="ew")
+        ttk.Button(jobs_frame,
+                  text="Clear Finished",
+                  command=self.clear_finished_jobs,
+                  style='Custom.TButton').grid(row=1, column=1, padx=5, sticky="ew")
 
         # Status Bar with enhanced styling
         self.status_bar = ttk.Label(self.master,
@@ -264,11 +463,11 @@ class ImagePDFConverter:
                                   font=("Helvetica", 10),
                                   relief=tk.SUNKEN,
                                   anchor="w")
-        self.status_bar.grid(row=5, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        self.status_bar.grid(row=6, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
 
         # Modified GitHub frame with version and update button
         github_frame = ttk.Frame(self.master)
-        github_frame.grid(row=5, column=2, sticky="e", padx=5, pady=5)
+        github_frame.grid(row=6, column=2, sticky="e", padx=5, pady=5)
         
         # Add update check button
         update_btn = ttk.Button(github_frame,
@@ -293,6 +492,32 @@ class ImagePDFConverter:
 
         self.update_ui()
 
+    def create_encoder_options(self, parent, format_labels, format_var):
+        """Build a row of format, colour mode and preset comboboxes; returns its frame."""
+        frame = ttk.Frame(parent)
+        ttk.Combobox(frame,
+                    values=list(format_labels),
+                    textvariable=format_var,
+                    width=18,
+                    state="readonly").pack(side=tk.LEFT)
+        ttk.Combobox(frame,
+                    values=list(COLOR_LABELS),
+                    textvariable=self.color_mode,
+                    width=13,
+                    state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Label(frame, text="Preset:").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Combobox(frame,
+                    values=list(PRESET_LABELS),
+                    textvariable=self.encoder_preset,
+                    width=9,
+                    state="readonly").pack(side=tk.LEFT)
+        return frame
+
+    def encoder_options(self):
+        """Return the EncoderOptions selected in the UI."""
+        return encoders.EncoderOptions(PRESET_LABELS[self.encoder_preset.get()],
+                                       COLOR_LABELS[self.color_mode.get()])
+
     def enable_drag_and_drop(self):
         """Enable drag-and-drop reordering for the file list."""
         self.file_listbox.bind("<ButtonPress-1>", self.on_drag_start)
@@ -301,6 +526,11 @@ class ImagePDFConverter:
 
     def on_drag_start(self, event):
         """Handle the start of dragging an item."""
+        if event.state & (SHIFT_MASK | CONTROL_MASK):
+            # Shift/Ctrl-click extends the selection instead of starting a drag
+            self.dragging_index = None
+            return
+
         widget = event.widget
         self.dragging_index = widget.nearest(event.y)
         widget.selection_clear(0, tk.END)
@@ -308,6 +538,9 @@ class ImagePDFConverter:
 
     def on_drag(self, event):
         """Handle dragging of an item."""
+        if self.dragging_index is None:
+            return
+
         widget = event.widget
         index = widget.nearest(event.y)
 
@@ -324,22 +557,13 @@ class ImagePDFConverter:
         new_index = widget.nearest(event.y)
 
         if new_index != self.dragging_index and new_index >= 0 and new_index < len(self.file_paths):
-            # Rearrange file paths and update Listbox
-            item = self.file_paths.pop(self.dragging_index)
-            self.file_paths.insert(new_index, item)
-
-            self.update_file_listbox()
+            # Move the one row; the listbox is updated by its view
+            self.file_paths.move(self.dragging_index, new_index)
 
         self.dragging_index = None  # Reset dragging index after drop
 
-    def update_file_listbox(self):
-        """Refresh the Listbox with current file paths and show file count."""
-        self.file_listbox.delete(0, tk.END)
-        for file in self.file_paths:
-            self.file_listbox.insert(tk.END, os.path.basename(file))
-        
-        # Update file count in frame title
-        file_count = len(self.file_paths)
+    def update_file_count(self, file_count):
+        """Show the number of files in the file list's frame title."""
         self.file_listbox.master.configure(text=f"Selected Files ({file_count})")
 
     def create_tooltip(self, widget, text):
@@ -361,22 +585,44 @@ class ImagePDFConverter:
         
         widget.bind('<Enter>', show_tooltip)
 
+    def open_caches(self):
+        """Open the metadata index, preview cache and page cache.
+
+        Runs on the warm-up thread after the first paint: the SQLite opens
+        and the engine imports behind them stay out of startup.
+        """
+        try:
+            from metadata_index import MetadataIndex
+            from page_cache import PageCache
+            from preview_cache import PreviewCache
+
+            # Persistent metadata/thumbnail index; the app works without it if the cache dir is unusable
+            try:
+                self.metadata_index = MetadataIndex()
+            except Exception as e:
+                print(f"Metadata index unavailable: {str(e)}")
+            self.preview_cache = PreviewCache(index=self.metadata_index)
+
+            # Encoded pages from earlier conversions, so re-running after an edit only redoes changed pages
+            try:
+                self.page_cache = PageCache()
+            except Exception as e:
+                print(f"Page cache unavailable: {str(e)}")
+        finally:
+            # Never leave the UI waiting, even if an import failed
+            self.caches_ready.set()
+
+    def wait_for_caches(self):
+        """Block until open_caches() is done (it is by the time a user gets to act)."""
+        self.caches_ready.wait()
+
     def sort_files(self):
         """Sort files naturally, handling numbers correctly."""
+        import file_scanner
         if not self.file_paths:
             return
         
-        def natural_sort_key(path):
-            import re
-            # Split the filename into text and number parts
-            filename = os.path.basename(path)
-            parts = re.split('([0-9]+)', filename.lower())
-            # Convert number strings to integers for proper numerical sorting
-            parts = [int(part) if part.isdigit() else part for part in parts]
-            return parts
-        
-        self.file_paths.sort(key=natural_sort_key)
-        self.update_file_listbox()
+        self.file_paths.sort(key=lambda path: file_scanner.natural_sort_key(os.path.basename(path)))
         self.status_bar.config(text="Files sorted naturally")
 
     def clear_files(self):
@@ -385,15 +631,16 @@ class ImagePDFConverter:
             return
             
         if messagebox.askyesno("Confirm Clear", "Are you sure you want to clear all files?"):
+            self.cancel_folder_scan()
             self.file_paths.clear()
-            self.update_file_listbox()
             self.preview_canvas.delete("all")
             self.status_bar.config(text="All files cleared")
 
     def add_files(self):
         """Add files to the file list with improved filtering."""
+        import file_scanner
         if self.conversion_type.get() == "jpg_to_pdf":
-            filetypes = [("Image files", "*.jpg *.jpeg")]
+            filetypes = [("Images and PDFs", "*.jpg *.jpeg *.png *.tif *.tiff *.webp *.pdf")]
         else:
             filetypes = [("PDF files", "*.pdf")]
             
@@ -403,29 +650,90 @@ class ImagePDFConverter:
         )
         
         if files:
-            # Filter out unsupported files
-            valid_extensions = ('.jpg', '.jpeg') if self.conversion_type.get() == "jpg_to_pdf" else ('.pdf',)
-            valid_files = [f for f in files if f.lower().endswith(valid_extensions)]
-            
-            if len(valid_files) != len(files):
-                messagebox.showwarning(
-                    "Invalid Files",
-                    "Some files were skipped because they had unsupported formats."
-                )
-            
+            # Filter out unsupported files by their content, whatever their extension
+            valid_files, skipped = file_scanner.filter_files(list(files), self.scan_file_types())
+
             self.file_paths.extend(valid_files)
-            self.update_file_listbox()
-            self.status_bar.config(text=f"Added {len(valid_files)} file(s)")
+            status = f"Added {len(valid_files)} file(s)"
+            if skipped:
+                status += f", skipped {len(skipped)} with unsupported formats"
+            self.status_bar.config(text=status)
+
+            # Fill the persistent index so previews and page counts are ready when needed
+            self.wait_for_caches()
+            if self.metadata_index is not None:
+                self.metadata_index.index_in_background(valid_files)
+
+    def scan_file_types(self):
+        """Return the file types accepted in the current conversion mode."""
+        import conversion_engine
+        # PDFs given to JPG to PDF have their pages copied into the output
+        if self.conversion_type.get() == "jpg_to_pdf":
+            return conversion_engine.IMAGE_TYPES + ("pdf",)
+        return ("pdf",)
+
+    def add_folder(self):
+        """Add every matching file in a folder tree, scanning on a background thread."""
+        import file_scanner
+        folder = filedialog.askdirectory(title="Select Folder")
+        if not folder:
+            return
+
+        self.cancel_folder_scan()
+        cancel_event = self.scan_cancel = Event()
+        file_types = self.scan_file_types()
+        self.status_bar.config(text=f"Scanning {folder}...")
+
+        def scan_thread():
+            try:
+                result = file_scanner.scan_folder(
+                    folder, file_types,
+                    on_batch=lambda batch: self.master.after(0, self.on_scan_batch, batch, cancel_event),
+                    cancel_event=cancel_event)
+            except Exception as e:
+                message = f"Folder scan failed: {str(e)}"
+                self.master.after(0, lambda: self.status_bar.config(text=message))
+                return
+            self.master.after(0, self.on_scan_done, folder, result, cancel_event)
+
+        Thread(target=scan_thread, daemon=True).start()
+
+    def on_scan_batch(self, batch, cancel_event):
+        """Append a batch of scanned files to the list (runs on the Tk main thread)."""
+        if cancel_event.is_set():
+            return
+        self.file_paths.extend(batch)
+        self.status_bar.config(text=f"Scanning... {len(self.file_paths)} file(s) in the list")
+
+    def on_scan_done(self, folder, result, cancel_event):
+        """Report the outcome of a folder scan (runs on the Tk main thread)."""
+        if cancel_event is self.scan_cancel:
+            self.scan_cancel = None
+        if result.cancelled or cancel_event.is_set():
+            self.status_bar.config(text=f"Folder scan cancelled after {result.found} file(s)")
+            return
+        status = f"Added {result.found} file(s) from {folder}"
+        if result.skipped:
+            status += f", skipped {result.skipped} with unsupported formats"
+        if result.errors:
+            status += f", {result.errors} unreadable"
+        self.status_bar.config(text=status)
+
+    def cancel_folder_scan(self):
+        """Stop a running folder scan, dropping the batches it has not delivered yet."""
+        if self.scan_cancel is not None:
+            self.scan_cancel.set()
+            self.scan_cancel = None
 
     def remove_selected_files(self):
         """Remove selected files from the file list."""
-        selected_index = self.file_listbox.curselection()
-        if selected_index:
-            self.file_paths.pop(selected_index[0])
-            self.update_file_listbox()
+        selected_indices = self.file_listbox.curselection()
+        if selected_indices:
+            self.file_paths.delete(selected_indices)
 
     def preview_selected_file(self):
         """Show a preview of the selected file."""
+        import conversion_engine
         selected_indices = self.file_listbox.curselection()
         if not selected_indices:
             self.preview_canvas.delete("all")
@@ -442,22 +750,41 @@ class ImagePDFConverter:
             center_x = canvas_width // 2
             center_y = canvas_height // 2
 
-            if selected_file.lower().endswith(('.jpg', '.jpeg')):
-                image = Image.open(selected_file)
-                # Maintain aspect ratio
-                image.thumbnail((canvas_width, canvas_height))
-                self.preview_image = ImageTk.PhotoImage(image)
-                self.preview_canvas.create_image(center_x, center_y, image=self.preview_image)
-            elif selected_file.lower().endswith('.pdf'):
-                pages = convert_from_path(selected_file, first_page=1, last_page=1)
-                image = pages[0]
-                # Maintain aspect ratio
-                image.thumbnail((canvas_width, canvas_height))
+            if conversion_engine.is_image(selected_file) or conversion_engine.is_pdf(selected_file):
+                # Thumbnails are cached per file version and canvas size
+                self.wait_for_caches()
+                image = self.preview_cache.thumbnail(selected_file, canvas_width, canvas_height)
+                from PIL import ImageTk
                 self.preview_image = ImageTk.PhotoImage(image)
                 self.preview_canvas.create_image(center_x, center_y, image=self.preview_image)
+
+                self.show_file_info(selected_file)
+
+                # Render the neighbouring entries ahead of time
+                neighbours = self.file_paths[max(0, selected_index - PREFETCH_NEIGHBOURS):selected_index]
+                neighbours += self.file_paths[selected_index + 1:selected_index + 1 + PREFETCH_NEIGHBOURS]
+                self.preview_cache.prefetch(neighbours, canvas_width, canvas_height)
         except Exception as e:
             self.status_bar.config(text=f"Error previewing file: {str(e)}")
 
+    def show_file_info(self, path):
+        """Show the indexed dimensions or page count of a file in the status bar."""
+        import conversion_engine
+        self.wait_for_caches()
+        if self.metadata_index is None:
+            return
+        metadata = self.metadata_index.lookup(path)
+        if metadata is None:
+            return
+
+        details = []
+        if metadata.width and metadata.height:
+            details.append(f"{metadata.width}×{metadata.height} px")
+        if metadata.page_count and (conversion_engine.is_pdf(path) or metadata.page_count > 1):
+            details.append(f"{metadata.page_count} page(s)")
+        if details:
+            self.status_bar.config(text=f"{os.path.basename(path)}: {', '.join(details)}")
+
     def update_ui(self):
         """Update the UI based on the conversion type."""
         if self.conversion_type.get() == "jpg_to_pdf":
@@ -466,7 +793,7 @@ class ImagePDFConverter:
             self.quality_frame.grid(row=3, column=0, columnspan=3, sticky="ew", padx=20)
 
     def convert(self):
-        """Start conversion based on selected files and type."""
+        """Queue a conversion based on selected files and type."""
         if not self.file_paths:
             messagebox.showerror("Error", "No files selected")
             return
@@ -477,118 +804,83 @@ class ImagePDFConverter:
             self.pdf_to_jpg()
 
     def jpg_to_pdf(self):
-        """Convert JPG files to a single PDF with enhanced compression options."""
-        if not any(file.lower().endswith(('.jpg', '.jpeg')) for file in self.file_paths):
-            messagebox.showerror("Error", "No JPG files selected")
+        """Queue conversion of the images to a single PDF with the current compression options."""
+        import conversion_engine
+        import page_analysis
+        if not any(conversion_engine.is_image(file) or conversion_engine.is_pdf(file)
+                   for file in self.file_paths):
+            messagebox.showerror("Error", "No image or PDF files selected")
+            return
+
+        target_size = None
+        if self.use_target_size.get():
+            try:
+                target_size = int(self.target_size_mb.get() * 1024 * 1024)
+            except tk.TclError:
+                target_size = 0
+            if target_size <= 0:
+                messagebox.showerror("Error", "Please enter a valid maximum size in MB")
+                return
+
+        page_size = PAGE_SIZE_LABELS[self.page_size.get()]
+        n_up = self.n_up.get()
+        if page_size == page_layout.PAGE_FIT and n_up != 1:
+            messagebox.showerror("Error", "Pages sized to fit the image hold one image each")
+            return
+        encoding = PAGE_ENCODING_LABELS[self.page_encoding.get()]
+        encoder_options = self.encoder_options()
+        if encoding == encoders.ENCODING_JPEG and encoder_options.color == encoders.COLOR_BILEVEL:
+            messagebox.showerror("Error", "JPEG pages cannot be black & white; "
+                                          "choose the Lossless or G4 encoding")
+            return
+        if encoding not in (encoders.ENCODING_JPEG, encoders.ENCODING_AUTO) and target_size is not None:
+            messagebox.showerror("Error", "Max size needs the JPEG or Auto encoding")
             return
 
         output_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if not output_path:
             return
 
-        try:
-            from PIL import Image
-            import io
-
-            # Calculate target dimensions based on DPI
-            dpi = self.target_dpi.get()
-            A4_WIDTH_IN = 8.27
-            A4_HEIGHT_IN = 11.69
-            A4_WIDTH_PX = int(A4_WIDTH_IN * dpi)
-            A4_HEIGHT_PX = int(A4_HEIGHT_IN * dpi)
-
-            # Create a list to store compressed images
-            compressed_images = []
-            
-            # Show progress bar
-            progress_window = tk.Toplevel(self.master)
-            progress_window.title("Converting...")
-            progress_window.geometry("300x150")
-            progress_window.transient(self.master)
-            
-            progress_label = ttk.Label(progress_window, text="Processing images...")
-            progress_label.pack(pady=10)
-            
-            progress_bar = ttk.Progressbar(progress_window, length=200, mode='determinate')
-            progress_bar.pack(pady=10)
-            
-            total_files = len(self.file_paths)
-            
-            for index, image_path in enumerate(self.file_paths):
-                if not image_path.lower().endswith(('.jpg', '.jpeg')):
-                    continue
-                
-                # Update progress
-                progress_bar['value'] = (index + 1) / total_files * 100
-                progress_label['text'] = f"Processing image {index + 1} of {total_files}"
-                progress_window.update()
-                
-                # Open and process image
-                with Image.open(image_path) as img:
-                    # Convert to RGB if necessary
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Calculate aspect ratios
-                    img_aspect = img.width / img.height
-                    a4_aspect = A4_WIDTH_PX / A4_HEIGHT_PX
-                    
-                    # Resize image to fit A4 while maintaining aspect ratio
-                    if img_aspect > a4_aspect:  # Image is wider than A4
-                        new_width = A4_WIDTH_PX
-                        new_height = int(A4_WIDTH_PX / img_aspect)
-                    else:  # Image is taller than A4
-                        new_height = A4_HEIGHT_PX
-                        new_width = int(A4_HEIGHT_PX * img_aspect)
-                    
-                    # Use high-quality Lanczos resampling
-                    resized_img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Create new A4 canvas
-                    a4_canvas = Image.new('RGB', (A4_WIDTH_PX, A4_HEIGHT_PX), 'white')
-                    
-                    # Paste resized image in center of A4
-                    paste_x = (A4_WIDTH_PX - new_width) // 2
-                    paste_y = (A4_HEIGHT_PX - new_height) // 2
-                    a4_canvas.paste(resized_img, (paste_x, paste_y))
-                    
-                    # Create a bytes buffer
-                    img_buffer = io.BytesIO()
-                    
-                    # Save with compression
-                    a4_canvas.save(img_buffer, 
-                                 format='JPEG', 
-                                 quality=self.compression_level.get(),
-                                 optimize=True,
-                                 dpi=(dpi, dpi))
-                    img_buffer.seek(0)
-                    compressed_images.append(img_buffer)
-
-            # Convert compressed images to PDF
-            from img2pdf import convert
-            with open(output_path, "wb") as f:
-                f.write(convert([img.getvalue() for img in compressed_images],
-                              dpi=dpi))
-
-            # Clean up
-            for buffer in compressed_images:
-                buffer.close()
-            
-            # Close progress window
-            progress_window.destroy()
-
-            messagebox.showinfo("Success", "PDF created successfully!")
-            self.status_bar.config(text="Conversion completed successfully")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-            self.status_bar.config(text="Conversion failed")
+        self.wait_for_caches()
+        job = job_queue.ConversionJob("jpg_to_pdf",
+                                      self.file_paths.paths(),
+                                      output_path,
+                                      dpi=self.target_dpi.get(),
+                                      quality=self.compression_level.get(),
+                                      workers=self.worker_count.get(),
+                                      fast_decode=self.fast_decode.get(),
+                                      layout=self.page_layout.get(),
+                                      target_size=target_size,
+                                      adjust_dpi=self.adjust_dpi.get(),
+                                      page_cache=self.page_cache,
+                                      page_size=page_size,
+                                      orientation=ORIENTATION_LABELS[self.orientation.get()],
+                                      n_up=n_up,
+                                      encoding=encoding,
+                                      encoder_options=encoder_options,
+                                      screen=page_analysis.PageScreen()
+                                      if self.skip_flagged_pages.get() else None)
+        self.job_queue.submit(job)
 
     def pdf_to_jpg(self):
-        """Convert PDF files to JPG images."""
-        if not any(file.lower().endswith('.pdf') for file in self.file_paths):
+        """Queue conversion of the PDF files to JPG images."""
+        import conversion_engine
+        if not any(conversion_engine.is_pdf(file) for file in self.file_paths):
             messagebox.showerror("Error", "No PDF files selected")
             return
 
+        image_format = IMAGE_FORMAT_LABELS[self.image_format.get()]
+        encoder_options = self.encoder_options()
+        if image_format == encoders.FORMAT_JPEG and encoder_options.color == encoders.COLOR_BILEVEL:
+            messagebox.showerror("Error", "JPEG cannot store black & white images; "
+                                          "choose PNG, TIFF or WebP")
+            return
+        extract = self.extract_images.get()
+        if extract and (image_format != encoders.FORMAT_JPEG
+                        or encoder_options.color != encoders.COLOR_COLOR):
+            messagebox.showerror("Error", "Extracting embedded JPEGs needs color JPEG output")
+            return
+
         output_dir = filedialog.askdirectory()
         if not output_dir:
             return
@@ -597,71 +889,240 @@ class ImagePDFConverter:
             # Check if poppler is installed and accessible
             import platform
             if platform.system() == "Windows":
-                from pdf2image.exceptions import PDFPageCountError, PDFInfoNotInstalledError
                 try:
-                    # First try with default poppler path
-                    images = convert_from_path(self.file_paths[0], first_page=1, last_page=1)
-                except (PDFInfoNotInstalledError, PDFPageCountError) as e:
-                    messagebox.showerror("Error", 
-                        "Poppler is not installed or not found. Please install poppler and add it to your system PATH.\n"
-                        "You can download it from: https://github.com/oschwartz10612/poppler-windows/releases\n"
-                        "After installing, restart the application.")
+                    conversion_engine.check_poppler(self.file_paths[0])
+                except conversion_engine.PopplerNotFoundError as e:
+                    messagebox.showerror("Error", str(e))
                     return
-
-            for pdf_path in self.file_paths:
-                if not pdf_path.lower().endswith('.pdf'):
-                    continue
-                    
-                base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-                images = convert_from_path(pdf_path)
-                
-                for i, image in enumerate(images):
-                    output_path = os.path.join(output_dir, f"{base_name}_page_{i+1}.jpg")
-                    image.save(output_path, "JPEG", quality=self.quality.get())
-            
-            messagebox.showinfo("Success", "JPG files created successfully!")
-            self.status_bar.config(text="Conversion completed successfully")
         except Exception as e:
             messagebox.showerror("Error", 
                 f"An error occurred: {str(e)}\n\n"
                 "If you're seeing a poppler error, please install poppler and add it to your system PATH.")
             self.status_bar.config(text="Conversion failed")
+            return
+
+        job = job_queue.ConversionJob("pdf_to_jpg",
+                                      self.file_paths.paths(),
+                                      output_dir,
+                                      quality=self.quality.get(),
+                                      workers=self.worker_count.get(),
+                                      image_format=image_format,
+                                      encoder_options=encoder_options,
+                                      extract=extract)
+        self.job_queue.submit(job)
+
+    def on_job_update(self, job):
+        """Reflect a job's state in the queue view (runs on the Tk main thread)."""
+        import conversion_engine
+        item = str(job.id)
+        if job.progress is not None and job.status == job_queue.RUNNING:
+            progress = f"{job.progress.percent:.0f}% {job.progress.message}"
+        elif job.status == job_queue.DONE:
+            progress = f"{job.result.pages} page(s), {job.result.pages_per_second:.1f} pages/s"
+        elif job.status == job_queue.FAILED:
+            progress = str(job.error)
+        else:
+            progress = ""
+        values = ("JPG to PDF" if job.kind == "jpg_to_pdf" else "PDF to JPG",
+                  job.output,
+                  job.status.capitalize(),
+                  progress,
+                  f"{job.elapsed:.1f}s")
+
+        if self.jobs_tree.exists(item):
+            self.jobs_tree.item(item, values=values)
+        elif job in self.job_queue.jobs:
+            self.jobs_tree.insert("", tk.END, iid=item, values=values)
+
+        if job.status == job_queue.QUEUED:
+            self.status_bar.config(text=f"Queued job #{job.id} ({len(self.job_queue.active_jobs())} pending)")
+        elif job.status == job_queue.DONE:
+            status = f"Job #{job.id} completed successfully in {job.elapsed:.1f}s"
+            if getattr(job.result, "passthrough", 0):
+                status += f" ({job.result.passthrough} page(s) embedded without re-encoding)"
+            if getattr(job.result, "cached", 0):
+                status += f" ({job.result.cached} unchanged page(s) reused)"
+            if getattr(job.result, "flagged", None):
+                status += f" ({len(job.result.flagged)} blank or duplicate page(s) skipped)"
+            if getattr(job.result, "copied", 0):
+                status += f" ({job.result.copied} page(s) copied from PDFs)"
+            if getattr(job.result, "extracted", 0):
+                status += f" ({job.result.extracted} page(s) extracted without rendering)"
+            if getattr(job.result, "quality", None) is not None:
+                status += f" at quality {job.result.quality}, {job.result.dpi} DPI"
+                output_size = os.path.getsize(job.output)
+                if output_size > job.options["target_size"]:
+                    messagebox.showwarning(
+                        "Warning",
+                        f"The PDF is {conversion_engine.format_size(output_size)}, larger than the "
+                        f"{conversion_engine.format_size(job.options['target_size'])} requested.")
+            stats = getattr(job.result, "stats", None)
+            if stats is not None and stats.traces:
+                stage, _, share = stats.breakdown()[0]
+                status += f" - slowest stage: {stage} ({share:.0%} of page time)"
+            self.status_bar.config(text=status)
+        elif job.status == job_queue.CANCELLED:
+            self.status_bar.config(text=f"Job #{job.id} cancelled")
+        elif job.status == job_queue.FAILED:
+            self.status_bar.config(text="Conversion failed")
+            messagebox.showerror("Error", f"Job #{job.id} failed: {str(job.error)}")
+
+    def cancel_selected_job(self):
+        """Cancel the job selected in the queue view."""
+        selected = self.jobs_tree.selection()
+        if not selected:
+            messagebox.showinfo("Info", "Please select a job to cancel")
+            return
+
+        for job in self.job_queue.jobs:
+            if str(job.id) in selected and not job.finished:
+                self.job_queue.cancel(job)
+                self.status_bar.config(text=f"Cancelling job #{job.id}...")
+
+    def clear_finished_jobs(self):
+        """Remove finished jobs from the queue view."""
+        for job in self.job_queue.jobs:
+            if job.finished and self.jobs_tree.exists(str(job.id)):
+                self.jobs_tree.delete(str(job.id))
+        self.job_queue.clear_finished()
 
     def open_github(self):
         """Open GitHub profile in default browser."""
         import webbrowser
         webbrowser.open("https://github.com/CreatorSpark")
 
+    def find_flagged_pages(self):
+        """Select the blank and duplicate images in the list, checking them on a background thread.
+
+        Files with several pages (TIFFs) are selected only if all their pages
+        are flagged; otherwise converting with "Skip blank and duplicate
+        pages" leaves the flagged ones out.
+        """
+        import conversion_engine
+        import page_analysis
+        indices = [index for index, path in enumerate(self.file_paths)
+                   if conversion_engine.is_image(path)]
+        if not indices:
+            messagebox.showinfo("Info", "No images to check")
+            return
+        paths = [self.file_paths[index] for index in indices]
+        self.status_bar.config(text=f"Checking {len(paths)} image(s) for blank and duplicate pages...")
+
+        def check_thread():
+            screen = page_analysis.PageScreen(page_analysis.SCREEN_REPORT,
+                                              page_analysis.SCREEN_REPORT)
+            try:
+                # Counting the pages of TIFFs reads their headers
+                rows = [conversion_engine.image_frames(path) for path in paths]
+                analyses = screen.analyze(
+                    [image for images in rows for image in images],
+                    progress=lambda done, total: self.master.after(
+                        0, lambda: self.status_bar.config(text=f"Checking page {done} of {total}...")))
+            except Exception as e:
+                message = f"Page check failed: {str(e)}"
+                self.master.after(0, lambda: self.status_bar.config(text=message))
+                return
+            self.master.after(0, on_checked, rows, analyses)
+
+        def on_checked(rows, analyses):
+            flagged = []
+            partly_flagged = 0
+            first = 0
+            for index, path, images in zip(indices, paths, rows):
+                row_flags = [analysis.flagged for analysis in analyses[first:first + len(images)]]
+                first += len(images)
+                if not all(row_flags):
+                    partly_flagged += any(row_flags)
+                # Rows may have been moved or removed meanwhile; only mark those still in place
+                elif index < len(self.file_paths) and self.file_paths[index] == path:
+                    flagged.append(index)
+            self.file_list_view.highlight(flagged, self.colors['flagged_fg'])
+            self.file_listbox.selection_clear(0, tk.END)
+            for index in flagged:
+                self.file_listbox.selection_set(index)
+            if flagged:
+                self.file_listbox.see(flagged[0])
+            blank = sum(analysis.blank for analysis in analyses)
+            duplicates = sum(analysis.duplicate_of is not None for analysis in analyses)
+            status = f"Found {blank} blank and {duplicates} duplicate page(s)"
+            if flagged:
+                status += "; their files are selected, click Remove to drop them"
+            if partly_flagged:
+                status += (f"; {partly_flagged} multi-page file(s) have some, which "
+                           f"\"Skip blank and duplicate pages\" leaves out")
+            self.status_bar.config(text=status)
+
+        # Decoding every page takes a while for big batches, so keep it off the UI thread
+        Thread(target=check_thread, daemon=True).start()
+
     def rotate_image(self, degrees):
-        """Rotate the selected image by specified degrees."""
+        """Losslessly rotate the selected images clockwise by the given degrees."""
+        import conversion_engine
+        import jpeg_rotate
         selected_indices = self.file_listbox.curselection()
         if not selected_indices:
             messagebox.showinfo("Info", "Please select an image to rotate")
             return
 
-        selected_index = selected_indices[0]
-        selected_file = self.file_paths[selected_index]
-        
-        if not selected_file.lower().endswith(('.jpg', '.jpeg')):
+        selected_files = [self.file_paths[index] for index in selected_indices]
+        jpg_files = [path for path in selected_files if conversion_engine.is_jpg(path)]
+        if not jpg_files:
             messagebox.showinfo("Info", "Only JPG images can be rotated")
             return
-        
-        try:
-            # Open and rotate the image
-            with Image.open(selected_file) as img:
-                rotated_img = img.rotate(degrees, expand=True)
-                # Save the rotated image, overwriting the original
-                rotated_img.save(selected_file, quality=95, optimize=True)
-            
+
+        direction = 'clockwise' if degrees > 0 else 'counter-clockwise'
+        self.status_bar.config(text=f"Rotating {len(jpg_files)} image(s)...")
+
+        def rotate_thread():
+            failures = jpeg_rotate.rotate_many(
+                jpg_files, degrees,
+                progress=lambda done, total: self.master.after(
+                    0, lambda: self.status_bar.config(text=f"Rotating image {done} of {total}...")))
+            self.master.after(0, on_rotated, failures)
+
+        def on_rotated(failures):
             # Update the preview
             self.preview_selected_file()
-            self.status_bar.config(text=f"Image rotated {abs(degrees)}° {'clockwise' if degrees > 0 else 'counter-clockwise'}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to rotate image: {str(e)}")
-            self.status_bar.config(text="Rotation failed")
+            rotated = len(jpg_files) - len(failures)
+            self.status_bar.config(text=f"{rotated} image(s) rotated {abs(degrees)}° {direction}")
+            if failures:
+                details = "\n".join(f"{os.path.basename(path)}: {str(e)}" for path, e in failures[:10])
+                messagebox.showerror("Error", f"Failed to rotate {len(failures)} image(s):\n\n{details}")
+
+        # Rotating many files touches the disk for each one, so keep it off the UI thread
+        Thread(target=rotate_thread, daemon=True).start()
+
+def warm_up(app):
+    """Open the app's caches, then import the modules in WARM_UP_MODULES, ignoring missing ones."""
+    import importlib
+    app.open_caches()
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def on_first_paint(root, app):
+    """Runs once the main window has been drawn."""
+    if startup_profile.enabled():
+        root.update_idletasks()
+        startup_profile.mark("first paint")
+        startup_profile.finish()
+        root.destroy()
+        return
+    Thread(target=warm_up, args=(app,), daemon=True).start()
+
 
 if __name__ == "__main__":
+    # Required for the conversion process pool in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
+    startup_profile.mark("imports done")
     root = ThemedTk(theme="arc")  # Apply a sleek theme
+    startup_profile.mark("themed window created")
     app = ImagePDFConverter(root)
+    startup_profile.mark("widgets created")
+    root.after_idle(on_first_paint, root, app)
     root.mainloop()
     
\ No newline at end of file
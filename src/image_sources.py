@@ -0,0 +1,186 @@
+"""Pages of the image files JPG to PDF reads: JPEG, PNG, WebP and TIFF.
+
+A TIFF can hold many pages (frames), so every page to convert is an
+ImageFrame: a path and a frame index. Frames of one file are read in runs
+(see frame_runs): the file is opened once and ``seek`` steps from frame to
+frame, so only the current frame is ever decoded and the TIFF directory
+chain is not walked from the start of the file for every page. A 1,000-page
+TIFF thus converts with the memory of a few pages.
+
+auto_encoding keeps each source in an encoding that suits it: bilevel
+images (fax, Group 4 and other 1-bit scans) as CCITT Group 4, other
+lossless images as Flate unless they are shrunk a lot, and the rest as
+JPEG.
+"""
+import os
+
+from PIL import Image
+
+from encoders import ENCODING_FLATE, ENCODING_G4, ENCODING_JPEG
+
+# Frames of one file a worker reads in a row (each run reopens the file)
+FRAME_RUN_SIZE = 8
+
+# Lossless sources shown at less than 1/LOSSLESS_MAX_SCALE of their size (per
+# side) are JPEG encoded: resampling smooths them into photo-like images
+LOSSLESS_MAX_SCALE = 2.0
+
+# TIFF compressions that lose detail; any other TIFF is lossless
+LOSSY_TIFF_COMPRESSIONS = {"jpeg", "tiff_jpeg"}
+
+TIFF_STRIP_OFFSETS = 273
+TIFF_STRIP_BYTE_COUNTS = 279
+TIFF_TILE_OFFSETS = 324
+TIFF_TILE_BYTE_COUNTS = 325
+
+# WebP files are RIFF containers; lossless image data is in a VP8L chunk
+RIFF_HEADER_SIZE = 12
+WEBP_LOSSY_CHUNK = b"VP8 "
+WEBP_LOSSLESS_CHUNK = b"VP8L"
+
+# Modes that carry an alpha channel
+ALPHA_MODES = {"RGBA", "LA", "PA"}
+
+
+class ImageFrame:
+    """One page of an image file.
+
+    ``frame`` is its 0-based index and ``frame_count`` the number of frames
+    in the file (1 for everything but multi-page TIFFs).
+    """
+
+    def __init__(self, path, frame=0, frame_count=1):
+        self.path = path
+        self.frame = frame
+        self.frame_count = frame_count
+
+    def __repr__(self):
+        return f"ImageFrame(path={self.path!r}, frame={self.frame}, frame_count={self.frame_count})"
+
+    @property
+    def label(self):
+        """The path, with the page number for pages of multi-page files."""
+        if self.frame_count > 1:
+            return f"{self.path} (page {self.frame + 1})"
+        return self.path
+
+
+def frame_count(path):
+    """Return the number of frames of an image file (only TIFFs have several)."""
+    with Image.open(path) as img:
+        return img.n_frames if img.format == "TIFF" else 1
+
+
+def iter_frames(path, frames):
+    """Yield the opened image of ``path`` positioned at each of ``frames`` in turn.
+
+    It is the same image object every time and only the current frame's
+    pixels are decoded (on load); use each frame before asking for the
+    next. The file is closed when the iteration ends or is closed.
+    """
+    with Image.open(path) as img:
+        for frame in frames:
+            if frame != img.tell():
+                img.seek(frame)
+            yield img
+
+
+def frame_runs(images, run_size=FRAME_RUN_SIZE):
+    """Group ImageFrames into runs of ascending frames of one file, in order.
+
+    Runs hold at most ``run_size`` frames (no limit if None); every
+    single-frame file is a run of its own.
+    """
+    runs = []
+    for image in images:
+        run = runs[-1] if runs else None
+        if (run is not None and run[-1].path == image.path and image.frame > run[-1].frame
+                and (run_size is None or len(run) < run_size)):
+            run.append(image)
+        else:
+            runs.append([image])
+    return runs
+
+
+def _tiff_strips(img):
+    tags = img.tag_v2
+    if TIFF_STRIP_OFFSETS in tags:
+        return list(zip(tags[TIFF_STRIP_OFFSETS], tags.get(TIFF_STRIP_BYTE_COUNTS, ())))
+    return list(zip(tags.get(TIFF_TILE_OFFSETS, ()), tags.get(TIFF_TILE_BYTE_COUNTS, ())))
+
+
+def stored_size(img):
+    """Return the bytes the current frame of an opened TIFF takes in its file."""
+    return sum(count for _, count in _tiff_strips(img))
+
+
+def frame_content(img):
+    """Return bytes identifying the current frame of an opened TIFF.
+
+    They are the frame's tags and its strips or tiles as stored, read
+    without decoding them, so a page can be told apart from any other
+    without hashing the whole file. Call it before the frame is loaded.
+    """
+    parts = [repr(sorted(img.tag_v2.items())).encode()]
+    position = img.fp.tell()
+    try:
+        for offset, count in _tiff_strips(img):
+            img.fp.seek(offset)
+            parts.append(img.fp.read(count))
+    finally:
+        img.fp.seek(position)
+    return b"".join(parts)
+
+
+def _webp_lossless(path):
+    # Chunks follow the RIFF header; simple files start with the image chunk,
+    # extended (VP8X) ones have it after their metadata chunks
+    with open(path, "rb") as f:
+        f.seek(RIFF_HEADER_SIZE)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return False
+            chunk, size = header[:4], int.from_bytes(header[4:], "little")
+            if chunk in (WEBP_LOSSY_CHUNK, WEBP_LOSSLESS_CHUNK):
+                return chunk == WEBP_LOSSLESS_CHUNK
+            # Chunks are padded to an even size
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+
+def is_lossless(img, path):
+    """Return True if an opened image is stored without loss (PNG, most TIFFs, lossless WebP)."""
+    if img.format == "PNG":
+        return True
+    if img.format == "TIFF":
+        return img.info.get("compression") not in LOSSY_TIFF_COMPRESSIONS
+    if img.format == "WEBP":
+        return _webp_lossless(path)
+    return False
+
+
+def auto_encoding(img, path, scale):
+    """Return the page encoding that suits an opened source image.
+
+    ``scale`` is how many source pixels (per side) make one pixel of the
+    page image. Bilevel images become Group 4 at any scale; other lossless
+    images stay lossless (Flate) up to LOSSLESS_MAX_SCALE. Everything else
+    is JPEG.
+    """
+    if img.mode == "1":
+        return ENCODING_G4
+    if scale <= LOSSLESS_MAX_SCALE and is_lossless(img, path):
+        return ENCODING_FLATE
+    return ENCODING_JPEG
+
+
+def has_alpha(img):
+    """Return True if an opened image has transparent parts."""
+    return img.mode in ALPHA_MODES or "transparency" in img.info
+
+
+def on_white(img):
+    """Return an RGB image with the transparent parts of ``img`` filled white, as on paper."""
+    img = img.convert("RGBA")
+    page = Image.new("RGBA", img.size, "white")
+    return Image.alpha_composite(page, img).convert("RGB")
@@ -0,0 +1,121 @@
+"""Per-stage timing and byte counters for the conversion pipeline.
+
+Every page (or, for PDF rasterization, every rendered page chunk) gets a
+PageTrace that records how long each pipeline stage took and how many bytes
+went in and out. Traces are plain data, so they can be filled in a worker
+process and sent back with the page. A ConversionStats object aggregates them
+for a whole job, can write one JSON line per trace, and summarizes where the
+time went.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+
+class PageTrace:
+    """Stage timings (seconds) and byte counters for one page or page chunk."""
+
+    def __init__(self, page=None, path=None):
+        self.page = page
+        self.path = path
+        self.stages = {}
+        self.bytes = {}
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add_bytes(self, name, count):
+        """Add to a named byte counter."""
+        self.bytes[name] = self.bytes.get(name, 0) + count
+
+    @property
+    def total_seconds(self):
+        """Time spent in all stages of this page."""
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        """Return the trace as a JSON-serializable dict."""
+        return {
+            "page": self.page,
+            "path": self.path,
+            "seconds": round(self.total_seconds, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "bytes": dict(self.bytes),
+            **self.info,
+        }
+
+
+class ConversionStats:
+    """Aggregated stage timings and byte counters for a conversion job.
+
+    If ``trace_path`` is given, every added PageTrace is appended to that file
+    as a JSON line.
+    """
+
+    def __init__(self, trace_path=None):
+        self.stages = {}
+        self.bytes = {}
+        self.traces = 0
+        self.trace_path = trace_path
+        self._trace_file = open(trace_path, "a", encoding="utf-8") if trace_path else None
+
+    def add(self, trace):
+        """Fold a PageTrace into the totals (and the trace file)."""
+        self.traces += 1
+        for name, seconds in trace.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, count in trace.bytes.items():
+            self.bytes[name] = self.bytes.get(name, 0) + count
+        if self._trace_file is not None:
+            self._trace_file.write(json.dumps(trace.as_dict()) + "\n")
+
+    def close(self):
+        """Close the trace file, if any."""
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+    @property
+    def total_seconds(self):
+        """Time spent in all stages, summed over pages (and worker processes)."""
+        return sum(self.stages.values())
+
+    def breakdown(self):
+        """Return (stage, seconds, share of total) tuples, slowest stage first."""
+        total = self.total_seconds
+        return [(name, seconds, seconds / total if total else 0.0)
+                for name, seconds in sorted(self.stages.items(), key=lambda item: -item[1])]
+
+    def bottleneck(self):
+        """Return the name of the stage that took the most time, or None."""
+        breakdown = self.breakdown()
+        return breakdown[0][0] if breakdown else None
+
+    def summary(self):
+        """Return a one-line summary such as ``encode 48% (3.1s), resize 22% (1.4s)``."""
+        parts = [f"{name} {share:.0%} ({seconds:.2f}s)" for name, seconds, share in self.breakdown()]
+        return ", ".join(parts) if parts else "no stages recorded"
+
+    def report(self):
+        """Return a multi-line report with every stage and byte counter."""
+        lines = [f"{'stage':<12} {'seconds':>9} {'share':>6}"]
+        for name, seconds, share in self.breakdown():
+            lines.append(f"{name:<12} {seconds:>9.3f} {share:>6.1%}")
+        for name, count in sorted(self.bytes.items()):
+            lines.append(f"{name:<12} {count / (1024 * 1024):>9.2f} MiB")
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """Return the totals as a JSON-serializable dict."""
+        return {
+            "traces": self.traces,
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "bytes": dict(self.bytes),
+        }
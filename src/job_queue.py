@@ -0,0 +1,161 @@
+"""Background job queue for conversions.
+
+Jobs are run one at a time on a worker thread so the caller (usually the Tk
+main loop) stays responsive. Every state change and progress event is passed
+to the ``on_update`` callback from the worker thread; GUI callers should hand
+it over to the main thread with ``master.after``.
+"""
+import itertools
+import queue
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+_job_ids = itertools.count(1)
+
+
+class ConversionJob:
+    """One queued conversion: a snapshot of the inputs and settings to use.
+
+    ``kind`` is "jpg_to_pdf" or "pdf_to_jpg", ``output`` the output PDF path
+    or output directory and ``options`` the keyword arguments passed on to
+    the matching conversion_engine function.
+    """
+
+    def __init__(self, kind, file_paths, output, **options):
+        if kind not in ("jpg_to_pdf", "pdf_to_jpg"):
+            raise ValueError(f"Unknown conversion type: {kind}")
+        self.id = next(_job_ids)
+        self.kind = kind
+        self.file_paths = list(file_paths)
+        self.output = output
+        self.options = options
+        self.status = QUEUED
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def elapsed(self):
+        """Seconds spent running, so far or in total."""
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    @property
+    def wait_time(self):
+        """Seconds spent in the queue before starting."""
+        start = self.started_at if self.started_at is not None else time.time()
+        return start - self.submitted_at
+
+    @property
+    def finished(self):
+        """True once the job is done, failed or cancelled."""
+        return self.status in FINISHED_STATES
+
+    def run(self, on_progress=None):
+        """Run the conversion in the current thread and return its result."""
+        # Imported on first use, so creating the queue does not load the engine
+        import conversion_engine
+
+        def progress(event):
+            if self.cancel_event.is_set():
+                raise conversion_engine.ConversionCancelled("Conversion cancelled")
+            self.progress = event
+            if on_progress is not None:
+                on_progress(event)
+
+        convert = getattr(conversion_engine, self.kind)
+        return convert(self.file_paths, self.output, progress=progress, **self.options)
+
+    def __repr__(self):
+        return f"ConversionJob(#{self.id} {self.kind} {self.status})"
+
+
+class JobQueue:
+    """Run ConversionJobs in submission order on a background thread."""
+
+    def __init__(self, on_update=None):
+        self.on_update = on_update
+        self.jobs = []
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, job):
+        """Queue a job and return it."""
+        with self._lock:
+            self.jobs.append(job)
+        self._pending.put(job)
+        self._notify(job)
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued job, or stop a running one at its next progress step."""
+        with self._lock:
+            job.cancel_event.set()
+            dequeued = job.status == QUEUED
+            if dequeued:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        if dequeued:
+            self._notify(job)
+
+    def cancel_all(self):
+        """Cancel every job that has not finished yet."""
+        for job in self.active_jobs():
+            self.cancel(job)
+
+    def active_jobs(self):
+        """Return the queued and running jobs."""
+        with self._lock:
+            return [job for job in self.jobs if not job.finished]
+
+    def clear_finished(self):
+        """Forget finished jobs."""
+        with self._lock:
+            self.jobs = [job for job in self.jobs if not job.finished]
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            self.on_update(job)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self._notify(job)
+
+    def _run(self):
+        while True:
+            job = self._pending.get()
+            import conversion_engine
+            with self._lock:
+                if job.finished:
+                    # Cancelled while still queued
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+            self._notify(job)
+            try:
+                result = job.run(on_progress=lambda event, job=job: self._notify(job))
+            except conversion_engine.ConversionCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                self._finish(job, FAILED, error=e)
+            else:
+                self._finish(job, DONE, result=result)
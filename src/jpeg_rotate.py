@@ -0,0 +1,203 @@
+"""Lossless rotation of JPEG files in 90 degree steps.
+
+Two strategies are used, neither of which decodes and re-encodes the pixels:
+
+* ``jpegtran`` (from libjpeg) when it is installed and the image has no
+  EXIF orientation yet: the DCT blocks are rotated directly. ``-perfect``
+  makes it refuse images whose size is not a whole number of blocks.
+* Otherwise the EXIF Orientation tag is updated so viewers (and this
+  application's previews and PDF conversion) display the image rotated. The
+  tag is patched in place when present, or an EXIF segment is added.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image
+
+ORIENTATION_TAG = 0x0112
+
+# EXIF orientation after rotating the displayed image 90 degrees clockwise.
+# Plain rotations cycle 1 -> 6 -> 3 -> 8, mirrored ones 2 -> 7 -> 4 -> 5.
+ROTATE_CLOCKWISE = {1: 6, 6: 3, 3: 8, 8: 1, 2: 7, 7: 4, 4: 5, 5: 2}
+
+EXIF_HEADER = b"Exif\x00\x00"
+
+# Exif, GPS and Interop sub-IFD pointers
+EXIF_POINTER_TAGS = (0x8769, 0x8825, 0xA005)
+
+
+class RotationError(Exception):
+    """Raised when a file cannot be rotated losslessly."""
+
+
+def rotated_orientation(orientation, degrees):
+    """Return the EXIF orientation after rotating clockwise by a multiple of 90 degrees."""
+    if degrees % 90:
+        raise RotationError("Only multiples of 90 degrees can be rotated losslessly")
+    for _ in range((degrees // 90) % 4):
+        orientation = ROTATE_CLOCKWISE[orientation]
+    return orientation
+
+
+def _segments(data):
+    """Yield (marker, offset, length) for each JPEG header segment before the scan data."""
+    if data[:2] != b"\xff\xd8":
+        raise RotationError("Not a JPEG file")
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # Start of scan: no more header segments
+            return
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        yield marker, pos, length
+        pos += 2 + length
+
+
+def _find_exif(data):
+    """Return (offset, length) of the EXIF APP1 segment, or None."""
+    for marker, offset, length in _segments(data):
+        if marker == 0xE1 and data[offset + 4:offset + 10] == EXIF_HEADER:
+            return offset, length
+    return None
+
+
+def _patch_orientation(data, exif_offset, orientation):
+    """Overwrite IFD0's Orientation value in place. Returns False if the tag is absent."""
+    tiff = exif_offset + 4 + len(EXIF_HEADER)
+    byteorder = {b"II": "little", b"MM": "big"}.get(bytes(data[tiff:tiff + 2]))
+    if byteorder is None:
+        return False
+
+    ifd0 = tiff + int.from_bytes(data[tiff + 4:tiff + 8], byteorder)
+    count = int.from_bytes(data[ifd0:ifd0 + 2], byteorder)
+    for index in range(count):
+        entry = ifd0 + 2 + index * 12
+        tag = int.from_bytes(data[entry:entry + 2], byteorder)
+        field_type = int.from_bytes(data[entry + 2:entry + 4], byteorder)
+        if tag == ORIENTATION_TAG and field_type == 3:  # SHORT
+            data[entry + 8:entry + 10] = orientation.to_bytes(2, byteorder)
+            return True
+    return False
+
+
+def _write_atomically(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".rotate_", suffix=".jpg", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_orientation(path):
+    """Return the EXIF orientation of a JPEG (1 when missing)."""
+    with Image.open(path) as img:
+        return img.getexif().get(ORIENTATION_TAG, 1)
+
+
+def set_orientation(path, orientation):
+    """Set the EXIF Orientation tag of a JPEG without touching the image data."""
+    with open(path, "rb") as f:
+        data = bytearray(f.read())
+
+    exif = _find_exif(data)
+    if exif is not None and _patch_orientation(data, exif[0], orientation):
+        _write_atomically(path, data)
+        return
+
+    # No tag to patch: rebuild the EXIF block with Pillow and splice it in
+    with Image.open(path) as img:
+        exif_data = img.getexif()
+        # Load the sub-IFDs so they are written back, not just their pointers
+        for pointer_tag in EXIF_POINTER_TAGS:
+            if pointer_tag in exif_data:
+                exif_data.get_ifd(pointer_tag)
+    exif_data[ORIENTATION_TAG] = orientation
+    payload = exif_data.tobytes()
+    if len(payload) + 2 > 0xFFFF:
+        raise RotationError("EXIF data too large to update")
+    segment = b"\xff\xe1" + (len(payload) + 2).to_bytes(2, "big") + payload
+
+    if exif is not None:
+        offset, length = exif
+        data[offset:offset + 2 + length] = segment
+    else:
+        # Keep a JFIF APP0 segment first, as the JFIF spec requires
+        insert_at = 2
+        for marker, offset, length in _segments(data):
+            if marker == 0xE0:
+                insert_at = offset + 2 + length
+            break
+        data[insert_at:insert_at] = segment
+    _write_atomically(path, data)
+
+
+def _jpegtran_rotate(path, degrees):
+    """Rotate the DCT data with jpegtran. Returns False if it cannot do it perfectly."""
+    jpegtran = shutil.which("jpegtran")
+    if jpegtran is None:
+        return False
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".rotate_", suffix=".jpg", dir=directory)
+    os.close(fd)
+    try:
+        completed = subprocess.run(
+            [jpegtran, "-copy", "all", "-perfect", "-rotate", str(degrees),
+             "-outfile", temp_path, path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            return False
+        shutil.copymode(path, temp_path)
+        os.replace(temp_path, path)
+        return True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def rotate_jpeg(path, degrees):
+    """Rotate a JPEG clockwise by a multiple of 90 degrees without re-encoding.
+
+    Negative degrees rotate counter-clockwise. Returns "jpegtran" or "exif"
+    depending on how the rotation was stored.
+    """
+    degrees = degrees % 360
+    orientation = read_orientation(path)
+    new_orientation = rotated_orientation(orientation, degrees)
+    if degrees == 0:
+        return "exif"
+
+    # jpegtran and the EXIF tag only compose simply when there is no orientation yet
+    if orientation == 1 and _jpegtran_rotate(path, degrees):
+        return "jpegtran"
+
+    set_orientation(path, new_orientation)
+    return "exif"
+
+
+def rotate_many(paths, degrees, progress=None):
+    """Rotate several JPEGs. Returns a list of (path, error) for the failures.
+
+    ``progress(done, total)`` is called after each file.
+    """
+    failures = []
+    for index, path in enumerate(paths):
+        try:
+            rotate_jpeg(path, degrees)
+        except Exception as e:
+            failures.append((path, e))
+        if progress is not None:
+            progress(index + 1, len(paths))
+    return failures
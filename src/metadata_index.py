@@ -0,0 +1,239 @@
+"""Persistent on-disk index of file metadata and thumbnails.
+
+Image dimensions, PDF page counts and small thumbnails are stored in an
+SQLite database under the user cache directory, keyed by path, mtime and
+size, so they survive between sessions. The least recently used thumbnails
+are evicted once the stored thumbnail bytes exceed a budget.
+"""
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import conversion_engine
+from preview_cache import render_thumbnail
+
+APP_NAME = "ImagePDFConverter"
+
+# Stored thumbnails fit in this box, which covers the default preview canvas
+THUMBNAIL_SIZE = (400, 400)
+THUMBNAIL_QUALITY = 80
+
+# Default budget for stored thumbnail bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# New entries and access times are committed in groups of this many
+COMMIT_EVERY = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    page_count INTEGER,
+    thumbnail BLOB,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (path, mtime_ns, size)
+);
+CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access);
+"""
+
+TOTAL_BYTES_SQL = "SELECT COALESCE(SUM(LENGTH(thumbnail)), 0) FROM files"
+
+
+def user_cache_dir():
+    """Return the per-user cache directory for this application."""
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, APP_NAME)
+
+
+class FileMetadata:
+    """Indexed facts about one file version."""
+
+    def __init__(self, width, height, page_count, thumbnail):
+        self.width = width
+        self.height = height
+        self.page_count = page_count
+        self.thumbnail = thumbnail
+
+    def thumbnail_image(self):
+        """Decode the stored thumbnail, or return None if there is none."""
+        if self.thumbnail is None:
+            return None
+        image = Image.open(io.BytesIO(self.thumbnail))
+        image.load()
+        return image
+
+
+def compute_metadata(path):
+    """Read dimensions, page count and a thumbnail for an image or PDF."""
+    if conversion_engine.is_pdf(path):
+        page_count = conversion_engine.pdf_page_count(path)
+        thumbnail = render_thumbnail(path, *THUMBNAIL_SIZE)
+        # Dimensions of the first page at the thumbnail's scale are not useful
+        width = height = None
+    else:
+        with Image.open(path) as img:
+            width, height = img.size
+            page_count = getattr(img, 'n_frames', 1)
+        thumbnail = render_thumbnail(path, *THUMBNAIL_SIZE)
+
+    if thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY)
+    return FileMetadata(width, height, page_count, buffer.getvalue())
+
+
+class MetadataIndex:
+    """SQLite-backed metadata and thumbnail store shared across sessions."""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if db_path is None:
+            db_path = os.path.join(user_cache_dir(), "index.sqlite3")
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Commits are frequent and small; a lost tail of a cache is harmless
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Running total of stored thumbnail bytes, so a store does not scan the table
+        self._total = self._conn.execute(TOTAL_BYTES_SQL).fetchone()[0]
+        # Access times of looked up entries, written with the next commit
+        self._touched = {}
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata-index")
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def lookup(self, path):
+        """Return the stored FileMetadata for the file's current version, or None."""
+        key = self._key(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT width, height, page_count, thumbnail FROM files "
+                "WHERE path = ? AND mtime_ns = ? AND size = ?", key).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._commit()
+        return FileMetadata(*row)
+
+    def store(self, path, metadata):
+        """Store metadata for the file's current version, replacing older versions."""
+        key = self._key(path)
+        with self._lock:
+            replaced = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(thumbnail)), 0) FROM files WHERE path = ?",
+                (key[0],)).fetchone()[0]
+            self._conn.execute("DELETE FROM files WHERE path = ?", (key[0],))
+            self._conn.execute(
+                "INSERT INTO files (path, mtime_ns, size, width, height, page_count, thumbnail, "
+                "last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (metadata.width, metadata.height, metadata.page_count,
+                       metadata.thumbnail, time.time()))
+            self._total += len(metadata.thumbnail or b"") - replaced
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._commit()
+            over_budget = self._total > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def get(self, path):
+        """Return metadata for a file, computing and storing it on a miss."""
+        metadata = self.lookup(path)
+        if metadata is None:
+            metadata = compute_metadata(path)
+            self.store(path, metadata)
+        return metadata
+
+    def _commit(self):
+        # Caller holds the lock
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE files SET last_access = ? WHERE path = ? AND mtime_ns = ? AND size = ?",
+                [(last_access,) + key for key, last_access in self._touched.items()])
+            self._touched.clear()
+        self._conn.commit()
+        self._pending = 0
+
+    def flush(self):
+        """Commit stored entries and access times."""
+        with self._lock:
+            self._commit()
+
+    def total_bytes(self):
+        """Return the number of thumbnail bytes currently stored."""
+        with self._lock:
+            return self._total
+
+    def evict(self):
+        """Delete least recently used entries until thumbnails fit the budget."""
+        with self._lock:
+            total = self._total
+            if total <= self.max_bytes:
+                return
+            # Pending access times decide what is least recently used
+            self._commit()
+            # Read in last_access index order, only as far as needed
+            rows = self._conn.execute(
+                "SELECT rowid, COALESCE(LENGTH(thumbnail), 0) FROM files "
+                "ORDER BY last_access")
+            doomed = []
+            for rowid, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((rowid,))
+                total -= size
+            self._conn.executemany("DELETE FROM files WHERE rowid = ?", doomed)
+            self._conn.commit()
+            self._total = total
+
+    def index_in_background(self, paths, on_indexed=None):
+        """Make sure every file is indexed, on a background thread.
+
+        ``on_indexed(path, metadata)`` is called from that thread for each file.
+        """
+        def index_all():
+            try:
+                for path in paths:
+                    try:
+                        metadata = self.get(path)
+                    except Exception:
+                        # Unreadable files are reported when they are previewed or converted
+                        continue
+                    if on_indexed is not None:
+                        on_indexed(path, metadata)
+            finally:
+                # One commit for the batch's remaining entries and access times
+                self.flush()
+
+        return self._executor.submit(index_all)
+
+    def close(self):
+        """Stop background indexing and close the database."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._commit()
+            self._conn.close()
@@ -0,0 +1,222 @@
+"""Blank and duplicate page detection for scanner batches.
+
+Every page is decoded straight to gray at a small size (libjpeg scales JPEGs
+down by up to 8 while decoding, so this costs a fraction of the full decode
+its encode needs) and measured with NumPy:
+
+* ink coverage: the share of pixels clearly darker than the paper, leaving
+  out a border where scanner edges and punch holes show. Pages below the
+  threshold are blank separator sheets; pages without light paper (dark
+  photos, negative scans) count as fully inked;
+* a 1024-bit perceptual hash (pHash: the signs of the page's low spatial
+  frequencies against their median). Pages whose hash differs from an
+  earlier page's in few bits are near-duplicates: double feeds and rescans.
+
+Nothing is decided on file names or sizes, and nothing is re-encoded. Needs
+the optional ``numpy`` package (``pip install numpy``).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from PIL import Image, ImageOps
+
+from image_sources import frame_runs, has_alpha, iter_frames, on_white
+
+NUMPY_HELP = "Blank and duplicate page detection needs NumPy: pip install numpy"
+
+# What to do with flagged pages
+SCREEN_OFF = "off"
+SCREEN_REPORT = "report"
+SCREEN_SKIP = "skip"
+SCREEN_ACTIONS = (SCREEN_OFF, SCREEN_REPORT, SCREEN_SKIP)
+
+# Pages are analyzed at about this many pixels on the long side
+ANALYSIS_SIZE = 512
+
+# Share of each side left out of the ink measurement (punch holes sit within it)
+BORDER_SHARE = 0.08
+# Percentile of the page's gray levels taken as the paper colour, and how
+# much darker than it a pixel must be to count as ink
+PAPER_PERCENTILE = 90
+INK_CONTRAST = 64
+# Pages whose paper level is darker than this have no light paper to find ink
+# on (dark photos, negative scans) and count as fully covered, never blank
+PAPER_MIN_LEVEL = 160
+# Pages with less ink than this share of their area are blank
+BLANK_INK_SHARE = 0.001
+
+# pHash: pages are shrunk to HASH_SAMPLE pixels square and the lowest
+# HASH_SIZE x HASH_SIZE frequencies of their DCT kept, one bit each
+HASH_SAMPLE = 128
+HASH_SIZE = 32
+# Pages whose hashes differ in at most this share of their bits are duplicates
+# (rescans of one sheet differ in about 0.1, different text pages in 0.3 or more)
+DUPLICATE_DISTANCE = 0.2
+
+# Threads decoding pages for analysis
+ANALYSIS_WORKERS = 8
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError(NUMPY_HELP) from e
+    return numpy
+
+
+class PageAnalysis:
+    """Measurements of one page (an ImageFrame) and what they flag it as.
+
+    ``ink`` is the share of the page covered by ink and ``hash`` the packed
+    pHash bits. ``duplicate_of`` is the PageAnalysis of the earlier page this
+    one repeats, or None, and ``distance`` the share of hash bits in which
+    they differ.
+    """
+
+    def __init__(self, image, ink, hash_bits):
+        self.image = image
+        self.path = image.path
+        self.ink = ink
+        self.hash = hash_bits
+        self.blank = False
+        self.duplicate_of = None
+        self.distance = None
+
+    def __repr__(self):
+        original = self.duplicate_of.image.label if self.duplicate_of is not None else None
+        return (f"PageAnalysis(image={self.image.label!r}, ink={self.ink:.4f}, "
+                f"blank={self.blank}, duplicate_of={original!r})")
+
+    @property
+    def flagged(self):
+        """True if the page is blank or a duplicate."""
+        return self.blank or self.duplicate_of is not None
+
+    @property
+    def reason(self):
+        """Why the page is flagged, for reports ("" if it is not)."""
+        if self.blank:
+            return f"blank ({self.ink:.2%} ink)"
+        if self.duplicate_of is not None:
+            return (f"duplicate of {os.path.basename(self.duplicate_of.image.label)} "
+                    f"({self.distance:.0%} different)")
+        return ""
+
+
+def _dct_matrix(size):
+    np = _numpy()
+    samples = np.arange(size)
+    return np.cos(np.pi * (2 * samples + 1) * samples[:, None] / (2 * size))
+
+
+def measure_image(img):
+    """Return (ink share, packed pHash bits) of an opened image."""
+    np = _numpy()
+    # Only has an effect on JPEGs: libjpeg decodes to gray at 1/2 to 1/8 scale
+    img.draft('L', (ANALYSIS_SIZE, ANALYSIS_SIZE))
+    img = ImageOps.exif_transpose(img)
+    # Transparent parts show the white page
+    gray = (on_white(img) if has_alpha(img) else img).convert('L')
+    if max(gray.size) > ANALYSIS_SIZE * 2:
+        gray = gray.reduce(max(gray.size) // ANALYSIS_SIZE)
+
+    pixels = np.asarray(gray)
+    height, width = pixels.shape
+    border_y, border_x = int(height * BORDER_SHARE), int(width * BORDER_SHARE)
+    inner = pixels[border_y:height - border_y, border_x:width - border_x]
+    paper = np.percentile(inner, PAPER_PERCENTILE)
+    if paper < PAPER_MIN_LEVEL:
+        ink = 1.0
+    else:
+        ink = np.count_nonzero(inner < paper - INK_CONTRAST) / inner.size
+
+    sample = np.asarray(gray.resize((HASH_SAMPLE, HASH_SAMPLE), Image.Resampling.BOX),
+                        dtype=np.float64)
+    dct = _dct_matrix(HASH_SAMPLE)[:HASH_SIZE]
+    frequencies = dct @ sample @ dct.T
+    return float(ink), np.packbits(frequencies > np.median(frequencies))
+
+
+def _measure_run(run):
+    with closing(iter_frames(run[0].path, [image.frame for image in run])) as frames:
+        return [measure_image(img) for img in frames]
+
+
+class PageScreen:
+    """Finds blank and duplicate pages and decides which ones to leave out.
+
+    ``blank`` and ``duplicates`` are SCREEN_ACTIONS: off, report (flag the
+    page but keep it) or skip. ``ink_threshold`` is the ink share below
+    which a page is blank and ``duplicate_distance`` the share of differing
+    hash bits up to which two pages are duplicates. Raises ValueError for
+    unknown actions.
+    """
+
+    def __init__(self, blank=SCREEN_SKIP, duplicates=SCREEN_SKIP, ink_threshold=BLANK_INK_SHARE,
+                 duplicate_distance=DUPLICATE_DISTANCE):
+        for action in (blank, duplicates):
+            if action not in SCREEN_ACTIONS:
+                raise ValueError(f"Unknown action for flagged pages: {action}")
+        self.blank = blank
+        self.duplicates = duplicates
+        self.ink_threshold = ink_threshold
+        self.duplicate_distance = duplicate_distance
+
+    def __repr__(self):
+        return (f"PageScreen(blank={self.blank!r}, duplicates={self.duplicates!r}, "
+                f"ink_threshold={self.ink_threshold}, "
+                f"duplicate_distance={self.duplicate_distance})")
+
+    @property
+    def enabled(self):
+        """True if any check is on."""
+        return self.blank != SCREEN_OFF or self.duplicates != SCREEN_OFF
+
+    def analyze(self, images, progress=None):
+        """Measure and flag every ImageFrame; returns one PageAnalysis per image.
+
+        Pages are decoded in parallel (frames of one file in runs, see
+        image_sources.frame_runs), then compared in order: a page is a
+        duplicate of the closest earlier page, if close enough, among those
+        that are neither blank nor duplicates themselves. ``progress(done, total)`` is
+        called as pages are measured and may raise to stop.
+        """
+        np = _numpy()
+        analyses = []
+        executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS)
+        try:
+            runs = frame_runs(images)
+            for run, measures in zip(runs, executor.map(_measure_run, runs)):
+                for image, (ink, hash_bits) in zip(run, measures):
+                    analyses.append(PageAnalysis(image, ink, hash_bits))
+                if progress is not None:
+                    progress(len(analyses), len(images))
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+        # Bits set per byte value, to count differing hash bits a whole table at a time
+        popcount = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+        hash_bits = HASH_SIZE * HASH_SIZE
+        hashes = np.empty((len(analyses), hash_bits // 8), dtype=np.uint8)
+        originals = []
+        for analysis in analyses:
+            if self.blank != SCREEN_OFF and analysis.ink < self.ink_threshold:
+                analysis.blank = True
+                continue
+            if self.duplicates != SCREEN_OFF and originals:
+                differing = popcount[hashes[:len(originals)] ^ analysis.hash].sum(axis=1)
+                closest = int(differing.argmin())
+                if differing[closest] <= self.duplicate_distance * hash_bits:
+                    analysis.duplicate_of = originals[closest]
+                    analysis.distance = differing[closest] / hash_bits
+                    continue
+            hashes[len(originals)] = analysis.hash
+            originals.append(analysis)
+        return analyses
+
+    def skips(self, analysis):
+        """Return True if the page should be left out of the output."""
+        return ((analysis.blank and self.blank == SCREEN_SKIP)
+                or (analysis.duplicate_of is not None and self.duplicates == SCREEN_SKIP))
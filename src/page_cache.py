@@ -0,0 +1,196 @@
+"""Content-addressed cache of encoded PDF pages.
+
+Resampling and re-encoding images is the expensive part of JPG to PDF. This
+cache stores the finished JPEG of each image in an SQLite database, keyed by
+a hash of the source file's bytes plus every setting that affects it, so a
+re-run only processes pages whose source changed; renamed, moved or
+reordered files still hit. The least recently used pages are evicted once
+the stored bytes exceed a budget.
+
+Worker processes only look pages up (through reader()); the process that
+writes the PDF stores new pages and records hits, so there is one writer.
+A conversion that runs in-process looks pages up in the writer's own
+PageCache instead of opening a second connection.
+"""
+import hashlib
+import multiprocessing.util
+import os
+import sqlite3
+import threading
+import time
+
+# Bump when the encoding of pages changes, so old entries stop matching
+CACHE_VERSION = 2
+
+# Default budget for stored page bytes
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# New pages are committed in groups of this many
+COMMIT_EVERY = 32
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    page_width REAL NOT NULL,
+    page_height REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access);
+"""
+
+TOTAL_BYTES_SQL = "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM pages"
+
+# Connections worker processes look pages up with, by database path
+_readers = {}
+
+
+def page_key(image_path, size, dpi, quality, fast_decode, encoder="", content=None):
+    """Return the cache key of a source image encoded at ``size`` with the given settings.
+
+    ``encoder`` describes the page encoding and encoder options. ``content``
+    identifies the source instead of the file's bytes when the file holds
+    several pages (see image_sources.frame_content).
+    """
+    width, height = size
+    digest = hashlib.sha256(
+        f"{CACHE_VERSION}|{width}x{height}|{dpi}|{quality}|{int(bool(fast_decode))}|"
+        f"{encoder}|".encode())
+    if content is not None:
+        digest.update(content)
+        return digest.hexdigest()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_path():
+    """Return the default database path under the user cache directory."""
+    from metadata_index import user_cache_dir
+    return os.path.join(user_cache_dir(), "pages.sqlite3")
+
+
+class CachedPage:
+    """A page read back from the cache."""
+
+    def __init__(self, data, width, height, mode, page_width, page_height):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.page_size = (page_width, page_height)
+
+
+class PageCache:
+    """SQLite-backed store of encoded pages with LRU eviction."""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if db_path is None:
+            db_path = default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # WAL lets worker processes read while this connection writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def lookup(self, key):
+        """Return the CachedPage stored under ``key``, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, width, height, mode, page_width, page_height FROM pages "
+                "WHERE key = ?", (key,)).fetchone()
+        return CachedPage(*row) if row is not None else None
+
+    def store(self, key, data, width, height, mode, page_size):
+        """Store an encoded page. Call flush() when done storing."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, data, width, height, mode, page_width, "
+                "page_height, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, data, width, height, mode, page_size[0], page_size[1], time.time()))
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def touch(self, keys):
+        """Mark pages as recently used."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany("UPDATE pages SET last_access = ? WHERE key = ?",
+                                   [(now, key) for key in keys])
+            self._conn.commit()
+            self._pending = 0
+
+    def flush(self):
+        """Commit stored pages and evict down to the budget."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+        self.evict()
+
+    def total_bytes(self):
+        """Return the number of page bytes currently stored."""
+        with self._lock:
+            return self._conn.execute(TOTAL_BYTES_SQL).fetchone()[0]
+
+    def evict(self):
+        """Delete least recently used pages until the stored bytes fit the budget."""
+        with self._lock:
+            total = self._conn.execute(TOTAL_BYTES_SQL).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(data) FROM pages ORDER BY last_access").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM pages WHERE key = ?", doomed)
+            self._conn.commit()
+
+    def clear(self):
+        """Delete every stored page."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        """Commit and close the database."""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def reader(db_path):
+    """Return a PageCache to look pages up in, opened once per worker process.
+
+    The connection is closed when the worker exits (see close_readers).
+    """
+    cache = _readers.get(db_path)
+    if cache is None:
+        if not _readers:
+            # Pool workers leave through multiprocessing, which skips atexit handlers
+            multiprocessing.util.Finalize(None, close_readers, exitpriority=10)
+        cache = _readers[db_path] = PageCache(db_path)
+    return cache
+
+
+def close_readers():
+    """Close the connections opened by reader() in this process."""
+    while _readers:
+        _, cache = _readers.popitem()
+        cache.close()
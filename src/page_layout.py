@@ -0,0 +1,173 @@
+"""Page sizes and placement of images on PDF pages.
+
+A layout decides, from the pixel sizes of the source images alone, how many
+PDF pages there are, how large each one is, where every image is drawn and
+how many pixels it needs at the target DPI. Images are scaled and positioned
+by the PDF page transform, so the white margins around them are never
+encoded: the page background is white already. Nothing here opens files.
+"""
+
+POINTS_PER_INCH = 72
+
+# How JPG to PDF treats source JPEGs: resample and re-encode every image to the
+# size it is shown at, or embed suitable ones unchanged and let the PDF scale them
+LAYOUT_REENCODE = "reencode"
+LAYOUT_PASSTHROUGH = "passthrough"
+LAYOUTS = (LAYOUT_REENCODE, LAYOUT_PASSTHROUGH)
+
+# Paper sizes in inches, portrait
+PAGE_SIZES = {
+    "a4": (8.27, 11.69),
+    "letter": (8.5, 11.0),
+    "legal": (8.5, 14.0),
+    "a3": (11.69, 16.54),
+}
+
+# Size every page to its image at the target DPI instead of to paper
+PAGE_FIT = "fit"
+PAGE_SIZE_CHOICES = (*PAGE_SIZES, PAGE_FIT)
+
+ORIENTATION_PORTRAIT = "portrait"
+ORIENTATION_LANDSCAPE = "landscape"
+# Per page, whichever orientation shows the images larger
+ORIENTATION_AUTO = "auto"
+ORIENTATIONS = (ORIENTATION_PORTRAIT, ORIENTATION_LANDSCAPE, ORIENTATION_AUTO)
+
+# Images per sheet and their (columns, rows) on a portrait sheet; landscape
+# sheets swap the two
+N_UP_GRIDS = {1: (1, 1), 2: (1, 2), 4: (2, 2), 6: (2, 3), 9: (3, 3)}
+
+# Space around and between images when several share a sheet
+N_UP_MARGIN_IN = 0.25
+
+
+def fit_size(width, height, box_width, box_height):
+    """Return the largest size with the image's aspect ratio that fits the box."""
+    img_aspect = width / height
+    box_aspect = box_width / box_height
+
+    if img_aspect > box_aspect:  # Image is wider than the box
+        return box_width, int(box_width / img_aspect)
+    # Image is taller than the box
+    return int(box_height * img_aspect), box_height
+
+
+class Placement:
+    """Where one image goes: on which page, into which box, at which pixel size.
+
+    ``page_size`` and ``box`` (x, y, width, height) are in points. ``fit_pixels``
+    is the size of the box in pixels at the target DPI and ``pixel_size`` what
+    the image is resampled to: ``fit_pixels``, or the source size if that is
+    smaller, since the page transform enlarges it for free.
+    """
+
+    def __init__(self, page_index, page_size, box, fit_pixels, pixel_size):
+        self.page_index = page_index
+        self.page_size = page_size
+        self.box = box
+        self.fit_pixels = fit_pixels
+        self.pixel_size = pixel_size
+
+    def __repr__(self):
+        return (f"Placement(page_index={self.page_index}, page_size={self.page_size}, "
+                f"box={self.box}, pixel_size={self.pixel_size})")
+
+
+class PlannedPage:
+    """One PDF page and the placements of the images drawn on it, in order."""
+
+    def __init__(self, size, placements):
+        self.size = size
+        self.placements = placements
+
+
+class PageLayout:
+    """Page size, orientation and images per sheet for JPG to PDF.
+
+    Raises ValueError for unknown settings, or for N-up on pages sized to
+    their image.
+    """
+
+    def __init__(self, page_size="a4", orientation=ORIENTATION_PORTRAIT, n_up=1):
+        if page_size not in PAGE_SIZE_CHOICES:
+            raise ValueError(f"Unknown page size: {page_size}")
+        if orientation not in ORIENTATIONS:
+            raise ValueError(f"Unknown orientation: {orientation}")
+        if n_up not in N_UP_GRIDS:
+            raise ValueError(f"Unsupported images per page: {n_up} "
+                             f"(choose from {', '.join(map(str, N_UP_GRIDS))})")
+        if page_size == PAGE_FIT and n_up != 1:
+            raise ValueError("Pages sized to the image hold one image each")
+        self.page_size = page_size
+        self.orientation = orientation
+        self.n_up = n_up
+
+    def __repr__(self):
+        return (f"PageLayout(page_size={self.page_size!r}, orientation={self.orientation!r}, "
+                f"n_up={self.n_up})")
+
+    def plan(self, sizes, dpi):
+        """Lay out images of the given display (width, height) pixel sizes.
+
+        Returns the list of PlannedPage; images keep their order, filling
+        each sheet left to right, top to bottom.
+        """
+        pages = []
+        for first in range(0, len(sizes), self.n_up):
+            group = sizes[first:first + self.n_up]
+            if self.page_size == PAGE_FIT:
+                pages.append(self._fit_page(len(pages), group[0], dpi))
+                continue
+            short_side, long_side = sorted(PAGE_SIZES[self.page_size])
+            portrait = self._sheet(len(pages), (short_side, long_side), group, dpi)
+            if self.orientation == ORIENTATION_PORTRAIT:
+                pages.append(portrait)
+                continue
+            landscape = self._sheet(len(pages), (long_side, short_side), group, dpi)
+            if self.orientation == ORIENTATION_LANDSCAPE or _shown_area(landscape) > _shown_area(portrait):
+                pages.append(landscape)
+            else:
+                pages.append(portrait)
+        return pages
+
+    def placements(self, sizes, dpi):
+        """Return one Placement per image, in input order."""
+        return [placement for page in self.plan(sizes, dpi) for placement in page.placements]
+
+    @staticmethod
+    def _fit_page(page_index, size, dpi):
+        width, height = size
+        page_size = (width * POINTS_PER_INCH / dpi, height * POINTS_PER_INCH / dpi)
+        placement = Placement(page_index, page_size, (0, 0, *page_size), size, size)
+        return PlannedPage(page_size, [placement])
+
+    def _sheet(self, page_index, size_in, group, dpi):
+        page_width, page_height = (side * POINTS_PER_INCH for side in size_in)
+        columns, rows = N_UP_GRIDS[self.n_up]
+        if page_width > page_height:
+            columns, rows = rows, columns
+        margin = N_UP_MARGIN_IN * POINTS_PER_INCH if self.n_up > 1 else 0
+        cell_width = (page_width - margin * (columns + 1)) / columns
+        cell_height = (page_height - margin * (rows + 1)) / rows
+        cell_pixels = (int(cell_width * dpi / POINTS_PER_INCH),
+                       int(cell_height * dpi / POINTS_PER_INCH))
+
+        placements = []
+        for slot, (width, height) in enumerate(group):
+            column, row = slot % columns, slot // columns
+            fit_width, fit_height = fit_size(width, height, *cell_pixels)
+            box_width = fit_width * POINTS_PER_INCH / dpi
+            box_height = fit_height * POINTS_PER_INCH / dpi
+            # PDF y grows upwards, so the first row is the highest
+            cell_x = margin + column * (cell_width + margin)
+            cell_y = page_height - (row + 1) * (cell_height + margin)
+            box = (cell_x + (cell_width - box_width) / 2, cell_y + (cell_height - box_height) / 2,
+                   box_width, box_height)
+            pixel_size = (fit_width, fit_height) if fit_width < width else (width, height)
+            placements.append(Placement(page_index, (page_width, page_height), box,
+                                        (fit_width, fit_height), pixel_size))
+        return PlannedPage((page_width, page_height), placements)
+
+
+def _shown_area(page):
+    return sum(placement.box[2] * placement.box[3] for placement in page.placements)
@@ -0,0 +1,155 @@
+"""Copy embedded JPEGs out of scanned PDFs instead of rendering their pages.
+
+A scanner PDF page is usually one DCT (JPEG) image drawn over the whole
+page, sometimes with an invisible OCR text layer. For such pages the JPEG
+stream is the page: writing it out byte for byte is a file copy instead of a
+poppler render plus a JPEG re-encode, and keeps the original quality.
+Anything else (vector content, visible text, several images, masks, CMYK or
+inverted images, rotated or partial placements) is left to rasterization.
+
+Needs the optional ``pypdf`` package (``pip install pypdf``).
+"""
+PYPDF_HELP = "Extracting images from PDFs needs pypdf: pip install pypdf"
+
+# Content stream operators that neither draw nor change how an image is drawn
+NEUTRAL_OPERATORS = {b"q", b"Q", b"cm", b"Do", b"BT", b"ET", b"Tr", b"Tf", b"Td", b"TD", b"Tm",
+                     b"T*", b"Tc", b"Tw", b"Tz", b"TL", b"Ts", b"BMC", b"BDC", b"EMC", b"MP",
+                     b"DP", b"ri", b"i", b"w", b"J", b"j", b"M", b"d"}
+# Operators that show text; allowed only in the invisible text render mode
+TEXT_SHOW_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+INVISIBLE_TEXT_MODE = 3
+
+# Colour spaces whose JPEG data decodes to the same colours outside the PDF
+PLAIN_COLORSPACES = {"/DeviceRGB", "/DeviceGray"}
+
+# How far (as a share of the page size) the image may miss the page edges
+PAGE_COVER_TOLERANCE = 0.01
+
+JPEG_MAGIC = b"\xff\xd8"
+
+
+def open_pdf(path):
+    """Open a PDF for extraction; raises ImportError with PYPDF_HELP without pypdf.
+
+    Raises ValueError if the file is not a PDF pypdf can read (its page
+    tree is read here, so later page access does not fail on it).
+    """
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError as e:
+        raise ImportError(PYPDF_HELP) from e
+    try:
+        reader = PdfReader(path)
+        len(reader.pages)
+    except PyPdfError as e:
+        raise ValueError(f"Cannot read PDF: {e}") from e
+    return reader
+
+
+def _get(obj, key, default=None):
+    """Look up ``key`` in a PDF dictionary, following indirect references."""
+    value = obj.get(key)
+    return value.get_object() if value is not None else default
+
+
+def _multiply(first, second):
+    """Return the PDF matrix product ``first`` x ``second`` (6-element form)."""
+    a1, b1, c1, d1, e1, f1 = first
+    a2, b2, c2, d2, e2, f2 = second
+    return (a1 * a2 + b1 * c2, a1 * b2 + b1 * d2,
+            c1 * a2 + d1 * c2, c1 * b2 + d1 * d2,
+            e1 * a2 + f1 * c2 + e2, e1 * b2 + f1 * d2 + f2)
+
+
+def _single_image_draw(page):
+    """Return (name, matrix) of the one image drawn on a page, or None.
+
+    The page may contain state changes and invisible text, but nothing else
+    that draws.
+    """
+    from pypdf.generic import ContentStream
+
+    contents = page.get_contents()
+    if contents is None:
+        return None
+    matrix = (1, 0, 0, 1, 0, 0)
+    stack = []
+    text_mode = 0
+    drawn = None
+    for operands, operator in ContentStream(contents, page.pdf).operations:
+        if operator in TEXT_SHOW_OPERATORS:
+            if text_mode != INVISIBLE_TEXT_MODE:
+                return None
+        elif operator not in NEUTRAL_OPERATORS:
+            return None
+        elif operator == b"q":
+            stack.append(matrix)
+        elif operator == b"Q":
+            if not stack:
+                return None
+            matrix = stack.pop()
+        elif operator == b"cm":
+            matrix = _multiply(tuple(float(value) for value in operands), matrix)
+        elif operator == b"Tr":
+            text_mode = int(operands[0])
+        elif operator == b"Do":
+            if drawn is not None:
+                return None
+            drawn = (operands[0], matrix)
+    return drawn
+
+
+def _covers_page(matrix, page):
+    """Return True if the unit square under ``matrix`` fills the page, upright."""
+    a, b, c, d, e, f = matrix
+    if b or c or a <= 0 or d <= 0:
+        return False
+    left, bottom, right, top = (float(value) for value in page.mediabox)
+    tolerance_x = (right - left) * PAGE_COVER_TOLERANCE
+    tolerance_y = (top - bottom) * PAGE_COVER_TOLERANCE
+    return (abs(e - left) <= tolerance_x and abs(e + a - right) <= tolerance_x
+            and abs(f - bottom) <= tolerance_y and abs(f + d - top) <= tolerance_y)
+
+
+def embedded_jpeg(page):
+    """Return the JPEG bytes a page consists of, or None if it must be rendered."""
+    if _get(page, "/Rotate", 0) % 360:
+        return None
+    drawn = _single_image_draw(page)
+    if drawn is None:
+        return None
+    name, matrix = drawn
+    if not _covers_page(matrix, page):
+        return None
+
+    xobjects = _get(_get(page, "/Resources", {}), "/XObject", {})
+    image = _get(xobjects, name)
+    if image is None or _get(image, "/Subtype") != "/Image":
+        return None
+    if "/SMask" in image or "/Mask" in image or "/Decode" in image:
+        return None
+    if _get(image, "/BitsPerComponent") != 8:
+        return None
+    filters = _get(image, "/Filter")
+    if isinstance(filters, list):
+        if len(filters) != 1:
+            return None
+        filters = filters[0].get_object()
+    if filters != "/DCTDecode" or _colorspace(image) not in PLAIN_COLORSPACES:
+        return None
+
+    # DCTDecode data is returned as stored; nothing is decoded here
+    data = image.get_data()
+    return data if data.startswith(JPEG_MAGIC) else None
+
+
+def _colorspace(image):
+    colorspace = _get(image, "/ColorSpace")
+    if isinstance(colorspace, list):
+        colorspace = [item.get_object() for item in colorspace]
+        # Embedded ICC profiles describe RGB or gray data the JPEG decodes to as is
+        if len(colorspace) == 2 and colorspace[0] == "/ICCBased":
+            return {1: "/DeviceGray", 3: "/DeviceRGB"}.get(_get(colorspace[1], "/N"))
+        return None
+    return colorspace
@@ -0,0 +1,185 @@
+"""Copy pages of existing PDFs into a StreamingPDFWriter without rendering them.
+
+A page is copied at the object level: its dictionary, content streams and
+every object they reference (fonts, images, colour spaces...) are written to
+the output as they are, with their object numbers remapped. Stream data is
+never decoded, so a copied page costs about as much as reading its bytes.
+Objects shared by several pages of one source are written once.
+
+Only what hangs off a page comes along; document-level structures (outlines,
+forms, tags) do not, and links to other pages become dead links, since
+following them would drag in the whole source document.
+
+Needs the optional ``pypdf`` package (``pip install pypdf``), see pdf_extract.
+"""
+import io
+import os
+import re
+from collections import deque
+
+from pdf_extract import open_pdf
+
+# A page range suffix on an input path, e.g. "cover.pdf:1-2,5" or "report.pdf:3-"
+PAGE_SPEC = re.compile(r"^(?P<path>.+):(?P<ranges>\d+(?:-\d*)?(?:,\d+(?:-\d*)?)*)$")
+
+# Page keys that point back into the source document's page tree or threads
+SKIPPED_PAGE_KEYS = {"/Type", "/Parent", "/B"}
+
+# References to these become null (except a page's references to itself)
+DOCUMENT_TYPES = {"/Page", "/Pages", "/Catalog"}
+
+
+def split_page_spec(spec):
+    """Split ``path:ranges`` into (path, ranges); ranges is None without a suffix.
+
+    A path that exists as given is never split, so names containing colons
+    (and Windows drive letters) keep working.
+    """
+    match = PAGE_SPEC.match(spec)
+    if match is None or os.path.exists(spec):
+        return spec, None
+    return match.group("path"), match.group("ranges")
+
+
+def parse_page_ranges(ranges, page_count):
+    """Return the 1-based page numbers of ``ranges`` such as ``1-3,7,10-``.
+
+    Pages are returned in the order given, so ``3,1`` reorders; ``None``
+    selects every page. Raises ValueError for pages outside 1..page_count.
+    """
+    if ranges is None:
+        return list(range(1, page_count + 1))
+    pages = []
+    for part in ranges.split(","):
+        first, dash, last = part.partition("-")
+        first = int(first)
+        if not dash:
+            last = first
+        else:
+            last = int(last) if last else page_count
+        if not 1 <= first <= last <= page_count:
+            raise ValueError(f"Page range {part} is outside 1-{page_count}")
+        pages.extend(range(first, last + 1))
+    return pages
+
+
+def format_page_ranges(pages):
+    """Return 1-based page numbers as ranges for parse_page_ranges, e.g. ``1-3,7``."""
+    runs = []
+    for page in pages:
+        if runs and runs[-1][1] == page - 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in runs)
+
+
+class PdfSource:
+    """The pages of one existing PDF to include in a built PDF."""
+
+    def __init__(self, path, ranges=None):
+        self.path = path
+        self.ranges = ranges
+        self.page_numbers = None
+        self.estimated_bytes = 0
+
+    def __repr__(self):
+        return f"PdfSource(path={self.path!r}, ranges={self.ranges!r})"
+
+    @property
+    def spec(self):
+        """The input this source was given as: ``path`` or ``path:ranges``."""
+        return self.path if self.ranges is None else f"{self.path}:{self.ranges}"
+
+    def resolve(self):
+        """Read the page count and select the pages; raises ValueError for bad ranges.
+
+        ``estimated_bytes`` becomes the source's size prorated by the share
+        of its pages selected.
+        """
+        page_count = len(open_pdf(self.path).pages)
+        self.page_numbers = parse_page_ranges(self.ranges, page_count)
+        if page_count:
+            self.estimated_bytes = (os.path.getsize(self.path) * len(self.page_numbers)
+                                    // page_count)
+        return self.page_numbers
+
+
+class PageCopier:
+    """Copy pages of one opened source PDF into a StreamingPDFWriter."""
+
+    def __init__(self, writer, reader):
+        self.writer = writer
+        self.reader = reader
+        # Source (object number, generation) -> output object number
+        self._numbers = {}
+        self._pending = deque()
+
+    def copy_page(self, page_number):
+        """Copy the 1-based page ``page_number`` with everything it references."""
+        from pypdf.generic import StreamObject
+
+        page = self.reader.pages[page_number - 1]
+        page_ref = page.indirect_reference
+        page_obj = self.writer.reserve_object()
+        entries = io.BytesIO()
+        self._write_entries(page, entries, SKIPPED_PAGE_KEYS, page_ref, page_obj)
+
+        # Referenced objects are written right away, so every reserved number is used
+        while self._pending:
+            obj_num, reference = self._pending.popleft()
+            target = reference.get_object()
+            body = io.BytesIO()
+            if isinstance(target, StreamObject):
+                body.write(b"<< ")
+                self._write_entries(target, body, {"/Length"}, page_ref, page_obj)
+                # The stream as stored, still encoded (get_data() would decode it)
+                data = target._data
+                body.write(f"/Length {len(data)} >>".encode("ascii"))
+                self.writer.write_raw_object(obj_num, body.getvalue(), data)
+            else:
+                self._serialize(target, body, page_ref, page_obj)
+                self.writer.write_raw_object(obj_num, body.getvalue())
+
+        self.writer.add_raw_page(page_obj, entries.getvalue())
+
+    def _write_entries(self, dictionary, out, skipped, page_ref, page_obj):
+        for key, value in dictionary.items():
+            if key in skipped:
+                continue
+            key.write_to_stream(out)
+            out.write(b" ")
+            self._serialize(value, out, page_ref, page_obj)
+            out.write(b" ")
+
+    def _serialize(self, obj, out, page_ref, page_obj):
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+        if isinstance(obj, IndirectObject):
+            target = obj.get_object()
+            if isinstance(target, DictionaryObject) and target.get("/Type") in DOCUMENT_TYPES:
+                is_self = (page_ref is not None and obj.idnum == page_ref.idnum
+                           and obj.generation == page_ref.generation)
+                out.write(f"{page_obj} 0 R".encode("ascii") if is_self else b"null")
+                return
+            key = (obj.idnum, obj.generation)
+            obj_num = self._numbers.get(key)
+            if obj_num is None:
+                obj_num = self._numbers[key] = self.writer.reserve_object()
+                self._pending.append((obj_num, obj))
+            out.write(f"{obj_num} 0 R".encode("ascii"))
+        elif isinstance(obj, DictionaryObject):
+            out.write(b"<< ")
+            self._write_entries(obj, out, (), page_ref, page_obj)
+            out.write(b">>")
+        elif isinstance(obj, ArrayObject):
+            out.write(b"[")
+            for index, value in enumerate(obj):
+                if index:
+                    out.write(b" ")
+                self._serialize(value, out, page_ref, page_obj)
+            out.write(b"]")
+        elif obj is None:
+            out.write(b"null")
+        else:
+            obj.write_to_stream(out)
@@ -0,0 +1,190 @@
+"""Incremental PDF writer that streams image pages straight to disk.
+
+Each page's image XObject, content stream and page object are written as soon
+as the page is added, and only the byte offsets needed for the xref table are
+kept in memory. Peak memory is therefore bounded by a single encoded page no
+matter how long the document is.
+"""
+
+# Object numbers reserved for the document catalog and the page tree, which
+# can only be written once every page is known.
+CATALOG_OBJ = 1
+PAGES_OBJ = 2
+
+COLORSPACES = {
+    '1': '/DeviceGray',
+    'L': '/DeviceGray',
+    'RGB': '/DeviceRGB',
+    'CMYK': '/DeviceCMYK',
+}
+
+# PDF filters of the image stream encodings (see encoders.PAGE_ENCODINGS)
+FILTERS = {
+    'jpeg': '/DCTDecode',
+    'flate': '/FlateDecode',
+    'g4': '/CCITTFaxDecode',
+}
+
+
+def _format_number(value):
+    """Format a number the way PDF expects (no exponent, no trailing zeros)."""
+    if isinstance(value, int):
+        return str(value)
+    text = f"{value:.4f}".rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+
+class StreamingPDFWriter:
+    """Write a PDF page by page to a binary file object."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.offsets = {}
+        self.page_refs = []
+        self.next_obj = PAGES_OBJ + 1
+        self.position = 0
+        self.closed = False
+        # The binary comment marks the file as binary for transfer tools
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def _write(self, data):
+        self.fileobj.write(data)
+        self.position += len(data)
+
+    def _allocate(self):
+        obj_num = self.next_obj
+        self.next_obj += 1
+        return obj_num
+
+    def _write_object(self, obj_num, body, stream=None):
+        """Write one indirect object, optionally followed by a stream."""
+        self.offsets[obj_num] = self.position
+        self._write(f"{obj_num} 0 obj\n".encode('ascii'))
+        self._write(body if isinstance(body, bytes) else body.encode('ascii'))
+        if stream is not None:
+            self._write(b"\nstream\n")
+            self._write(stream)
+            self._write(b"\nendstream")
+        self._write(b"\nendobj\n")
+
+    def add_jpeg_page(self, data, width, height, page_size, image_box=None, mode='RGB'):
+        """Add a page showing an encoded JPEG.
+
+        ``width``/``height`` are the JPEG's pixel size and ``mode`` its PIL mode
+        (L, RGB or CMYK). ``page_size`` is the (width, height) of the page in
+        points. The image fills the page unless ``image_box`` gives the
+        (x, y, width, height) rectangle in points to draw it into; scaling and
+        positioning happen in the page transform, so the JPEG bytes are
+        embedded unchanged.
+        """
+        self.add_page(page_size, [(data, width, height, mode, image_box, 'jpeg')])
+
+    def add_page(self, page_size, images):
+        """Add a page showing several encoded images, e.g. an N-up sheet.
+
+        ``images`` are (data, width, height, mode, image_box, encoding) tuples,
+        drawn in order. ``encoding`` is a key of FILTERS: JPEG data as for
+        add_jpeg_page, zlib-compressed raw pixels (flate), or CCITT Group 4
+        data (g4, mode 1, black coded as 1). Bilevel raw pixels are packed
+        eight to a byte, 1 being white. Uncovered parts of the page stay white.
+        """
+        if self.closed:
+            raise ValueError("Cannot add pages to a closed PDF")
+        for image in images:
+            mode, encoding = image[3], image[5]
+            if encoding not in FILTERS:
+                raise ValueError(f"Unsupported image encoding for PDF embedding: {encoding}")
+            if (mode not in COLORSPACES or (encoding == 'g4' and mode != '1')
+                    or (encoding == 'jpeg' and mode == '1')):
+                raise ValueError(f"Unsupported {encoding} image mode for PDF embedding: {mode}")
+
+        page_width, page_height = page_size
+        resources = []
+        commands = []
+        for index, (data, width, height, mode, image_box, encoding) in enumerate(images):
+            if image_box is None:
+                image_box = (0, 0, page_width, page_height)
+            box_x, box_y, box_width, box_height = (_format_number(value) for value in image_box)
+
+            image_obj = self._allocate()
+            extra = ""
+            if mode == 'CMYK':
+                extra = " /Decode [1 0 1 0 1 0 1 0]"
+            elif encoding == 'g4':
+                extra = (f" /DecodeParms << /K -1 /Columns {width} /Rows {height} "
+                         f"/BlackIs1 true >>")
+            self._write_object(
+                image_obj,
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace {COLORSPACES[mode]} /BitsPerComponent {1 if mode == '1' else 8} "
+                f"/Filter {FILTERS[encoding]}{extra} /Length {len(data)} >>",
+                data)
+            resources.append(f"/Im{index} {image_obj} 0 R")
+            commands.append(f"q {box_width} 0 0 {box_height} {box_x} {box_y} cm /Im{index} Do Q")
+
+        content = " ".join(commands).encode('ascii')
+        content_obj = self._allocate()
+        self._write_object(content_obj, f"<< /Length {len(content)} >>", content)
+
+        page_obj = self._allocate()
+        self._write_object(
+            page_obj,
+            f"<< /Type /Page /Parent {PAGES_OBJ} 0 R "
+            f"/MediaBox [0 0 {_format_number(page_width)} {_format_number(page_height)}] "
+            f"/Resources << /XObject << {' '.join(resources)} >> >> "
+            f"/Contents {content_obj} 0 R >>")
+        self.page_refs.append(page_obj)
+
+    def reserve_object(self):
+        """Return a new object number; it must be written before close()."""
+        return self._allocate()
+
+    def write_raw_object(self, obj_num, body, stream=None):
+        """Write a reserved object from its serialized ``body`` (bytes).
+
+        With ``stream``, ``body`` is the stream dictionary, /Length included.
+        Used to copy objects of other PDFs (see pdf_merge).
+        """
+        if self.closed:
+            raise ValueError("Cannot add objects to a closed PDF")
+        self._write_object(obj_num, body, stream)
+
+    def add_raw_page(self, obj_num, entries):
+        """Add a page whose dictionary entries (bytes) were serialized elsewhere.
+
+        ``entries`` must not contain /Type or /Parent; objects they refer to
+        are written with write_raw_object.
+        """
+        if self.closed:
+            raise ValueError("Cannot add pages to a closed PDF")
+        self._write_object(obj_num, b"<< /Type /Page /Parent %d 0 R " % PAGES_OBJ + entries + b">>")
+        self.page_refs.append(obj_num)
+
+    def close(self):
+        """Write the page tree, catalog, xref table and trailer."""
+        if self.closed:
+            return
+        if not self.page_refs:
+            raise ValueError("A PDF needs at least one page")
+
+        kids = " ".join(f"{ref} 0 R" for ref in self.page_refs)
+        self._write_object(PAGES_OBJ,
+                           f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_refs)} >>")
+        self._write_object(CATALOG_OBJ, f"<< /Type /Catalog /Pages {PAGES_OBJ} 0 R >>")
+
+        xref_offset = self.position
+        size = self.next_obj
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_num in range(1, size):
+            lines.append(f"{self.offsets[obj_num]:010d} 00000 n \n")
+        self._write("".join(lines).encode('ascii'))
+        self._write(f"trailer\n<< /Size {size} /Root {CATALOG_OBJ} 0 R >>\n"
+                    f"startxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+        self.closed = True
@@ -0,0 +1,143 @@
+"""In-memory LRU cache of preview thumbnails.
+
+Thumbnails are keyed by (path, mtime, size, width, height), so a file that
+changes on disk (for example after a rotation) or a resized preview canvas
+simply misses the cache. Neighbouring files can be rendered ahead of time on
+a background thread. When a persistent MetadataIndex is supplied, its stored
+thumbnails are used on a miss so previews are fast from a cold start.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+import conversion_engine
+
+# Default memory budget for cached thumbnails
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(path, width, height):
+    """Return the cache key for a file previewed in a width x height box."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, width, height)
+
+
+def render_thumbnail(path, width, height):
+    """Render a thumbnail of an image or of a PDF's first page fitting width x height."""
+    if conversion_engine.is_pdf(path):
+        from pdf2image import convert_from_path
+        # Render at the canvas height instead of poppler's default 200 DPI
+        image = convert_from_path(path, first_page=1, last_page=1, size=(None, height))[0]
+    else:
+        with Image.open(path) as img:
+            # Let libjpeg decode at a reduced scale close to the preview size
+            img.draft(img.mode, (width, height))
+            # Show rotations stored in the EXIF Orientation tag
+            image = ImageOps.exif_transpose(img)
+    image.thumbnail((width, height))
+    return image
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class PreviewCache:
+    """Size-bounded LRU cache of thumbnails with background prefetching."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, prefetch_workers=1, index=None):
+        self.max_bytes = max_bytes
+        self.index = index
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers,
+                                            thread_name_prefix="preview-prefetch")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached thumbnail for a key, or None."""
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """Store a thumbnail, evicting least recently used ones to stay in budget."""
+        size = _image_bytes(image)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= _image_bytes(old)
+            self._entries[key] = image
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= _image_bytes(evicted)
+
+    def clear(self):
+        """Drop every cached thumbnail."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def thumbnail(self, path, width, height):
+        """Return the thumbnail for a file, rendering and caching it on a miss."""
+        key = cache_key(path, width, height)
+        image = self.get(key)
+        if image is None:
+            image = self._render(path, width, height)
+            self.put(key, image)
+        return image
+
+    def _render(self, path, width, height):
+        if self.index is not None:
+            from metadata_index import THUMBNAIL_SIZE
+            # Stored thumbnails are only good enough for boxes they cover
+            if width <= THUMBNAIL_SIZE[0] and height <= THUMBNAIL_SIZE[1]:
+                image = self.index.get(path).thumbnail_image()
+                if image is not None:
+                    image.thumbnail((width, height))
+                    return image
+        return render_thumbnail(path, width, height)
+
+    def prefetch(self, paths, width, height):
+        """Render thumbnails for the given files in the background."""
+        for path in paths:
+            try:
+                key = cache_key(path, width, height)
+            except OSError:
+                continue
+            with self._lock:
+                if key in self._entries or key in self._in_flight:
+                    continue
+                self._in_flight.add(key)
+            self._executor.submit(self._prefetch_one, key, path, width, height)
+
+    def _prefetch_one(self, key, path, width, height):
+        try:
+            self.put(key, self._render(path, width, height))
+        except Exception:
+            # Prefetching is best effort; errors surface when the file is selected
+            pass
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def shutdown(self):
+        """Stop the prefetch thread, dropping pending prefetches."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
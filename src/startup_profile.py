@@ -0,0 +1,119 @@
+"""Startup time measurement for the desktop application.
+
+Launching the app with ``--startup-profile`` times every import made on the
+main thread (self time, nested imports excluded) and marks the main
+milestones up to the first paint of the window. The report is then printed
+(or, in windowed builds without a console, written to a file in the temp
+directory) and the app exits:
+
+    python src/image_pdf_converter.py --startup-profile
+    ImagePDFConverter.exe --startup-profile
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+
+FLAG = "--startup-profile"
+REPORT_FILE = "ImagePDFConverter-startup.txt"
+
+_profile = None
+
+
+class StartupProfile:
+    """Import timings and named milestones since the profile was enabled."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = {}
+        self.marks = []
+        self._stack = []
+        self._original_import = None
+        self._main_thread = threading.main_thread()
+
+    def install(self):
+        """Start timing imports."""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        """Stop timing imports."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        # Relative imports, already loaded modules and background threads are not timed
+        if (level or name in sys.modules
+                or threading.current_thread() is not self._main_thread):
+            return original(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            # Submodules pulled in by "from package import module" count towards this line
+            key = f"{name} ({', '.join(fromlist)})" if fromlist else name
+            self.imports[key] = self.imports.get(key, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def mark(self, label):
+        """Record a milestone at the current time."""
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def report(self, top=20):
+        """Return the milestones and the slowest imports as text."""
+        lines = ["Milestones (seconds since start):"]
+        for label, seconds in self.marks:
+            lines.append(f"  {seconds:8.3f}  {label}")
+        total = sum(self.imports.values())
+        lines.append(f"Imports: {len(self.imports)} statements, {total:.3f}s "
+                     f"(slowest {min(top, len(self.imports))}, self time):")
+        for name, seconds in sorted(self.imports.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {seconds:8.3f}  {name}")
+        return "\n".join(lines)
+
+
+def enabled():
+    """Return True if startup profiling is on."""
+    return _profile is not None
+
+
+def enable():
+    """Start profiling; called before the application's imports."""
+    global _profile
+    if _profile is None:
+        _profile = StartupProfile()
+        _profile.install()
+    return _profile
+
+
+def mark(label):
+    """Record a milestone if profiling is on."""
+    if _profile is not None:
+        _profile.mark(label)
+
+
+def finish():
+    """Stop profiling and output the report. Returns where it went."""
+    global _profile
+    if _profile is None:
+        return None
+    _profile.uninstall()
+    report = _profile.report()
+    _profile = None
+    if sys.stdout is not None:
+        print(report)
+        return "stdout"
+    # Windowed builds have no console to print to
+    import tempfile
+    path = os.path.join(tempfile.gettempdir(), REPORT_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(report + "\n")
+    return path
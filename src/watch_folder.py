@@ -0,0 +1,413 @@
+"""Headless watch-folder mode: convert files as they are dropped into a folder.
+
+    python -m watch_folder INPUT_DIR OUTPUT_DIR --mode jpg2pdf --group subfolder
+
+The input folder is rescanned whenever watchdog (if it is installed; it uses
+inotify on Linux) reports a change, and every ``--poll-interval`` seconds
+otherwise. Files are grouped into jobs by one of GROUP_RULES, and a group is
+converted once none of its files changed for ``--idle-timeout`` seconds, so
+files still being copied in are left alone. Converted inputs are moved to
+``.done`` inside the input folder (failed ones to ``.failed``) so they are
+not picked up again. Jobs run on a bounded pool; when it is full, ready
+groups stay in the folder until a slot frees up. PDFs are written to a
+temporary file and renamed into place, so consumers never see partial
+output.
+"""
+import argparse
+import logging
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import conversion_engine
+from file_scanner import natural_sort_key
+
+logger = logging.getLogger("watch_folder")
+
+# Conversion modes and the input file types each one takes
+MODES = {"jpg2pdf": (*conversion_engine.IMAGE_TYPES, "pdf"), "pdf2jpg": ("pdf",)}
+
+# Command line options that only jpg2pdf takes
+JPG2PDF_OPTIONS = ("layout", "page_size", "orientation", "n_up", "encoding")
+
+# How files are grouped into jobs: one job per folder (files directly in the
+# input folder form their own job), everything that arrived until the input
+# folder went quiet, or one job per file
+GROUP_SUBFOLDER = "subfolder"
+GROUP_IDLE = "idle"
+GROUP_FILE = "file"
+GROUP_RULES = (GROUP_SUBFOLDER, GROUP_IDLE, GROUP_FILE)
+
+DONE_DIR = ".done"
+FAILED_DIR = ".failed"
+
+# With watchdog, rescan at least this often anyway in case an event was missed
+MAX_EVENT_WAIT = 60.0
+
+
+def _relative_key(rule, relative_path):
+    """Return the group a file belongs to under a grouping rule."""
+    if rule == GROUP_SUBFOLDER:
+        return os.path.dirname(relative_path)
+    if rule == GROUP_FILE:
+        return relative_path
+    return ""
+
+
+class FolderWatcher:
+    """Watch ``input_dir`` and convert groups of settled files into ``output_dir``.
+
+    ``options`` are passed to conversion_engine.jpg_to_pdf or pdf_to_jpg
+    (e.g. dpi, quality, layout). At most ``jobs`` groups are converted at
+    once and ``queue_size`` more may wait for a worker.
+    """
+
+    def __init__(self, input_dir, output_dir, mode="jpg2pdf", group=GROUP_SUBFOLDER,
+                 idle_timeout=10.0, jobs=2, queue_size=2, poll_interval=2.0, options=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        if group not in GROUP_RULES:
+            raise ValueError(f"Unknown grouping rule: {group}")
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.mode = mode
+        self.group = group
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.options = dict(options or {})
+        # Share the cores between concurrent jobs instead of oversubscribing them
+        self.options.setdefault("workers", max(1, conversion_engine.default_workers() // jobs))
+        self.converted = 0
+        self.failed = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="watch-job")
+        self._slots = threading.BoundedSemaphore(jobs + queue_size)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._seen = {}
+        self._in_flight = set()
+        self._reserved = set()
+        self._next_deadline = None
+
+    def scan(self):
+        """Return {relative path: (size, mtime_ns)} of the files waiting in the input folder."""
+        files = {}
+        pending_dirs = [self.input_dir]
+        while pending_dirs:
+            directory = pending_dirs.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        # Skips .done/.failed and temporary files written by copy tools
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                relative = os.path.relpath(entry.path, self.input_dir)
+                                files[relative] = (stat.st_size, stat.st_mtime_ns)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return files
+
+    def ready_groups(self, files, now):
+        """Return (group key, relative paths) for groups that have been idle long enough."""
+        seen = {}
+        for relative, signature in files.items():
+            previous = self._seen.get(relative)
+            changed_at = previous[1] if previous and previous[0] == signature else now
+            seen[relative] = (signature, changed_at)
+        self._seen = seen
+
+        groups = {}
+        for relative, (_, changed_at) in seen.items():
+            key = _relative_key(self.group, relative)
+            paths, last_change = groups.get(key, ([], 0.0))
+            paths.append(relative)
+            groups[key] = (paths, max(last_change, changed_at))
+
+        ready = []
+        self._next_deadline = None
+        with self._lock:
+            in_flight = set(self._in_flight)
+        for key, (paths, last_change) in sorted(groups.items()):
+            if in_flight.intersection(paths):
+                continue
+            deadline = last_change + self.idle_timeout
+            if deadline <= now:
+                ready.append((key, sorted(paths, key=natural_sort_key)))
+            elif self._next_deadline is None or deadline < self._next_deadline:
+                self._next_deadline = deadline
+        return ready
+
+    def poll_once(self):
+        """Scan the input folder and submit the groups that are ready.
+
+        Returns the number of files still waiting in the input folder.
+        """
+        files = self.scan()
+        for key, paths in self.ready_groups(files, time.monotonic()):
+            # Backpressure: leave the group in the folder until a slot is free
+            if not self._slots.acquire(blocking=False):
+                break
+            with self._lock:
+                self._in_flight.update(paths)
+            self._executor.submit(self._run_job, key, paths)
+        return len(files)
+
+    def _output_name(self, key, paths):
+        if self.group == GROUP_FILE:
+            return os.path.splitext(os.path.basename(key))[0]
+        if key:
+            return key.replace(os.sep, "_")
+        return time.strftime("batch_%Y%m%d_%H%M%S")
+
+    def _unique_path(self, path):
+        """Reserve ``path``, or ``path`` with a counter, that no file or running job uses.
+
+        Call _release() once the file has been created.
+        """
+        base, extension = os.path.splitext(path)
+        counter = 2
+        with self._lock:
+            while os.path.exists(path) or path in self._reserved:
+                path = f"{base}_{counter}{extension}"
+                counter += 1
+            self._reserved.add(path)
+        return path
+
+    def _release(self, path):
+        with self._lock:
+            self._reserved.discard(path)
+
+    def _run_job(self, key, relative_paths):
+        try:
+            paths = [os.path.join(self.input_dir, relative) for relative in relative_paths]
+            file_types = MODES[self.mode]
+            supported = [path for path in paths
+                         if conversion_engine.sniff_file_type(path) in file_types]
+            unsupported = [path for path in paths if path not in supported]
+            if unsupported:
+                logger.warning("Skipping %d file(s) that are not %s: %s", len(unsupported),
+                               "/".join(file_types).upper(), ", ".join(unsupported))
+                self._move(unsupported, FAILED_DIR)
+            if not supported:
+                return
+
+            name = self._output_name(key, relative_paths)
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                if self.mode == "jpg2pdf":
+                    output = self._unique_path(os.path.join(self.output_dir, f"{name}.pdf"))
+                    try:
+                        result = conversion_engine.jpg_to_pdf(supported, output, **self.options)
+                    finally:
+                        self._release(output)
+                else:
+                    output = os.path.join(self.output_dir, name) if key else self.output_dir
+                    os.makedirs(output, exist_ok=True)
+                    result = conversion_engine.pdf_to_jpg(supported, output, **self.options)
+            except Exception as e:
+                logger.error("Job %r failed: %s", name, e)
+                with self._lock:
+                    self.failed += 1
+                self._move(supported, FAILED_DIR)
+                return
+
+            logger.info("Converted %d file(s) to %s: %d page(s) in %.1fs", len(supported), output,
+                        result.pages, result.elapsed)
+            for analysis in result.flagged:
+                logger.warning("%s: %s", analysis.image.label, analysis.reason)
+            with self._lock:
+                self.converted += 1
+            self._move(supported, DONE_DIR)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(relative_paths)
+            self._slots.release()
+            self._wake.set()
+
+    def _move(self, paths, target_dir):
+        """Move inputs under ``target_dir`` in the input folder, keeping their relative paths."""
+        for path in paths:
+            relative = os.path.relpath(path, self.input_dir)
+            destination = self._unique_path(os.path.join(self.input_dir, target_dir, relative))
+            try:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.move(path, destination)
+            except OSError as e:
+                logger.error("Could not move %s to %s: %s", path, target_dir, e)
+                continue
+            finally:
+                self._release(destination)
+            # Drop subfolders the scanner created once they are empty
+            directory = os.path.dirname(path)
+            while directory != self.input_dir:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        wake = self._wake
+
+        class WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        observer.schedule(WakeHandler(), self.input_dir, recursive=True)
+        observer.start()
+        return observer
+
+    def run(self, once=False):
+        """Watch until stop() is called, or with ``once`` until the input folder is empty."""
+        os.makedirs(self.input_dir, exist_ok=True)
+        observer = self._start_observer()
+        logger.info("Watching %s (%s, %s) -> %s", self.input_dir,
+                    "file system events" if observer else f"polling every {self.poll_interval}s",
+                    self.group, self.output_dir)
+        try:
+            while not self._stop.is_set():
+                waiting = self.poll_once()
+                with self._lock:
+                    busy = bool(self._in_flight)
+                if once and not waiting and not busy:
+                    break
+
+                if observer is None:
+                    timeout = self.poll_interval
+                else:
+                    timeout = MAX_EVENT_WAIT
+                if self._next_deadline is not None:
+                    timeout = min(timeout, max(0.0, self._next_deadline - time.monotonic()))
+                self._wake.wait(timeout)
+                self._wake.clear()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            # Let running conversions finish so no input is left half processed
+            self._executor.shutdown(wait=True)
+
+    def stop(self):
+        """Ask run() to return after the running jobs finish."""
+        self._stop.set()
+        self._wake.set()
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog="watch_folder",
+                                     description="Convert files dropped into a folder.")
+    parser.add_argument("input_dir", help="Folder to watch")
+    parser.add_argument("output_dir", help="Folder for the converted files")
+    parser.add_argument("--mode", choices=sorted(MODES), default="jpg2pdf",
+                        help="Conversion to run (default: jpg2pdf)")
+    parser.add_argument("--group", choices=GROUP_RULES, default=GROUP_SUBFOLDER,
+                        help="subfolder: one job per folder; idle: everything that arrived until "
+                             "the folder went quiet; file: one job per file (default: subfolder)")
+    parser.add_argument("--idle-timeout", type=float, default=10.0,
+                        help="Seconds a group must stay unchanged before it is converted (default: 10)")
+    parser.add_argument("--jobs", type=int, default=2, help="Groups converted at once (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="Ready groups allowed to wait for a worker (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between scans when watchdog is not installed (default: 2)")
+    parser.add_argument("--once", action="store_true",
+                        help="Exit once everything in the input folder has been converted")
+    parser.add_argument("--dpi", type=int, default=None, help="Target or rendering DPI")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality 1-100 (default: 85)")
+    parser.add_argument("--layout", choices=conversion_engine.LAYOUTS, default=None,
+                        help="How jpg2pdf treats source JPEGs (default: reencode)")
+    parser.add_argument("--page-size", choices=conversion_engine.PAGE_SIZE_CHOICES, default=None,
+                        help="Paper size for jpg2pdf, or fit to size pages to their image "
+                             "(default: a4)")
+    parser.add_argument("--orientation", choices=conversion_engine.ORIENTATIONS, default=None,
+                        help="Page orientation for jpg2pdf (default: portrait)")
+    parser.add_argument("--n-up", type=int, choices=sorted(conversion_engine.N_UP_GRIDS),
+                        default=None, help="Images per page for jpg2pdf (default: 1)")
+    parser.add_argument("--encoding", choices=conversion_engine.ENCODING_CHOICES, default=None,
+                        help="Page image encoding for jpg2pdf (default: auto)")
+    parser.add_argument("--blank", choices=conversion_engine.SCREEN_ACTIONS, default=None,
+                        help="jpg2pdf: report or skip blank pages; needs numpy (default: off)")
+    parser.add_argument("--duplicates", choices=conversion_engine.SCREEN_ACTIONS, default=None,
+                        help="jpg2pdf: report or skip duplicate scans; needs numpy (default: off)")
+    parser.add_argument("--format", choices=conversion_engine.IMAGE_FORMATS, default=None,
+                        help="Output image format for pdf2jpg (default: jpeg)")
+    parser.add_argument("--extract", action="store_true",
+                        help="pdf2jpg: copy out pages that are a single embedded JPEG instead "
+                             "of rendering them; needs pypdf")
+    parser.add_argument("--preset", choices=conversion_engine.PRESETS, default=None,
+                        help="Encoder speed versus size (default: balanced)")
+    parser.add_argument("--color", choices=conversion_engine.COLOR_MODES, default=None,
+                        help="color, gray or bilevel output (default: color)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes per job (default: CPU cores divided by --jobs)")
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    options = {"quality": args.quality}
+    for name in ("dpi", "workers") + JPG2PDF_OPTIONS:
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    if args.format is not None:
+        options["image_format"] = args.format
+    if args.extract:
+        options["extract"] = True
+    if args.preset is not None or args.color is not None:
+        options["encoder_options"] = conversion_engine.EncoderOptions(
+            args.preset or conversion_engine.PRESET_BALANCED,
+            args.color or conversion_engine.COLOR_COLOR)
+    if args.blank is not None or args.duplicates is not None:
+        options["screen"] = conversion_engine.PageScreen(
+            args.blank or conversion_engine.SCREEN_OFF,
+            args.duplicates or conversion_engine.SCREEN_OFF)
+    if args.mode == "pdf2jpg":
+        for name in JPG2PDF_OPTIONS + ("blank", "duplicates"):
+            if getattr(args, name) is not None:
+                print(f"Error: --{name.replace('_', '-')} only applies to jpg2pdf", file=sys.stderr)
+                return 2
+    elif args.format is not None or args.extract:
+        flag = "--format" if args.format is not None else "--extract"
+        print(f"Error: {flag} only applies to pdf2jpg", file=sys.stderr)
+        return 2
+
+    watcher = FolderWatcher(args.input_dir, args.output_dir, mode=args.mode, group=args.group,
+                            idle_timeout=args.idle_timeout, jobs=args.jobs,
+                            queue_size=args.queue_size, poll_interval=args.poll_interval,
+                            options=options)
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        watcher.stop()
+    logger.info("Stopped: %d job(s) converted, %d failed", watcher.converted, watcher.failed)
+    return 1 if watcher.failed else 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
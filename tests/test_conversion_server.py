@@ -0,0 +1,343 @@
+"""Tests of the local HTTP conversion service (conversion_server) against localhost."""
+import http.client
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, SRC_DIR)
+
+import conversion_server  # noqa: E402
+from conversion_server import (ConversionServer, ConversionService, RequestError,  # noqa: E402
+                               _BodyReader, _copy_part, read_upload)
+
+BOUNDARY = "test-boundary"
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Yield a function that starts a ConversionServer on a free port and returns it."""
+    started = []
+
+    def start(**service_options):
+        service_options.setdefault("options", {"workers": 1})
+        service = ConversionService(str(tmp_path / "work"), **service_options)
+        httpd = ConversionServer(("127.0.0.1", 0), service)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        started.append((httpd, thread))
+        return httpd
+
+    yield start
+    for httpd, thread in started:
+        httpd.shutdown()
+        thread.join()
+        httpd.server_close()
+        httpd.service.close()
+
+
+def _jpeg(color=(200, 40, 40), size=(120, 160)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _multipart(files, fields=(), boundary=BOUNDARY):
+    body = b""
+    for name, value in fields:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                 f"{value}\r\n").encode()
+    for filename, data in files:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+                 f"filename=\"{filename}\"\r\nContent-Type: application/octet-stream\r\n\r\n"
+                 ).encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def _request(httpd, method, path, body=None, headers=None):
+    """Send a request; return (status, headers, body bytes)."""
+    connection = http.client.HTTPConnection(*httpd.server_address[:2], timeout=30)
+    try:
+        headers = dict(headers or {})
+        if body is not None:
+            headers.setdefault("Content-Type", f"multipart/form-data; boundary={BOUNDARY}")
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def _upload(httpd, path, files, fields=()):
+    return _request(httpd, "POST", path, _multipart(files, fields))
+
+
+def _wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.02)
+
+
+def _wait_finished(httpd, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status, _, body = _request(httpd, "GET", f"/jobs/{job_id}")
+        assert status == 200
+        job = json.loads(body)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_convert_returns_pdf(server):
+    httpd = server()
+    status, headers, body = _upload(httpd, "/convert/jpg2pdf",
+                                    [("a.jpg", _jpeg()), ("b.jpg", _jpeg((0, 90, 200)))])
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert 'filename="a.pdf"' in headers["Content-Disposition"]
+    assert body.startswith(b"%PDF-")
+    assert int(headers["Content-Length"]) == len(body)
+    # The job and its files are deleted once the result was sent
+    _wait_until(lambda: httpd.service.list_jobs() == [] and not os.listdir(httpd.service.work_dir))
+
+
+def test_job_is_accepted_then_polled_and_downloaded(server):
+    httpd = server()
+    status, headers, body = _upload(httpd, "/jobs/jpg2pdf", [("scan.jpg", _jpeg())],
+                                    [("dpi", "150")])
+    assert status == 202
+    job = json.loads(body)
+    assert headers["Location"] == f"/jobs/{job['id']}"
+    assert job["mode"] == "jpg2pdf"
+    assert job["files"] == 1
+
+    job = _wait_finished(httpd, job["id"])
+    assert job["status"] == "done"
+    assert job["pages"] == 1
+    assert job["result"] == f"/jobs/{job['id']}/result"
+
+    status, headers, body = _request(httpd, "GET", job["result"])
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert body.startswith(b"%PDF-")
+
+    status, _, body = _request(httpd, "GET", "/jobs")
+    assert status == 200
+    assert [listed["id"] for listed in json.loads(body)] == [job["id"]]
+
+
+def test_result_of_unknown_job_is_not_found(server):
+    httpd = server()
+    status, _, body = _request(httpd, "GET", "/jobs/999/result")
+    assert status == 404
+    assert "error" in json.loads(body)
+
+
+def test_upload_is_refused_when_slots_are_taken(server):
+    httpd = server(jobs=1, queue_size=0)
+    # The one slot is held as by an upload in progress
+    assert httpd.service.reserve()
+    try:
+        status, headers, body = _upload(httpd, "/jobs/jpg2pdf", [("a.jpg", _jpeg())])
+        assert status == 429
+        assert int(headers["Retry-After"]) >= 1
+        assert "error" in json.loads(body)
+    finally:
+        httpd.service.release()
+    assert httpd.service.metrics.counts["rejected"] == 1
+
+
+def test_upload_is_refused_before_100_continue(server):
+    httpd = server(jobs=1, queue_size=0)
+    assert httpd.service.reserve()
+    connection = http.client.HTTPConnection(*httpd.server_address[:2], timeout=30)
+    try:
+        # Only the headers are sent: the refusal must come before the body
+        connection.putrequest("POST", "/convert/jpg2pdf")
+        connection.putheader("Content-Type", f"multipart/form-data; boundary={BOUNDARY}")
+        connection.putheader("Content-Length", str(100 * 1024 ** 2))
+        connection.putheader("Expect", "100-continue")
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 429
+        assert int(response.headers["Retry-After"]) >= 1
+    finally:
+        connection.close()
+        httpd.service.release()
+
+
+def test_bad_setting_is_refused_before_the_body_is_read(server):
+    httpd = server()
+    connection = http.client.HTTPConnection(*httpd.server_address[:2], timeout=30)
+    try:
+        # Larger than the drain limit, and never sent: only the settings can be checked
+        connection.putrequest("POST", "/jobs/jpg2pdf?dpi=lots")
+        connection.putheader("Content-Type", f"multipart/form-data; boundary={BOUNDARY}")
+        connection.putheader("Content-Length", str(conversion_server.DRAIN_LIMIT + 1))
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400
+        assert "dpi" in json.loads(response.read())["error"]
+    finally:
+        connection.close()
+    assert httpd.service.list_jobs() == []
+    assert os.listdir(httpd.service.work_dir) == []
+
+
+def test_setting_of_other_mode_is_refused(server):
+    httpd = server()
+    status, _, body = _upload(httpd, "/jobs/jpg2pdf", [("a.jpg", _jpeg())],
+                              [("format", "png")])
+    assert status == 400
+    assert "format" in json.loads(body)["error"]
+    assert os.listdir(httpd.service.work_dir) == []
+
+
+def test_delete_removes_job_and_files(server):
+    httpd = server()
+    status, _, body = _upload(httpd, "/jobs/jpg2pdf", [("a.jpg", _jpeg())])
+    assert status == 202
+    job_id = json.loads(body)["id"]
+    _wait_finished(httpd, job_id)
+    work_dir = httpd.service.get(job_id).work_dir
+    assert os.path.isdir(work_dir)
+
+    status, _, body = _request(httpd, "DELETE", f"/jobs/{job_id}")
+    assert status == 200
+    assert json.loads(body)["id"] == job_id
+    assert not os.path.exists(work_dir)
+    status, _, _ = _request(httpd, "GET", f"/jobs/{job_id}")
+    assert status == 404
+
+
+def test_metrics_shape(server):
+    httpd = server(jobs=2, queue_size=3)
+    status, _, _ = _upload(httpd, "/convert/jpg2pdf", [("a.jpg", _jpeg())])
+    assert status == 200
+
+    status, headers, body = _request(httpd, "GET", "/metrics")
+    assert status == 200
+    assert headers["Content-Type"] == "application/json"
+    metrics = json.loads(body)
+    assert set(metrics) >= {"uptime_seconds", "jobs", "pages", "input_bytes", "output_bytes",
+                            "stage_seconds", "throughput", "latency_seconds", "queue"}
+    assert metrics["jobs"]["accepted"] == 1
+    assert metrics["jobs"]["done"] == 1
+    assert metrics["pages"] == 1
+    assert metrics["output_bytes"] > 0
+    assert metrics["queue"] == {"queued": 0, "running": 0, "jobs": 2, "queue_size": 3}
+    assert set(metrics["throughput"]) == {"window_seconds", "jobs_per_second",
+                                          "pages_per_second"}
+    latency = metrics["latency_seconds"]
+    assert latency["samples"] == 1
+    for name in ("wait", "run", "total"):
+        assert set(latency[name]) == {"p50", "p90", "p95", "p99"}
+
+
+def _headers(content_type):
+    return http.client.parse_headers(io.BytesIO(f"Content-Type: {content_type}\r\n\r\n".encode()))
+
+
+def _read_upload(body, tmp_path, content_type=f"multipart/form-data; boundary={BOUNDARY}"):
+    reader = _BodyReader(io.BytesIO(body), len(body))
+    return read_upload(reader, _headers(content_type), str(tmp_path))
+
+
+def _contents(specs):
+    contents = []
+    for spec in specs:
+        with open(spec, "rb") as f:
+            contents.append(f.read())
+    return contents
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"plain",
+    b"ends with a line break\r\n",
+    b"ends with a bare newline\n",
+    b"\r\n\r\n",
+    f"--{BOUNDARY}X is not a delimiter\r\n".encode(),
+    f"text\r\n--{BOUNDARY}X\r\nmore".encode(),
+    f"mid-line --{BOUNDARY}\r\n".encode(),
+    bytes(range(256)) * 600,
+], ids=["empty", "plain", "crlf-end", "lf-end", "blank-lines", "delimiter-prefix",
+        "delimiter-prefix-line", "mid-line-delimiter", "binary"])
+def test_read_upload_keeps_file_bytes(tmp_path, data):
+    specs, names, total, fields = _read_upload(_multipart([("x.bin", data), ("y.bin", data)]),
+                                               tmp_path)
+    assert names == ["x.bin", "y.bin"]
+    assert _contents(specs) == [data, data]
+    assert total == 2 * len(data)
+    assert fields == {}
+
+
+def test_read_upload_handles_lf_preamble_and_epilogue(tmp_path):
+    body = (f"preamble\n--{BOUNDARY}\n"
+            f"Content-Disposition: form-data; name=\"dpi\"\n\n150\n"
+            f"--{BOUNDARY}  \n"
+            f"Content-Disposition: form-data; name=\"file\"; filename=\"dir/doc.pdf:2-3\"\n\n"
+            f"data\n"
+            f"--{BOUNDARY}--\nepilogue\n").encode()
+    specs, names, total, fields = _read_upload(body, tmp_path)
+    assert fields == {"dpi": "150"}
+    assert names == ["doc.pdf"]
+    assert specs[0].endswith(os.path.join("0000", "doc.pdf") + ":2-3")
+    assert _contents([specs[0].rsplit(":", 1)[0]]) == [b"data"]
+    assert total == 4
+
+
+def test_read_upload_stores_raw_body(tmp_path):
+    specs, names, total, fields = _read_upload(b"raw bytes\r\n", tmp_path, "image/jpeg")
+    assert names == ["upload"]
+    assert _contents(specs) == [b"raw bytes\r\n"]
+    assert total == len(b"raw bytes\r\n")
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; "
+    f"filename=\"a.jpg\"\r\n\r\ntruncated".encode(),
+    f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"".encode(),
+], ids=["no-parts", "truncated-part", "truncated-header"])
+def test_read_upload_rejects_incomplete_body(tmp_path, body):
+    with pytest.raises(RequestError) as error:
+        _read_upload(body, tmp_path)
+    assert error.value.status == 400
+
+
+def test_read_upload_limits_form_fields(tmp_path):
+    body = _multipart([], [("dpi", "9" * (conversion_server.MAX_FIELD_SIZE + 10))])
+    with pytest.raises(RequestError) as error:
+        _read_upload(body, tmp_path)
+    assert error.value.status == 400
+
+
+def test_copy_part_reports_last_part():
+    delimiter = f"--{BOUNDARY}".encode()
+    body = b"first\r\n" + delimiter + b"\r\nsecond\r\n" + delimiter + b"--\r\n"
+    reader = _BodyReader(io.BytesIO(body), len(body))
+    first, second = io.BytesIO(), io.BytesIO()
+    assert _copy_part(reader, delimiter, first) is False
+    assert _copy_part(reader, delimiter, second) is True
+    assert (first.getvalue(), second.getvalue()) == (b"first", b"second")
+
+
+def test_copy_part_reads_no_further_than_the_body():
+    delimiter = f"--{BOUNDARY}".encode()
+    body = b"data\r\n" + delimiter + b"--\r\n"
+    # The next request on the connection must not be consumed
+    reader = _BodyReader(io.BytesIO(body + b"GET / HTTP/1.1\r\n"), len(body))
+    out = io.BytesIO()
+    assert _copy_part(reader, delimiter, out) is True
+    assert out.getvalue() == b"data"
+    assert reader.remaining == 0
@@ -0,0 +1,149 @@
+"""Regression checks for blank and duplicate page detection (page_analysis)."""
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image, ImageDraw
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, SRC_DIR)
+
+pytest.importorskip("numpy")
+
+import page_analysis  # noqa: E402
+from image_sources import ImageFrame  # noqa: E402
+
+
+def _save(tmp_path, name, img):
+    path = str(tmp_path / name)
+    img.save(path)
+    return ImageFrame(path)
+
+
+def test_white_page_is_blank(tmp_path):
+    page = _save(tmp_path, "white.png", Image.new("L", (800, 1100), 250))
+    (analysis,) = page_analysis.PageScreen().analyze([page])
+    assert analysis.blank
+
+
+def test_text_page_is_not_blank(tmp_path):
+    img = Image.new("L", (800, 1100), 250)
+    draw = ImageDraw.Draw(img)
+    for y in range(150, 950, 40):
+        draw.rectangle((100, y, 700, y + 12), fill=20)
+    page = _save(tmp_path, "text.png", img)
+    (analysis,) = page_analysis.PageScreen().analyze([page])
+    assert not analysis.blank
+
+
+@pytest.mark.parametrize("level", [0, 20, 100])
+def test_dark_page_is_not_blank(tmp_path, level):
+    # A uniformly dark page has no paper to measure ink against; it is content
+    page = _save(tmp_path, f"dark_{level}.png", Image.new("L", (800, 1100), level))
+    (analysis,) = page_analysis.PageScreen().analyze([page])
+    assert not analysis.blank
+    assert not page_analysis.PageScreen().skips(analysis)
+
+
+def test_negative_scan_is_not_blank(tmp_path):
+    img = Image.new("L", (800, 1100), 15)
+    draw = ImageDraw.Draw(img)
+    for y in range(150, 950, 40):
+        draw.rectangle((100, y, 700, y + 12), fill=240)
+    page = _save(tmp_path, "negative.png", img)
+    (analysis,) = page_analysis.PageScreen().analyze([page])
+    assert not analysis.blank
+
+
+def _form_page(seed, shift=(0, 0)):
+    """A form: the same boxes and rules on every page, filled with different text."""
+    img = Image.new("L", (850, 1100), 245)
+    draw = ImageDraw.Draw(img)
+    dx, dy = shift
+    draw.rectangle((60 + dx, 60 + dy, 790 + dx, 160 + dy), outline=0, width=4)
+    for y in range(220, 1000, 60):
+        draw.line((60 + dx, y + dy, 790 + dx, y + dy), fill=90, width=2)
+    rng = random.Random(seed)
+    for y in range(190, 990, 30):
+        x = 70
+        while x < 760:
+            word = rng.randint(20, 90)
+            if rng.random() < 0.8:
+                draw.rectangle((x + dx, y + dy, min(x + word, 780) + dx, y + 12 + dy), fill=30)
+            x += word + rng.randint(10, 25)
+    return img
+
+
+def _save_jpeg(tmp_path, name, img, quality):
+    path = str(tmp_path / name)
+    img.save(path, quality=quality)
+    return ImageFrame(path)
+
+
+def test_resaved_copy_is_duplicate(tmp_path):
+    original = _save(tmp_path, "original.png", _form_page(1))
+    copy = _save_jpeg(tmp_path, "copy.jpg", _form_page(1), quality=60)
+    first, second = page_analysis.PageScreen().analyze([original, copy])
+    assert first.duplicate_of is None
+    assert second.duplicate_of is first
+    assert second.distance <= page_analysis.DUPLICATE_DISTANCE
+    assert "duplicate of original.png" in second.reason
+
+
+def test_shifted_rescan_is_duplicate(tmp_path):
+    original = _save(tmp_path, "original.png", _form_page(2))
+    rescan = _save_jpeg(tmp_path, "rescan.jpg", _form_page(2, shift=(6, -4)), quality=75)
+    first, second = page_analysis.PageScreen().analyze([original, rescan])
+    assert second.duplicate_of is first
+
+
+def test_distinct_pages_of_one_form_are_not_duplicates(tmp_path):
+    pages = [_save(tmp_path, f"form_{seed}.png", _form_page(seed)) for seed in range(6)]
+    analyses = page_analysis.PageScreen().analyze(pages)
+    assert [analysis.duplicate_of for analysis in analyses] == [None] * 6
+    assert not any(analysis.flagged for analysis in analyses)
+
+
+def test_duplicate_distance_sets_the_threshold(tmp_path):
+    original = _save(tmp_path, "original.png", _form_page(3))
+    rescan = _save_jpeg(tmp_path, "rescan.jpg", _form_page(3, shift=(6, -4)), quality=75)
+    _, second = page_analysis.PageScreen(duplicate_distance=0).analyze([original, rescan])
+    assert second.duplicate_of is None
+
+
+def test_duplicate_of_blank_page_is_blank(tmp_path):
+    # Blank pages are not originals: the second separator sheet is blank too
+    pages = [_save(tmp_path, f"white_{n}.png", Image.new("L", (800, 1100), 250))
+             for n in range(2)]
+    analyses = page_analysis.PageScreen().analyze(pages)
+    assert [(analysis.blank, analysis.duplicate_of) for analysis in analyses] == [
+        (True, None), (True, None)]
+
+
+@pytest.mark.parametrize("blank, duplicates, skipped", [
+    (page_analysis.SCREEN_SKIP, page_analysis.SCREEN_SKIP, ["white.png", "copy.jpg"]),
+    (page_analysis.SCREEN_REPORT, page_analysis.SCREEN_SKIP, ["copy.jpg"]),
+    (page_analysis.SCREEN_SKIP, page_analysis.SCREEN_REPORT, ["white.png"]),
+    (page_analysis.SCREEN_REPORT, page_analysis.SCREEN_REPORT, []),
+])
+def test_skips_follows_the_actions(tmp_path, blank, duplicates, skipped):
+    pages = [_save(tmp_path, "page.png", _form_page(4)),
+             _save(tmp_path, "white.png", Image.new("L", (800, 1100), 250)),
+             _save_jpeg(tmp_path, "copy.jpg", _form_page(4), quality=70)]
+    screen = page_analysis.PageScreen(blank, duplicates)
+    analyses = screen.analyze(pages)
+    # Reported pages are still flagged, only skipped ones are left out
+    assert [analysis.flagged for analysis in analyses] == [False, True, True]
+    assert [os.path.basename(analysis.path) for analysis in analyses
+            if screen.skips(analysis)] == skipped
+
+
+def test_off_checks_flag_nothing(tmp_path):
+    pages = [_save(tmp_path, "white.png", Image.new("L", (800, 1100), 250)),
+             _save(tmp_path, "page.png", _form_page(5)),
+             _save_jpeg(tmp_path, "copy.jpg", _form_page(5), quality=70)]
+    screen = page_analysis.PageScreen(page_analysis.SCREEN_OFF, page_analysis.SCREEN_OFF)
+    assert not screen.enabled
+    analyses = screen.analyze(pages)
+    assert not any(analysis.flagged or screen.skips(analysis) for analysis in analyses)